@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+InMemoryPageStore 加载耗时基准
+
+对比同一份 pages.json 的几种加载方式：
+- eager:   trusted=False，逐条 Page(**record) 校验（旧行为）
+- lazy:    trusted=True，只解析 JSON，Page 在首次访问时才构造
+- lazy+k:  lazy 加载后随机访问 k 个页面（检索命中后反查页面的典型用法）
+
+用法：
+    python benchmarks/page_load_benchmark.py --pages 100000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from gam.schemas import InMemoryPageStore, Page
+
+
+def _make_store(dir_path: str, num_pages: int, content_chars: int) -> None:
+    body = ("lorem ipsum dolor sit amet " * (content_chars // 27 + 1))[:content_chars]
+    pages = [
+        Page(header=f"[ABSTRACT] page {i}", content=f"{i} {body}", meta={"source": "bench", "chunk": i})
+        for i in range(num_pages)
+    ]
+    InMemoryPageStore(dir_path=dir_path).save(pages)
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="InMemoryPageStore 加载耗时基准")
+    parser.add_argument("--pages", type=int, default=100_000, help="页面数量")
+    parser.add_argument("--content-chars", type=int, default=400, help="每页 content 字符数")
+    parser.add_argument("--touch", type=int, default=50, help="lazy 加载后访问的页面数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最快一次")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        _make_store(dir_path, args.pages, args.content_chars)
+        ids = random.Random(0).sample(range(args.pages), min(args.touch, args.pages))
+
+        eager_store = InMemoryPageStore(dir_path=dir_path)
+        lazy_store = InMemoryPageStore(dir_path=dir_path, trusted=True)
+
+        def lazy_and_touch():
+            pages = lazy_store.load()
+            for i in ids:
+                pages[i]
+
+        results = [
+            ("eager (validated)", _best_of(args.repeat, eager_store.load)),
+            ("lazy (trusted)", _best_of(args.repeat, lazy_store.load)),
+            (f"lazy + touch {len(ids)}", _best_of(args.repeat, lazy_and_touch)),
+        ]
+
+    print(f"pages={args.pages} content_chars={args.content_chars} (best of {args.repeat})")
+    baseline = results[0][1]
+    for name, seconds in results:
+        print(f"  {name:<24} {seconds:8.3f}s  x{baseline / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
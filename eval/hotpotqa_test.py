@@ -20,6 +20,7 @@ from typing import Any, Counter, Dict, List, Optional, Tuple
 from tqdm import tqdm
 
 
+from gam.chunking import chunk_text
 from gam import (
     MemoryAgent,
     ResearchAgent,
@@ -71,136 +72,14 @@ def build_context_chunks_for_sample(
     embedding_model_path: Optional[str] = None
 ) -> List[str]:
     """
-    将 context 文本按 token 数量分割成多个会话块
-    使用智能切分：优先在边界处切分
+    将 context 文本按 token 数量分割成多个会话块（gam.chunking，tokenizer 进程内只加载一次）
     
     Args:
         sample: 样本数据，包含 'context' 字段
         max_tokens: 每个会话块的最大 token 数量
         embedding_model_path: embedding 模型路径，如果提供则使用该模型进行精确 token 计算
     """
-    context_text = sample.get("context") or ""
-    
-    if not context_text:
-        return []
-    
-    # 优先尝试使用 embedding 模型进行精确的 token 切分
-    if embedding_model_path:
-        try:
-            chunks = _split_with_embedding_model(context_text, max_tokens, embedding_model_path)
-            if chunks:
-                return chunks
-        except Exception as e:
-            print(f"Warning: Embedding model splitting failed: {e}, falling back to tiktoken")
-    
-    # 使用 tiktoken 进行精确的 token 切分
-    try:
-        import tiktoken
-        tokenizer = tiktoken.encoding_for_model("gpt-4o-2024-08-06")
-        tokens = tokenizer.encode(context_text, disallowed_special=())
-        
-        if len(tokens) <= max_tokens:
-            return [f"[Session 1]\n{context_text}"]
-        
-        # 智能切分：按 token 数量切分
-        chunks = _smart_split_by_tokens(context_text, tokens, max_tokens, tokenizer)
-        return chunks
-        
-    except ImportError:
-        print("Warning: tiktoken not available, falling back to character-based splitting")
-        return _fallback_char_split(context_text, max_tokens)
-
-def _split_with_embedding_model(text: str, max_tokens: int, model_path: str) -> List[str]:
-    """
-    使用 embedding 模型进行精确的 token 切分
-    """
-    try:
-        from transformers import AutoTokenizer
-        
-        # 使用指定的模型 tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
-        
-        # 编码文本获取 tokens
-        tokens = tokenizer.encode(text, add_special_tokens=False)
-        
-        if len(tokens) <= max_tokens:
-            return [f"[Session 1]\n{text}"]
-        
-        # 智能切分
-        chunks = _smart_split_by_tokens(text, tokens, max_tokens, tokenizer)
-        return chunks
-        
-    except Exception as e:
-        print(f"Error using embedding model: {e}")
-        return []
-
-def _smart_split_by_tokens(text: str, tokens: List[int], max_tokens: int, tokenizer) -> List[str]:
-    """
-    按 token 数量简单切分：不进行智能边界查找，直接按 max_tokens 切分
-    """
-    chunks = []
-    
-    # 如果文本不超过最大 token 数，直接返回
-    if len(tokens) <= max_tokens:
-        return [f"[Session 1]\n{text}"]
-    
-    # 直接按照 token 索引切分
-    session_id = 0
-    start_idx = 0
-    
-    while start_idx < len(tokens):
-        # 计算当前块的结束 token 索引
-        end_idx = min(start_idx + max_tokens, len(tokens))
-        
-        # 将 tokens 解码回文本
-        chunk_tokens = tokens[start_idx:end_idx]
-        chunk_text = tokenizer.decode(chunk_tokens, skip_special_tokens=True)
-        
-        if chunk_text.strip():
-            chunks.append(f"[Session {session_id}]\n{chunk_text.strip()}")
-            session_id += 1
-        
-        start_idx = end_idx
-    
-    return chunks
-
-def _fallback_char_split(text: str, max_tokens: int) -> List[str]:
-    """
-    字符切分的 fallback 方法
-    """
-    # 粗略估计：1 token ≈ 4 characters
-    max_chars = max_tokens * 4
-    
-    if len(text) <= max_chars:
-        return [f"[Session 1]\n{text}"]
-    
-    chunks = []
-    current_start = 0
-    session_id = 0
-    
-    while current_start < len(text):
-        current_end = min(current_start + max_chars, len(text))
-        
-        # 尝试在单词边界切分
-        if current_end < len(text):
-            # 寻找最后一个换行符
-            last_newline = text.rfind('\n', current_start, current_end)
-            if last_newline > current_start:
-                current_end = last_newline
-            else:
-                # 寻找最后一个空格
-                last_space = text.rfind(' ', current_start, current_end)
-                if last_space > current_start:
-                    current_end = last_space
-        
-        chunk_text = text[current_start:current_end].strip()
-        if chunk_text:
-            chunks.append(f"[Session {session_id}]\n{chunk_text}")
-            session_id += 1
-        
-        current_start = current_end
-    
-    return chunks
+    return chunk_text(sample.get("context") or "", max_tokens, tokenizer=embedding_model_path)
 
 # ========== Prompt 设计 ==========
 
@@ -340,10 +219,10 @@ def process_sample(
             generator=memory_generator,
         )
 
-        if not os.path.exists(os.path.join(sample_results_dir, 'memory_state.json')):
-            for i, context_chunk in enumerate(context_chunks, 1):
-                print(f"  处理上下文块 {i}/{len(context_chunks)}...")
-                memory_update = memory_agent.memorize(context_chunk) 
+        # 断点续跑：ingest_job.json 记录输入指纹和已提交的块数，重跑时跳过已完成的块
+        ingest_job_file = os.path.join(sample_results_dir, 'ingest_job.json')
+        if os.path.exists(ingest_job_file) or not os.path.exists(os.path.join(sample_results_dir, 'memory_state.json')):
+            memory_agent.ingest(context_chunks, ingest_job_file, verbose=True)
         
         # 查看构建的记忆
         final_state = memory_store.load()
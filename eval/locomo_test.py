@@ -323,10 +323,10 @@ def process_sample(
             generator=memory_generator
         )
         
-        if not os.path.exists(os.path.join(sample_results_dir, 'memory_state.json')):
-            for i, session_chunk in enumerate(session_chunks, 1):
-                print(f"  处理会话 {i}/{len(session_chunks)}...")
-                memory_update = memory_agent.memorize(session_chunk)
+        # 断点续跑：ingest_job.json 记录输入指纹和已提交的块数，重跑时跳过已完成的块
+        ingest_job_file = os.path.join(sample_results_dir, 'ingest_job.json')
+        if os.path.exists(ingest_job_file) or not os.path.exists(os.path.join(sample_results_dir, 'memory_state.json')):
+            memory_agent.ingest(session_chunks, ingest_job_file, verbose=True)
         
         # 查看构建的记忆
         final_state = memory_store.load()
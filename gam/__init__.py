@@ -13,12 +13,13 @@ from __future__ import annotations
 
 # Core agents
 from gam.agents import MemoryAgent, ResearchAgent
+from gam.pipeline import IngestPipeline, PipelineReport, StageStats
 
 # Generators
 from gam.generator import AbsGenerator, OpenAIGenerator, VLLMGenerator
 
 # Retrievers
-from gam.retriever import AbsRetriever, IndexRetriever
+from gam.retriever import AbsRetriever, IndexRetriever, NamespacedRetriever, BackgroundIndexer
 
 # 尝试导入可选检索器
 try:
@@ -52,7 +53,22 @@ from gam.schemas import (
     ReflectionDecision,
     ResearchOutput,
     InMemoryMemoryStore,
-    InMemoryPageStore
+    BufferedMemoryStore,
+    InMemoryPageStore,
+    MmapPageStore,
+    CompressedPageStore,
+    ShardedPageStore,
+    NamespacedPageStore,
+    NamespacedMemoryStore,
+    MemoryRollups,
+    SQLitePageStore,
+    SQLiteMemoryStore,
+    AbstractCache,
+    PageCache,
+    configure_shared_page_cache,
+    ImportRecord,
+    export_bundle,
+    import_bundle
 )
 
 __version__ = "0.1.0"
@@ -60,6 +76,9 @@ __all__ = [
     # Core agents
     "MemoryAgent",
     "ResearchAgent",
+    "IngestPipeline",
+    "PipelineReport",
+    "StageStats",
     
     # Generators
     "AbsGenerator",
@@ -69,6 +88,8 @@ __all__ = [
     # Retrievers
     "AbsRetriever",
     "IndexRetriever",
+    "NamespacedRetriever",
+    "BackgroundIndexer",
     "BM25Retriever",
     "DenseRetriever",
     
@@ -90,6 +111,21 @@ __all__ = [
     "ReflectionDecision",
     "ResearchOutput",
     "InMemoryMemoryStore",
+    "BufferedMemoryStore",
     "InMemoryPageStore",
+    "MmapPageStore",
+    "CompressedPageStore",
+    "ShardedPageStore",
+    "NamespacedPageStore",
+    "NamespacedMemoryStore",
+    "MemoryRollups",
+    "SQLitePageStore",
+    "SQLiteMemoryStore",
+    "AbstractCache",
+    "PageCache",
+    "configure_shared_page_cache",
+    "ImportRecord",
+    "export_bundle",
+    "import_bundle",
 ]
 
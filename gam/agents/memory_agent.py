@@ -6,28 +6,67 @@ MemoryAgent Module
 This module defines the MemoryAgent for the GAM (General-Agentic-Memory) framework.
 
 - Memory is represented as a list[str] of abstracts (no events/tags included).
-- MemoryAgent exposes only: memorize(message) -> MemoryUpdate, allowing the agent to store new information.
+- MemoryAgent exposes memorize(message) -> MemoryUpdate, allowing the agent to store new information,
+  memorize_batch(messages, window) to generate abstracts for a window of messages concurrently,
+  ingest(messages, checkpoint_path) to memorize a long document resumably, and
+  bulk_import(source) to load pre-processed records without any LLM call.
 - Prompts within the module are used as placeholders for future prompt templates or instructions.
 """
 
 
 from __future__ import annotations
 
-from typing import Dict, Optional, Tuple
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import hashlib
+import json
+from pathlib import Path
 
-from gam.prompts import MemoryAgent_PROMPT
+import numpy as np
+
+from gam.prompts import MemoryAgent_PROMPT, Rollup_PROMPT
 from gam.schemas import (
     MemoryState, Page, MemoryUpdate, MemoryStore, PageStore,
-    InMemoryMemoryStore, InMemoryPageStore, Retriever
+    InMemoryMemoryStore, InMemoryPageStore, Retriever, IngestCheckpoint, ImportRecord,
+    iter_import_batches, lock_for, renderer_for, AbstractIndex, select_memory_context,
+    MemoryRollups, Rollup, AbstractCache, generator_fingerprint
 )
+from gam.schemas.persistence import atomic_write_json
 from gam.generator import AbsGenerator
 
+class _StoredAbstracts(Sequence[str]):
+    """Read-only view of a memory store's first `count` abstracts; slices read only their range."""
+
+    def __init__(self, store: MemoryStore, count: int) -> None:
+        self._store = store
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            items = list(self._store.iter_range(start, stop)) if start < stop else []
+            return items[::step] if step != 1 else items
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._store.get_many([index])[0]
+
+
 class MemoryAgent:
     """
     Public API:
       - memorize(message) -> MemoryUpdate
+      - memorize_batch(messages, window) -> List[MemoryUpdate]
+      - decorate_window(messages, memory_state) / commit_window(messages, decorated):
+        the two halves of memorize_batch(), for pipelines that overlap them
+      - ingest(messages, checkpoint_path) -> number of messages memorized by this call
+      - bulk_import(source, retrievers) -> number of records imported
     Internal only:
-      - _decorate(message, memory_state) -> (abstract, header, decorated_new_page)
+      - _decorate(message, memory_state) -> (abstract, header)
     Note: memory_state contains ONLY abstracts (list[str]).
     """
 
@@ -38,12 +77,40 @@ class MemoryAgent:
         generator: AbsGenerator | None = None,  # 必须传入Generator实例
         dir_path: Optional[str] = None,  # 新增：文件系统存储路径
         system_prompts: Optional[Dict[str, str]] = None,  # 新增：system prompts字典
+        context_top_k: Optional[int] = None,
+        context_recent: int = 0,
+        rollups: Optional[MemoryRollups] = None,
+        indexer: Optional[Any] = None,  # BackgroundIndexer，提交后通知它增量更新检索器
+        abstract_cache: Optional[AbstractCache] = None,
     ) -> None:
+        """
+        context_top_k: None sends every abstract as MEMORY_CONTEXT. An int
+            sends only the `context_top_k` abstracts most relevant to the new
+            message (BM25 over abstracts, indexed incrementally) plus the
+            `context_recent` most recent ones, so the prompt size stays
+            bounded as memory grows.
+        rollups: summarize every `rollups.fanout` abstracts (and rollups)
+            into a higher-level entry after each commit and use the
+            logarithmic-size view as MEMORY_CONTEXT; takes precedence over
+            context_top_k. Share the same object with ResearchAgent.
+        indexer: a BackgroundIndexer notified after every commit, so
+            retrievers catch up off the query path.
+        abstract_cache: persistent AbstractCache consulted before every
+            abstract / rollup LLM call; its policy decides whether a
+            different memory context still counts as a hit.
+        """
         if generator is None:
             raise ValueError("Generator instance is required for MemoryAgent")
-        self.memory_store = memory_store or InMemoryMemoryStore(dir_path=dir_path)
-        self.page_store = page_store or InMemoryPageStore(dir_path=dir_path)
+        self.memory_store = memory_store if memory_store is not None else InMemoryMemoryStore(dir_path=dir_path)
+        self.page_store = page_store if page_store is not None else InMemoryPageStore(dir_path=dir_path)
         self.generator = generator
+        self.context_top_k = context_top_k
+        self.context_recent = max(0, context_recent)
+        self._abstract_index = AbstractIndex() if context_top_k is not None else None
+        self.rollups = rollups
+        self.indexer = indexer
+        self.abstract_cache = abstract_cache
+        self._generator_fingerprint = generator_fingerprint(generator)
         
         # 初始化 system_prompts，默认值为空字符串
         default_system_prompts = {
@@ -59,47 +126,331 @@ class MemoryAgent:
     # ---- Public ----
     def memorize(self, message: str) -> MemoryUpdate:
         """
-        Update long-term memory with a new message and persist a decorated page.
+        Update long-term memory with a new message and persist it as a page.
         Steps:
-          1) _decorate(...) => abstract, header, decorated_new_page
+          1) _decorate(...) => abstract, header
           2) Merge into MemoryState (append unique abstract)
           3) Write Page into page_store  (page_id left None by default)
+        Steps 2-3 run under the page store's write lock (see lock_for), so a
+        concurrent ResearchAgent never sees the abstract without its page.
         """
         message = message.strip()
         state = self.memory_store.load()
 
-        # (1) Decorate - this generates the abstract and decorated page
-        abstract, header, decorated_new_page = self._decorate(message, state)
+        # (1) Decorate - this generates the abstract and page header
+        abstract, header = self._decorate(message, state)
 
-        # (2) Add abstract to memory (with built-in uniqueness check)
-        self.memory_store.add(abstract)
+        page = Page(header=header, content=message)
+        with lock_for(self.page_store).write():
+            # (2) Add abstract to memory (with built-in uniqueness check)
+            self.memory_store.add(abstract)
 
-        # (3) Persist page
-        page = Page(header=header, content=message, meta={"decorated": decorated_new_page})
-        self.page_store.add(page)
-        
-        # (4) Get updated state after adding abstract
-        updated_state = self.memory_store.load()
+            # (3) Persist page（decorated 由 header + content 现算，不再写进 meta）
+            self.page_store.add(page)
 
-        return MemoryUpdate(new_state=updated_state, new_page=page, debug={"decorated_page": decorated_new_page})
+            # (4) 只记下此刻的摘要数；new_state 用到时再按这个前缀从 store 读
+            abstract_count = len(self.memory_store)
 
+        self._notify_indexer()
+        self._roll_up(_StoredAbstracts(self.memory_store, abstract_count))
+        return MemoryUpdate(new_page=page, abstract_count=abstract_count, memory_store=self.memory_store)
 
-    # ---- Internal----
 
-    def _decorate(self, message: str, memory_state: MemoryState) -> Tuple[str, str, str]:
+    def memorize_batch(self, messages: Sequence[str], window: int = 8) -> List[MemoryUpdate]:
+        """
+        memorize() a sequence of messages, generating up to `window` abstracts
+        concurrently with generator.generate_batch().
+
+        Every message of a window sees the memory as of the start of its
+        window (not the abstracts of its window-mates); the window's
+        abstracts and pages are then committed in message order in one step
+        under the page store's write lock. window=1 is exactly memorize().
+        If the batch call fails, the window falls back to one generate_single()
+        per message. Each MemoryUpdate carries the memory state after its
+        window was committed.
+        """
+        window = max(1, window)
+        updates: List[MemoryUpdate] = []
+        for start in range(0, len(messages), window):
+            chunk = [m.strip() for m in messages[start:start + window]]
+            # (1) 同一窗口的摘要并发生成，都基于窗口开始时的 memory
+            decorated = self.decorate_window(chunk, self.memory_store.load())
+            # (2)(3) 按原顺序一次性提交整个窗口
+            updates.extend(self.commit_window(chunk, decorated))
+        return updates
+
+    def decorate_window(self, chunk: List[str], memory_state: MemoryState) -> List[Tuple[str, str]]:
+        """
+        (abstract, header) for every message of a window, generated with one
+        generate_batch() call against `memory_state`. Nothing is written;
+        pass the result to commit_window().
+        """
+        if len(chunk) == 1:
+            return [self._decorate(chunk[0], memory_state)]
+        contexts = [self._memory_context(m, memory_state) for m in chunk]
+        abstracts: List[Optional[str]] = [self._cached_abstract(m, c) for m, c in zip(chunk, contexts)]
+        misses = [i for i, a in enumerate(abstracts) if a is None]
+        if misses:
+            prompts = [self._format_prompt(chunk[i], contexts[i]) for i in misses]
+            try:
+                responses = self.generator.generate_batch(prompts=prompts)
+            except Exception as e:
+                print(f"Error generating abstracts in batch, falling back to one by one: {e}")
+                # 只对未命中的消息逐条生成，缓存不再重复查询
+                for i in misses:
+                    abstracts[i] = self._generate_abstract(chunk[i], contexts[i])
+                return [(a, f"[ABSTRACT] {a}".strip()) for a in abstracts]
+            if len(responses) != len(prompts):
+                print(f"Warning: generate_batch returned {len(responses)} responses for {len(prompts)} prompts")
+            for j, i in enumerate(misses):
+                text = responses[j].get("text", "").strip() if j < len(responses) else ""
+                if text:
+                    self._cache_abstract(chunk[i], contexts[i], text)
+                else:
+                    # 缺失或为空的结果与 _decorate 出错时一样，退回消息前 200 字符
+                    text = chunk[i][:200]
+                abstracts[i] = text
+        return [(a, f"[ABSTRACT] {a}".strip()) for a in abstracts]
+
+    def commit_window(self, chunk: List[str], decorated: List[Tuple[str, str]]) -> List[MemoryUpdate]:
         """
-        Private. Generate abstract for the message and compose: "abstract; header; new_page".
-        Returns: (abstract, header, decorated_new_page)
+        Commit a window decorated by decorate_window(): abstracts and pages
+        in message order under the page store's write lock, then notify the
+        indexer and roll up.
         """
-        # Build memory context from all abstracts (concatenate all memories)
-        if memory_state.abstracts:
-            memory_context_lines = []
-            for i, abstract in enumerate(memory_state.abstracts):
-                memory_context_lines.append(f"Page {i}: {abstract}")
-            memory_context = "\n".join(memory_context_lines)
+        pages = [Page(header=header, content=m) for m, (_, header) in zip(chunk, decorated)]
+        with lock_for(self.page_store).write():
+            self._add_many(self.memory_store, [abstract for abstract, _ in decorated])
+            self._add_many(self.page_store, pages)
+            abstract_count = len(self.memory_store)
+        self._notify_indexer()
+        self._roll_up(_StoredAbstracts(self.memory_store, abstract_count))
+        return [
+            MemoryUpdate(new_page=page, abstract_count=abstract_count, memory_store=self.memory_store)
+            for page in pages
+        ]
+
+    def ingest(self, messages: Sequence[str], checkpoint_path: str, verbose: bool = False, window: int = 1) -> int:
+        """
+        memorize() every message in order, resumably.
+
+        Progress is kept in `checkpoint_path` together with a fingerprint of
+        `messages`. Re-running with the same messages after a crash skips the
+        ones already committed, so their LLM calls are not paid again.
+        Every memorize() adds exactly one page, so the page count since the
+        job started is the commit point; the cursor in the file follows it.
+        Requires persistent stores for resuming across processes.
+        window > 1 memorizes through memorize_batch(), checkpointing after
+        each window; the checkpoint does not depend on the window size.
+        Raises ValueError if the checkpoint belongs to different input.
+        Returns the number of messages memorized by this call.
+        """
+        path = Path(checkpoint_path)
+        fingerprint = self._fingerprint(messages)
+        page_count = len(self.page_store) if hasattr(self.page_store, "__len__") else len(self.page_store.load())
+
+        checkpoint: Optional[IngestCheckpoint] = None
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = IngestCheckpoint(**json.load(f))
+            if checkpoint.fingerprint != fingerprint:
+                raise ValueError(
+                    f"Ingest checkpoint {path} was written for different input "
+                    f"({checkpoint.total} messages); remove it or use another path"
+                )
         else:
-            memory_context = "No memory currently."
+            checkpoint = IngestCheckpoint(fingerprint=fingerprint, total=len(messages), pages_before=page_count)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(path, checkpoint.model_dump())
+
+        # 以 page 数为准：崩溃在 page 落盘之后、cursor 落盘之前时也不会重复 memorize
+        committed = page_count - checkpoint.pages_before
+        if not 0 <= committed <= checkpoint.total:
+            raise ValueError(
+                f"Page store has {page_count} pages, which does not match ingest checkpoint {path} "
+                f"(started at {checkpoint.pages_before} pages for {checkpoint.total} messages)"
+            )
+        if committed != checkpoint.cursor:
+            checkpoint.cursor = committed
+            atomic_write_json(path, checkpoint.model_dump())
+        if verbose and committed:
+            print(f"  从第 {committed + 1}/{checkpoint.total} 块继续（跳过已提交的 {committed} 块）")
+
+        window = max(1, window)
+        for i in range(committed, checkpoint.total, window):
+            end = min(i + window, checkpoint.total)
+            if verbose:
+                print(f"  处理上下文块 {i + 1}-{end}/{checkpoint.total}..." if end - i > 1 else f"  处理上下文块 {i + 1}/{checkpoint.total}...")
+            if end - i == 1:
+                self.memorize(messages[i])
+            else:
+                self.memorize_batch(messages[i:end], window=window)
+            checkpoint.cursor = end
+            atomic_write_json(path, checkpoint.model_dump())
+        return checkpoint.total - committed
+
+    def bulk_import(
+        self,
+        source: Union[str, Path, Iterable[Union[Dict[str, Any], ImportRecord]]],
+        retrievers: Sequence[Any] = (),
+        batch_size: int = 1000,
+        verbose: bool = False,
+    ) -> int:
+        """
+        Load pre-processed records (content, abstract, optional embedding)
+        from a JSONL / Parquet file or an iterable, with zero LLM calls.
+
+        Each batch is written to the memory store and page store in one go
+        (add_many() where the store has it) under the page store's write lock,
+        then every retriever in `retrievers` is seeded with that batch via
+        seed(page_store, embeddings): DenseRetriever takes the supplied
+        vectors as-is and only encodes pages that came without one; other
+        retrievers index the new pages incrementally. Only one batch of
+        vectors is held in memory at a time.
+        Returns the number of records imported.
+        """
+        imported = 0
+        for batch in iter_import_batches(source, batch_size=batch_size):
+            pages = [Page(header=f"[ABSTRACT] {r.abstract}".strip(), content=r.content) for r in batch]
+            with lock_for(self.page_store).write():
+                start = len(self.page_store) if hasattr(self.page_store, "__len__") else len(self.page_store.load())
+                self._add_many(self.memory_store, [r.abstract for r in batch])
+                self._add_many(self.page_store, pages)
+            embeddings: Dict[int, np.ndarray] = {
+                start + offset: np.asarray(record.embedding, dtype=np.float32)
+                for offset, record in enumerate(batch) if record.embedding is not None
+            }
+            # 逐批灌入检索器：向量用完即释放，不在内存里攒整个导入
+            for retriever in retrievers:
+                seed = getattr(retriever, "seed", None)
+                if seed is not None:
+                    seed(self.page_store, embeddings)
+                else:
+                    retriever.update(self.page_store)
+            imported += len(batch)
+            if verbose:
+                print(f"  已导入 {imported} 条记录")
+
+        self._notify_indexer()
+        return imported
+
+    # ---- Internal----
+
+    def _notify_indexer(self) -> None:
+        if self.indexer is not None:
+            self.indexer.notify()
+
+    def _roll_up(self, abstracts: Sequence[str]) -> None:
+        """
+        Private. Summarize every full run of abstracts / rollups that is not
+        rolled up yet (at most one per level after a single memorize()).
+        """
+        if self.rollups is None:
+            return
+        while True:
+            group = self.rollups.next_group(abstracts)
+            if group is None:
+                return
+            level, start, end, texts = group
+            entries = "\n".join(f"- {text}" for text in texts)
+            template = self._cache_template(Rollup_PROMPT)
+            summary = None
+            if self.abstract_cache is not None:
+                summary = self.abstract_cache.get(self._generator_fingerprint, template, "", entries)
+            if summary is None:
+                try:
+                    response = self.generator.generate_single(prompt=Rollup_PROMPT.format(entries=entries))
+                    summary = response.get("text", "").strip()
+                    if self.abstract_cache is not None and summary:
+                        self.abstract_cache.put(self._generator_fingerprint, template, "", entries, summary)
+                except Exception as e:
+                    print(f"Error generating rollup: {e}")
+                    summary = ""
+            if not summary:
+                summary = " ".join(texts)[:200]
+            if not self.rollups.add(Rollup(level=level, start=start, end=end, summary=summary)):
+                return
+
+    @staticmethod
+    def _add_many(store: Any, items: List[Any]) -> None:
+        # 优先用 store 自带的批量接口（一次落盘），否则逐条 add（SQLite 合并成一个事务）
+        add_many = getattr(store, "add_many", None)
+        if add_many is not None:
+            add_many(items)
+            return
+        batch = getattr(store, "batch", None)
+        with batch() if batch is not None else nullcontext():
+            for item in items:
+                store.add(item)
+
+    @staticmethod
+    def _fingerprint(messages: Sequence[str]) -> str:
+        h = hashlib.sha256()
+        for message in messages:
+            data = message.encode("utf-8")
+            # 带长度前缀，避免不同切分方式拼出相同的字节流
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.hexdigest()
+
+    def _decorate(self, message: str, memory_state: MemoryState) -> Tuple[str, str]:
+        """
+        Private. Generate abstract for the message and the page header built from it.
+        Returns: (abstract, header); the decorated page is Page.decorated.
+        """
+        memory_context = self._memory_context(message, memory_state)
+        abstract = self._cached_abstract(message, memory_context)
+        if abstract is None:
+            abstract = self._generate_abstract(message, memory_context)
         
+        # Create header with the new abstract
+        header = f"[ABSTRACT] {abstract}".strip()
+        return abstract, header
+
+    def _generate_abstract(self, message: str, memory_context: str) -> str:
+        """Private. One generate_single() call (no cache lookup); the result is cached."""
+        try:
+            response = self.generator.generate_single(prompt=self._format_prompt(message, memory_context))
+            abstract = response.get("text", "").strip()
+            self._cache_abstract(message, memory_context, abstract)
+        except Exception as e:
+            print(f"Error generating abstract: {e}")
+            abstract = message[:200]
+        return abstract
+
+    def _memory_context(self, message: str, memory_state: MemoryState) -> str:
+        """Private. MEMORY_CONTEXT for `message`: all abstracts, a relevance selection or the rollup view."""
+        rewrite_generation = getattr(self.memory_store, "rewrite_generation", None)
+        if self.rollups is not None:
+            memory_context = self.rollups.render(memory_state.abstracts, query=message)
+        elif self._abstract_index is not None:
+            # 只带与当前消息最相关的 top-k 条 + 最近 N 条，prompt 长度不随 memory 增长
+            memory_context = select_memory_context(
+                memory_state.abstracts, self._abstract_index, message,
+                self.context_top_k, self.context_recent, rewrite_generation,
+            )
+        else:
+            # Build memory context from all abstracts（按 memory 版本缓存，只渲染新增的摘要）
+            memory_context = renderer_for(self.memory_store).render(memory_state.abstracts, rewrite_generation)
+        return memory_context
+
+    def _cache_template(self, template: str, system_prompt: str = "") -> str:
+        return f"{system_prompt}\n{template}"
+
+    def _cached_abstract(self, message: str, memory_context: str) -> Optional[str]:
+        """Private. Abstract cached for this prompt, or None (also when no cache is configured)."""
+        if self.abstract_cache is None:
+            return None
+        template = self._cache_template(MemoryAgent_PROMPT, self.system_prompts.get("memory") or "")
+        return self.abstract_cache.get(self._generator_fingerprint, template, memory_context, message)
+
+    def _cache_abstract(self, message: str, memory_context: str, abstract: str) -> None:
+        if self.abstract_cache is None or not abstract:
+            return
+        template = self._cache_template(MemoryAgent_PROMPT, self.system_prompts.get("memory") or "")
+        self.abstract_cache.put(self._generator_fingerprint, template, memory_context, message, abstract)
+
+    def _format_prompt(self, message: str, memory_context: str) -> str:
         # Generate abstract for the current message using LLM with memory context
         system_prompt = self.system_prompts.get("memory")
         template_prompt = MemoryAgent_PROMPT.format(
@@ -107,18 +458,5 @@ class MemoryAgent:
             memory_context=memory_context
         )
         if system_prompt:
-            prompt = f"User Instructions: {system_prompt}\n\n System Prompt: {template_prompt}"
-        else:
-            prompt = template_prompt
-        
-        try:
-            response = self.generator.generate_single(prompt=prompt)
-            abstract = response.get("text", "").strip()
-        except Exception as e:
-            print(f"Error generating abstract: {e}")
-            abstract = message[:200]
-        
-        # Create header with the new abstract
-        header = f"[ABSTRACT] {abstract}".strip()
-        decorated_new_page = f"{header}; {message}"
-        return abstract, header, decorated_new_page
\ No newline at end of file
+            return f"User Instructions: {system_prompt}\n\n System Prompt: {template_prompt}"
+        return template_prompt
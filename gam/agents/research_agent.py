@@ -18,12 +18,13 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional, Tuple
 import json
+import threading
 
 from gam.prompts import Planning_PROMPT, Integrate_PROMPT, InfoCheck_PROMPT, GenerateRequests_PROMPT
 from gam.schemas import (
     MemoryState, SearchPlan, Hit, Result, 
     ReflectionDecision, ResearchOutput, MemoryStore, PageStore, Retriever, 
-    ToolRegistry, InMemoryMemoryStore,
+    ToolRegistry, InMemoryMemoryStore, MemoryRollups, lock_for, renderer_for,
     PLANNING_SCHEMA, INTEGRATE_SCHEMA, INFO_CHECK_SCHEMA, GENERATE_REQUESTS_SCHEMA
 )
 from gam.generator import AbsGenerator
@@ -38,8 +39,13 @@ class ResearchAgent:
       - _integrate(search_results, temp_memory) -> TempMemory
       - _reflection(request, memory_state, temp_memory) -> ReflectionDecision
 
-    Note: Uses MemoryStore to dynamically load current memory state.
-    This allows ResearchAgent to access the latest memory updates from MemoryAgent.
+    Note: each research() call works on a snapshot taken when it starts:
+    the memory state and page count are read under the page store's read
+    lock (see lock_for), and hits on pages added after that are dropped.
+    MemoryAgent can keep ingesting meanwhile; the next call sees the updates.
+    The snapshot is a page-count cutoff, so it isolates appends only: a
+    replace() or delete() of an existing page during the call is visible
+    to it right away (new content, or the page disappears from hits).
     """
 
     def __init__(
@@ -52,15 +58,27 @@ class ResearchAgent:
         max_iters: int = 3,
         dir_path: Optional[str] = None,  # 新增：文件系统存储路径
         system_prompts: Optional[Dict[str, str]] = None,  # 新增：system prompts字典
+        warm_start: bool = False,  # 先尝试加载磁盘上已有的索引（如 import_bundle() 解出的），不行再 build
+        rollups: Optional[MemoryRollups] = None,  # 与 MemoryAgent 共用；planning 只看分层视图
+        indexer: Optional[Any] = None,  # BackgroundIndexer：检索器由后台线程更新，research() 不再内联更新
+        read_your_writes: bool = False,  # 有 indexer 时，先等索引追上当前页面版本
+        read_your_writes_timeout: Optional[float] = 30.0,  # 等待超时后改为同步更新检索器；None 表示一直等
     ) -> None:
         if generator is None:
             raise ValueError("Generator instance is required for ResearchAgent")
         self.page_store = page_store
-        self.memory_store = memory_store or InMemoryMemoryStore(dir_path=dir_path)
+        self.memory_store = memory_store if memory_store is not None else InMemoryMemoryStore(dir_path=dir_path)
         self.tools = tool_registry
         self.retrievers = retrievers or {}
         self.generator = generator
         self.max_iters = max_iters
+        self.rollups = rollups
+        self.indexer = indexer
+        self.read_your_writes = read_your_writes
+        self.read_your_writes_timeout = read_your_writes_timeout
+        # research() 可以多线程并发调用：快照按线程保存，检索器更新串行
+        self._local = threading.local()
+        self._update_lock = threading.Lock()
         
         # 初始化 system_prompts，默认值为空字符串
         default_system_prompts = {
@@ -76,6 +94,9 @@ class ResearchAgent:
 
         # Build indices upfront (if retrievers are provided)
         for name, r in self.retrievers.items():
+            if warm_start and getattr(r, "warm_start", None) is not None and r.warm_start(self.page_store):
+                print(f"Loaded {name} retriever index from disk")
+                continue
             try:
                 # 调用 retriever 的 build 方法，传递 page_store
                 r.build(self.page_store)
@@ -87,15 +108,25 @@ class ResearchAgent:
     # ---- Public ----
     def research(self, request: str) -> ResearchOutput:
         # 在开始研究前，确保检索器索引是最新的
-        self._update_retrievers()
-        
+        if self.indexer is None:
+            self._update_retrievers()
+        elif self.read_your_writes and not self.indexer.wait_for(timeout=self.read_your_writes_timeout):
+            # 后台索引没追上（卡住 / 已停止）：本次自己同步更新，保证读到自己的写入
+            print(
+                f"Warning: background indexer did not catch up (timeout: {self.read_your_writes_timeout}s), "
+                f"updating retrievers synchronously"
+            )
+            self._update_retrievers()
+
+        # 固定本次研究看到的 memory / page 版本
+        memory_state, visible_pages = self._snapshot()
+        self._local.visible_pages = visible_pages
+
         temp = Result()
         iterations: List[Dict[str, Any]] = []
         next_request = request
 
         for step in range(self.max_iters):
-            # Load current memory state dynamically
-            memory_state = self.memory_store.load()
             plan = self._planning(next_request, memory_state)
 
             temp = self._search(plan, temp, request)
@@ -124,14 +155,61 @@ class ResearchAgent:
         }
         return ResearchOutput(integrated_memory=temp.content, raw_memory=raw)
 
+    def _snapshot(self) -> Tuple[MemoryState, int]:
+        """
+        (copy of the memory state, number of pages) as one consistent version.
+        Only appends are isolated: pages below the count are read live, so an
+        in-place replace()/delete() still shows through.
+        """
+        self._refresh_stores()
+        with lock_for(self.page_store).read():
+            memory_state = MemoryState(abstracts=list(self.memory_store.load().abstracts))
+            if hasattr(self.page_store, "__len__"):
+                visible_pages = len(self.page_store)
+            else:
+                visible_pages = len(self.page_store.load())
+        return memory_state, visible_pages
+
+    def _visible(self, results: List[List[Hit]]) -> List[List[Hit]]:
+        """Drop hits on pages added after this research() call's snapshot."""
+        limit = getattr(self._local, "visible_pages", None)
+        if limit is None:
+            return results
+        return [
+            [h for h in hits if not (h.page_id and h.page_id.isdigit() and int(h.page_id) >= limit)]
+            for hits in results
+        ]
+
     def _update_retrievers(self):
         """确保检索器索引是最新的"""
-        # 检查是否有新的页面需要更新索引
-        current_page_count = len(self.page_store.load())
+        if self.indexer is not None:
+            # 有后台 indexer 时由它更新（与后台线程串行），不能两边同时改检索器
+            self.indexer.index_now()
+            return
+        with self._update_lock:
+            self._update_retrievers_locked()
+
+    def _refresh_stores(self) -> None:
+        # 多进程部署：读进程要先 refresh()，才能看到别的进程写入的页面 / 摘要
+        for store in (self.page_store, self.memory_store):
+            refresh = getattr(store, "refresh", None)
+            if refresh is not None:
+                refresh()
+
+    def _update_retrievers_locked(self):
+        self._refresh_stores()
+        # 优先用 store 的 generation 判断是否有变化（O(1)），否则退回按页数比较
+        generation = getattr(self.page_store, "generation", None)
+        if generation is not None:
+            current_version = generation
+        elif hasattr(self.page_store, "__len__"):
+            current_version = len(self.page_store)
+        else:
+            current_version = len(self.page_store.load())
         
-        # 如果页面数量发生变化，更新所有检索器索引
-        if hasattr(self, '_last_page_count') and current_page_count != self._last_page_count:
-            print(f"检测到页面数量变化 ({self._last_page_count} -> {current_page_count})，更新检索器索引...")
+        # 如果 store 发生变化，更新所有检索器索引（各检索器只处理增量）
+        if hasattr(self, '_last_page_version') and current_version != self._last_page_version:
+            print(f"检测到页面变化 ({self._last_page_version} -> {current_version})，更新检索器索引...")
             for name, retriever in self.retrievers.items():
                 try:
                     retriever.update(self.page_store)
@@ -139,8 +217,8 @@ class ResearchAgent:
                 except Exception as e:
                     print(f"❌ Failed to update {name} retriever: {e}")
         
-        # 更新页面计数
-        self._last_page_count = current_page_count
+        # 更新页面版本
+        self._last_page_version = current_version
 
     # ---- Internal ----
     def _planning(
@@ -156,13 +234,14 @@ class ResearchAgent:
           - keyword/vector/page_id payloads
         """
 
-        if not memory_state.abstracts:
-            memory_context = "No memory currently."
+        if self.rollups is not None:
+            # 分层视图：旧页面以 rollup 出现，与请求最相关的 rollup 展开一层
+            memory_context = self.rollups.render(memory_state.abstracts, query=request)
         else:
-            memory_context_lines = []
-            for i, abstract in enumerate(memory_state.abstracts):
-                memory_context_lines.append(f"Page {i}: {abstract}")
-            memory_context = "\n".join(memory_context_lines)
+            # 与 MemoryAgent 共用同一个 memory store 的渲染缓存，每轮只追加新摘要
+            memory_context = renderer_for(self.memory_store).render(
+                memory_state.abstracts, getattr(self.memory_store, "rewrite_generation", None)
+            )
         
         system_prompt = self.system_prompts.get("planning")
         template_prompt = Planning_PROMPT.format(request=request, memory=memory_context)
@@ -451,7 +530,7 @@ class ResearchAgent:
         if r is not None:
             try:
                 # BM25Retriever 返回 List[List[Hit]]
-                return r.search(query_list, top_k=top_k)
+                return self._visible(r.search(query_list, top_k=top_k))
             except Exception as e:
                 print(f"Error in keyword search: {e}")
                 return []
@@ -460,7 +539,10 @@ class ResearchAgent:
         for query in query_list:
             query_hits: List[Hit] = []
             q = query.lower()
-            for i, p in enumerate(self.page_store.load()):
+            limit = getattr(self._local, "visible_pages", None)
+            for i, p in enumerate(self.page_store.iter_range(0, limit)):
+                if p.is_tombstone:
+                    continue
                 if q in p.content.lower() or q in p.header.lower():
                     snippet = p.content
                     query_hits.append(Hit(page_id=str(i), snippet=snippet, source="keyword", meta={}))
@@ -473,7 +555,7 @@ class ResearchAgent:
         r = self.retrievers.get("vector")
         if r is not None:
             try:
-                return r.search(query_list, top_k=top_k)
+                return self._visible(r.search(query_list, top_k=top_k))
             except Exception as e:
                 print(f"Error in vector search: {e}")
                 return []
@@ -487,16 +569,19 @@ class ResearchAgent:
                 # IndexRetriever 现在期望 List[str]，将 page_index 转换为逗号分隔的字符串
                 query_string = ",".join([str(idx) for idx in page_index])
                 hits = r.search([query_string], top_k=len(page_index))
-                return hits if hits else []
+                return self._visible(hits) if hits else []
             except Exception as e:
                 print(f"Error in page index search: {e}")
                 return []
         
         # fallback: 直接通过 page_store 获取页面
         out: List[Hit] = []
+        limit = getattr(self._local, "visible_pages", None)
         for idx in page_index:
+            if limit is not None and idx >= limit:
+                continue
             p = self.page_store.get(idx)
-            if p:
+            if p and not p.is_tombstone:
                 out.append(Hit(page_id=str(idx), snippet=p.content, source="page_index", meta={}))
         return [out]  # 包装成 List[List[Hit]] 格式
         
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Token-aware chunking, the front of the ingest path.
+
+- Tokenizers are loaded once per process and cached by name (tiktoken
+  model/encoding names or HF tokenizer paths).
+- Chunks are slices of the original text cut at token character offsets,
+  so each document is tokenized once and nothing is decoded per chunk.
+- iter_document_chunks() chunks many documents in worker processes and
+  yields them lazily, ready to feed IngestPipeline.run().
+
+    from gam.chunking import iter_document_chunks
+    pipeline.run(iter_document_chunks(documents, max_tokens=2000, processes=8))
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+import multiprocessing
+import threading
+
+DEFAULT_TOKENIZER = "gpt-4o-2024-08-06"
+# 粗略估计：1 token ≈ 4 characters（没有可用 tokenizer 时使用）
+CHARS_PER_TOKEN = 4
+# 输入总长度不到这个值（且文档数不多）时不启用进程池
+PARALLEL_MIN_CHARS = 1_000_000
+# 每个 worker 最多在途的文档数，限制预读和结果缓存
+PENDING_PER_PROCESS = 2
+
+_tokenizers: Dict[str, Any] = {}
+_unavailable: Set[str] = set()  # 加载失败过的名字，不再重试也不重复告警
+_tokenizers_lock = threading.Lock()
+
+
+class _TiktokenTokenizer:
+    def __init__(self, name: str) -> None:
+        import tiktoken
+        try:
+            self._enc = tiktoken.encoding_for_model(name)
+        except KeyError:
+            self._enc = tiktoken.get_encoding(name)
+
+    def token_offsets(self, text: str) -> Optional[List[int]]:
+        tokens = self._enc.encode(text, disallowed_special=())
+        # 整篇只做一次 offset 计算，切块时直接按字符位置截取原文
+        _, offsets = self._enc.decode_with_offsets(tokens)
+        return offsets
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        tokens = self._enc.encode(text, disallowed_special=())
+        return [self._enc.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+class _HFTokenizer:
+    def __init__(self, name: str) -> None:
+        from transformers import AutoTokenizer
+        self._tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def token_offsets(self, text: str) -> Optional[List[int]]:
+        if not getattr(self._tokenizer, "is_fast", False):
+            return None  # slow tokenizer 没有 offset mapping
+        encoding = self._tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        return [start for start, _ in encoding["offset_mapping"]]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        tokens = self._tokenizer.encode(text, add_special_tokens=False)
+        return [
+            self._tokenizer.decode(tokens[i:i + max_tokens], skip_special_tokens=True)
+            for i in range(0, len(tokens), max_tokens)
+        ]
+
+
+def get_tokenizer(name: str = DEFAULT_TOKENIZER) -> Any:
+    """
+    The process-wide tokenizer for `name`: a tiktoken model / encoding name,
+    else a HF tokenizer name or path. Loaded once, then served from cache.
+    Raises ImportError / OSError if it cannot be loaded.
+    """
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(name)
+        if tokenizer is None:
+            try:
+                tokenizer = _TiktokenTokenizer(name)
+            except (KeyError, ValueError):
+                tokenizer = _HFTokenizer(name)
+            except ImportError:
+                if name == DEFAULT_TOKENIZER:
+                    raise
+                tokenizer = _HFTokenizer(name)
+            _tokenizers[name] = tokenizer
+        return tokenizer
+
+
+def split_by_tokens(text: str, max_tokens: int, tokenizer: Any) -> List[str]:
+    """Cut `text` into pieces of at most `max_tokens` tokens, slicing the original text at token offsets."""
+    offsets = tokenizer.token_offsets(text)
+    if offsets is None:
+        return tokenizer.split(text, max_tokens)
+    if len(offsets) <= max_tokens:
+        return [text] if text else []
+    bounds = [0] + [offsets[i] for i in range(max_tokens, len(offsets), max_tokens)] + [len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def split_by_chars(text: str, max_tokens: int) -> List[str]:
+    """Fallback without a tokenizer: ~max_tokens * 4 characters, cut at the last newline or space."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    current_start = 0
+    while current_start < len(text):
+        current_end = min(current_start + max_chars, len(text))
+        if current_end < len(text):
+            last_newline = text.rfind('\n', current_start, current_end)
+            if last_newline > current_start:
+                current_end = last_newline
+            else:
+                last_space = text.rfind(' ', current_start, current_end)
+                if last_space > current_start:
+                    current_end = last_space
+        pieces.append(text[current_start:current_end])
+        current_start = current_end
+    return pieces
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = 2000,
+    tokenizer: Optional[str] = None,
+    session_labels: bool = True,
+) -> List[str]:
+    """
+    Split one document into chunks of at most `max_tokens` tokens.
+
+    tokenizer: name for get_tokenizer(); when it cannot be loaded the
+        default tiktoken tokenizer is used, then character splitting.
+    session_labels: prefix each chunk with "[Session i]" as the eval
+        scripts have always done (a single chunk is "[Session 1]").
+    """
+    if not text:
+        return []
+    pieces: Optional[List[str]] = None
+    for name in ([tokenizer] if tokenizer and tokenizer != DEFAULT_TOKENIZER else []) + [DEFAULT_TOKENIZER]:
+        if name in _unavailable:
+            continue
+        try:
+            loaded = get_tokenizer(name)
+        except Exception as e:
+            _unavailable.add(name)
+            print(f"Warning: tokenizer {name!r} not available ({e}), falling back")
+            continue
+        pieces = split_by_tokens(text, max_tokens, loaded)
+        break
+    if pieces is None:
+        pieces = split_by_chars(text, max_tokens)
+
+    if not session_labels:
+        return [p.strip() for p in pieces if p.strip()]
+    if len(pieces) == 1:
+        return [f"[Session 1]\n{text}"]
+    chunks = []
+    for piece in pieces:
+        piece = piece.strip()
+        if piece:
+            chunks.append(f"[Session {len(chunks)}]\n{piece}")
+    return chunks
+
+
+def _chunk_worker(args: tuple) -> List[str]:
+    text, max_tokens, tokenizer, session_labels = args
+    return chunk_text(text, max_tokens, tokenizer, session_labels)
+
+
+def chunk_documents(
+    documents: Sequence[str],
+    max_tokens: int = 2000,
+    tokenizer: Optional[str] = None,
+    session_labels: bool = True,
+    processes: Optional[int] = None,
+) -> List[List[str]]:
+    """
+    chunk_text() for every document, in `processes` worker processes
+    (None: all CPUs, 1: in-process). Small inputs are chunked in-process.
+    """
+    return list(_iter_chunked(documents, max_tokens, tokenizer, session_labels, processes))
+
+
+def iter_document_chunks(
+    documents: Iterable[str],
+    max_tokens: int = 2000,
+    tokenizer: Optional[str] = None,
+    session_labels: bool = True,
+    processes: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    The chunks of every document, flattened in document order and produced
+    lazily, e.g. for IngestPipeline.run(). Workers run at most
+    PENDING_PER_PROCESS documents per process ahead of the consumer.
+    """
+    for chunks in _iter_chunked(documents, max_tokens, tokenizer, session_labels, processes):
+        yield from chunks
+
+
+def _iter_chunked(
+    documents: Iterable[str],
+    max_tokens: int,
+    tokenizer: Optional[str],
+    session_labels: bool,
+    processes: Optional[int],
+) -> Iterator[List[str]]:
+    jobs = ((text, max_tokens, tokenizer, session_labels) for text in documents)
+    if processes == 1:
+        for job in jobs:
+            yield _chunk_worker(job)
+        return
+
+    # 先预读一小段：输入很小时进程池的启动开销比切分本身还大，直接在本进程做
+    processes = processes or multiprocessing.cpu_count()
+    max_pending = processes * PENDING_PER_PROCESS
+    head: List[tuple] = []
+    head_chars = 0
+    for job in jobs:
+        head.append(job)
+        head_chars += len(job[0])
+        if len(head) >= max_pending or head_chars >= PARALLEL_MIN_CHARS:
+            break
+    else:
+        for job in head:
+            yield _chunk_worker(job)
+        return
+
+    # 最多 max_pending 个任务在途：输入按需读取，结果不会无限堆积（保持下游背压）
+    # 每个 worker 进程各自缓存 tokenizer，只加载一次
+    with multiprocessing.Pool(processes) as pool:
+        pending: Deque[Any] = deque(pool.apply_async(_chunk_worker, (job,)) for job in head)
+        for job in jobs:
+            yield pending.popleft().get()
+            pending.append(pool.apply_async(_chunk_worker, (job,)))
+        while pending:
+            yield pending.popleft().get()
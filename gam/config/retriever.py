@@ -29,4 +29,5 @@ class IndexRetrieverConfig:
 class BM25RetrieverConfig:
     """BM25关键词检索器配置"""
     index_dir: str = "./index/bm25"
-    threads: int = 4
\ No newline at end of file
+    threads: int = 4
+    max_dead_ratio: float = 0.2
\ No newline at end of file
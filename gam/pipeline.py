@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming ingest pipeline: chunk -> abstract -> persist -> index.
+
+Each stage runs in its own thread and hands work to the next through a
+bounded queue, so a slow stage blocks the ones upstream of it instead of
+letting chunks pile up in memory (backpressure), and retrievers index the
+first windows while later ones are still being abstracted.
+
+    pipeline = IngestPipeline(memory_agent, retrievers={"keyword": bm25, "vector": dense})
+    report = pipeline.run(chunk_iterator)
+    print(report.summary())
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+import queue
+import threading
+import time
+
+from pydantic import BaseModel, Field
+
+from gam.agents import MemoryAgent
+from gam.schemas import MemoryState, lock_for
+
+_DONE = object()
+
+
+class StageStats(BaseModel):
+    """Counters of one pipeline stage."""
+    name: str = Field(..., description="Stage name")
+    items: int = Field(0, description="Chunks that went through the stage")
+    batches: int = Field(0, description="Work units (windows / index updates) processed")
+    busy_seconds: float = Field(0.0, description="Time spent doing work")
+    wait_input_seconds: float = Field(0.0, description="Time blocked waiting for the upstream stage")
+    wait_output_seconds: float = Field(0.0, description="Time blocked on a full downstream queue (backpressure)")
+
+    def throughput(self) -> float:
+        """Items per busy second."""
+        return self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0
+
+
+class PipelineReport(BaseModel):
+    """Result of IngestPipeline.run()."""
+    chunks: int = Field(0, description="Chunks memorized")
+    pages_added: int = Field(0, description="Pages added to the page store")
+    elapsed_seconds: float = Field(0.0, description="Wall-clock time of the run")
+    stages: Dict[str, StageStats] = Field(default_factory=dict, description="Per-stage counters")
+
+    def summary(self) -> str:
+        lines = [f"{self.chunks} chunks in {self.elapsed_seconds:.1f}s "
+                 f"({self.chunks / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0:.2f} chunks/s)"]
+        for stats in self.stages.values():
+            lines.append(
+                f"  {stats.name:<9} items={stats.items:<6} busy={stats.busy_seconds:7.2f}s "
+                f"({stats.throughput():.2f}/s) wait_in={stats.wait_input_seconds:7.2f}s "
+                f"wait_out={stats.wait_output_seconds:7.2f}s"
+            )
+        return "\n".join(lines)
+
+
+class IngestPipeline:
+    """
+    Memorize a stream of chunks and keep retrievers indexed while doing so.
+
+    Stages (one thread each, connected by queues of `queue_size` windows):
+      - chunk:    pulls from the chunk iterable and groups `window` chunks
+      - abstract: `abstract_workers` threads, each generating a window's
+                  abstracts with one generate_batch() call against the
+                  memory as of the last committed window
+      - persist:  puts windows back in input order and commits them
+                  (abstracts + pages, one write lock)
+      - index:    calls update(page_store) on every retriever; windows that
+                  queued up while an update ran are folded into the next one
+    The result matches memorize_batch() except that a window may not see the
+    abstracts of the windows committed just before it (up to
+    abstract_workers + queue_size windows back). The first error in
+    any stage stops the pipeline and is re-raised by run().
+    """
+    def __init__(
+        self,
+        memory_agent: MemoryAgent,
+        retrievers: Optional[Dict[str, Any]] = None,
+        window: int = 8,
+        queue_size: int = 4,
+        abstract_workers: int = 1,
+    ) -> None:
+        self.memory_agent = memory_agent
+        self.retrievers = retrievers or {}
+        self.window = max(1, window)
+        self.queue_size = max(1, queue_size)
+        self.abstract_workers = max(1, abstract_workers)
+
+    def _page_count(self) -> int:
+        page_store = self.memory_agent.page_store
+        return len(page_store) if hasattr(page_store, "__len__") else len(page_store.load())
+
+    def run(self, chunks: Iterable[str], verbose: bool = False) -> PipelineReport:
+        agent = self.memory_agent
+        stats = {name: StageStats(name=name) for name in ("chunk", "abstract", "persist", "index")}
+        to_abstract: "queue.Queue[Any]" = queue.Queue(self.queue_size)
+        to_persist: "queue.Queue[Any]" = queue.Queue(self.queue_size)
+        to_index: "queue.Queue[Any]" = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        stats_lock = threading.Lock()  # 多个 abstract worker 共用一份计数
+        errors: List[BaseException] = []
+        pages_before = self._page_count()
+
+        def put(q: "queue.Queue[Any]", item: Any, stage: StageStats) -> bool:
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    with stats_lock:
+                        stage.wait_output_seconds += time.perf_counter() - start
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: "queue.Queue[Any]", stage: StageStats) -> Any:
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    item = q.get(timeout=0.1)
+                    with stats_lock:
+                        stage.wait_input_seconds += time.perf_counter() - start
+                    return item
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def stage_thread(name: str, target: Any) -> threading.Thread:
+            def body() -> None:
+                try:
+                    target(stats[name])
+                except BaseException as e:
+                    errors.append(e)
+                    stop.set()
+            return threading.Thread(target=body, name=f"gam-ingest-{name}", daemon=True)
+
+        def chunk_stage(st: StageStats) -> None:
+            seq = 0
+            batch: List[str] = []
+            iterator = iter(chunks)
+            while True:
+                start = time.perf_counter()
+                chunk = next(iterator, _DONE)
+                st.busy_seconds += time.perf_counter() - start
+                if chunk is _DONE or stop.is_set():
+                    break
+                batch.append(chunk.strip())
+                st.items += 1
+                if len(batch) >= self.window:
+                    st.batches += 1
+                    if not put(to_abstract, (seq, batch), st):
+                        return
+                    seq += 1
+                    batch = []
+            if batch:
+                st.batches += 1
+                put(to_abstract, (seq, batch), st)
+            for _ in range(self.abstract_workers):
+                put(to_abstract, _DONE, st)
+
+        def abstract_stage(st: StageStats) -> None:
+            while True:
+                item = get(to_abstract, st)
+                if item is _DONE:
+                    break
+                seq, batch = item
+                start = time.perf_counter()
+                # persist 线程可能正在提交，先在读锁下复制一份 memory
+                with lock_for(agent.page_store).read():
+                    state = MemoryState(abstracts=list(agent.memory_store.load().abstracts))
+                decorated = agent.decorate_window(batch, state)
+                with stats_lock:
+                    st.busy_seconds += time.perf_counter() - start
+                    st.items += len(batch)
+                    st.batches += 1
+                if not put(to_persist, (seq, batch, decorated), st):
+                    return
+            put(to_persist, _DONE, st)
+
+        def persist_stage(st: StageStats) -> None:
+            # worker 完成顺序不定：按 seq 缓存，凑齐下一个窗口才提交
+            reorder: Dict[int, Any] = {}
+            next_seq = 0
+            workers_done = 0
+            while workers_done < self.abstract_workers:
+                item = get(to_persist, st)
+                if item is _DONE:
+                    if stop.is_set():
+                        return
+                    workers_done += 1
+                    continue
+                seq, batch, decorated = item
+                reorder[seq] = (batch, decorated)
+                while next_seq in reorder:
+                    batch, decorated = reorder.pop(next_seq)
+                    next_seq += 1
+                    start = time.perf_counter()
+                    agent.commit_window(batch, decorated)
+                    st.busy_seconds += time.perf_counter() - start
+                    st.items += len(batch)
+                    st.batches += 1
+                    if verbose:
+                        print(f"  已提交 {stats['persist'].items} 个上下文块")
+                    if not put(to_index, len(batch), st):
+                        return
+            put(to_index, _DONE, st)
+
+        def index_stage(st: StageStats) -> None:
+            done = False
+            while not done:
+                item = get(to_index, st)
+                if item is _DONE:
+                    break
+                pending = item
+                # 更新期间排队的窗口合并成一次增量更新
+                while True:
+                    try:
+                        item = to_index.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    pending += item
+                start = time.perf_counter()
+                for retriever in self.retrievers.values():
+                    retriever.update(agent.page_store)
+                st.busy_seconds += time.perf_counter() - start
+                st.items += pending
+                st.batches += 1
+
+        threads = [
+            stage_thread("chunk", chunk_stage),
+            *(stage_thread("abstract", abstract_stage) for _ in range(self.abstract_workers)),
+            stage_thread("persist", persist_stage),
+            stage_thread("index", index_stage),
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+        report = PipelineReport(
+            chunks=stats["persist"].items,
+            pages_added=self._page_count() - pages_before,
+            elapsed_seconds=time.perf_counter() - started,
+            stages=stats,
+        )
+        if verbose:
+            print(report.summary())
+        return report
@@ -9,11 +9,12 @@ Available Prompts:
 - memory_prompts: Templates for memory management and updating.
 - research_prompts: Templates for research, reasoning, and scientific inquiry.
 """
-from .memory_prompts import MemoryAgent_PROMPT
+from .memory_prompts import MemoryAgent_PROMPT, Rollup_PROMPT
 from .research_prompts import Planning_PROMPT, Integrate_PROMPT, InfoCheck_PROMPT, GenerateRequests_PROMPT
 
 __all__ = [
     "MemoryAgent_PROMPT",
+    "Rollup_PROMPT",
     "Planning_PROMPT",
     "Integrate_PROMPT",
     "InfoCheck_PROMPT",
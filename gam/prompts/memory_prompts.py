@@ -39,4 +39,21 @@ STYLE RULES:
 
 OUTPUT FORMAT:
 Return ONLY the single paragraph. Do NOT add any headings or labels.
-"""
\ No newline at end of file
+"""
+
+Rollup_PROMPT = """
+You are the MemoryAgent. Your job is to merge a run of consecutive memory entries into one rollup entry for long-term memory.
+
+INPUTS:
+ENTRIES (consecutive, oldest first):
+{entries}
+
+YOUR TASK:
+Write one concise, self-contained paragraph that summarizes ENTRIES so a reader can tell which topics, people, decisions, facts and open issues they cover, and whether a question might be answered by reading the underlying pages.
+- Keep names, identifiers, dates and numbers that distinguish these entries from others.
+- Prefer breadth (mention every distinct topic briefly) over detail.
+- Do NOT invent information that is not in ENTRIES.
+
+OUTPUT FORMAT:
+Return ONLY the single paragraph. Do NOT add any headings or labels.
+"""
@@ -9,12 +9,16 @@ Available Retrievers:
 - DenseRetriever: Semantic search using dense vector embeddings
 - BM25Retriever: Keyword-based search using BM25 algorithm
 - IndexRetriever: Direct page access by index
+- NamespacedRetriever: One tenant's view of a retriever shared across namespaces
+- BackgroundIndexer: Keeps retrievers in sync with a page store off the query path
 """
 
 from __future__ import annotations
 
 from .base import AbsRetriever
 from .index_retriever import IndexRetriever
+from .namespaced import NamespacedRetriever
+from .indexer import BackgroundIndexer
 
 # Lazy imports to avoid dependency issues
 try:
@@ -34,6 +38,8 @@ except ImportError:
 __all__ = [
     "AbsRetriever",
     "IndexRetriever",
+    "NamespacedRetriever",
+    "BackgroundIndexer",
 ]
 
 # Only add retrievers if they were successfully imported
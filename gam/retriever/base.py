@@ -1,6 +1,50 @@
+import hashlib
+import json
+import os
+import threading
 from abc import ABC, abstractmethod
-from gam.schemas import InMemoryPageStore, Hit
-from typing import Any, List, Dict
+from gam.schemas import (
+    InMemoryPageStore, MmapPageStore, ChangeFeed, Hit, Page, PageChange,
+    PageCache, CachedPages, ReadWriteLock, get_shared_page_cache,
+)
+from typing import Any, Collection, List, Dict, Optional, Tuple
+
+
+def _open_snapshot(pages_dir: str) -> MmapPageStore:
+    """
+    Open a retriever's on-disk page snapshot (the cold tier behind the page cache).
+    Snapshots written by older versions as pages.json are converted once.
+    """
+    store = MmapPageStore(pages_dir)
+    # 没有人订阅快照的 change feed，不必保留事件（否则会攥住最近的 Page 对象）
+    store.change_feed = ChangeFeed(retention=1)
+    legacy_file = os.path.join(pages_dir, "pages.json")
+    if len(store) == 0 and os.path.exists(legacy_file):
+        store.save(InMemoryPageStore(dir_path=pages_dir, trusted=True).load())
+        os.remove(legacy_file)
+    return store
+
+
+def _content_digest(page_store) -> str:
+    """
+    sha256 over every page's encoded record in id order: MmapPageStore's raw
+    bytes when the store has get_raw(), else the same JSON encoding.
+    """
+    h = hashlib.sha256()
+    num_pages = len(page_store)
+    get_raw = getattr(page_store, "get_raw", None)
+    if get_raw is not None:
+        records = (bytes(get_raw(i)) for i in range(num_pages))
+    else:
+        records = (
+            json.dumps(page.model_dump(), ensure_ascii=False).encode("utf-8")
+            for page in page_store.iter_range(0, num_pages)
+        )
+    for data in records:
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
 
 class AbsRetriever(ABC):
     def __init__(
@@ -8,9 +52,21 @@ class AbsRetriever(ABC):
         config: Dict[str, Any],
     ):
         self.config = config
+        # _sync_point(page_store) at the last build()/update()
+        self._synced_at: Optional[Tuple[int, Optional[int], Optional[int]]] = None
+        # 页面只落在磁盘快照里，经共享 PageCache 读取；self.pages 是按 id 访问的视图
+        self._snapshot: Optional[MmapPageStore] = None
+        self.pages: Optional[CachedPages] = None
+        # search() 持读锁；build()/update() 在锁外准备好新状态，只在写锁内换上去。
+        # _update_lock 保证同一时刻只有一个 build()/update()
+        self._state_lock = ReadWriteLock()
+        self._update_lock = threading.RLock()
 
     @abstractmethod
-    def search(self, query_list: List[str], top_k: int = 10) -> List[List[Hit]]:
+    def search(
+        self, query_list: List[str], top_k: int = 10, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
+        """id_filter, when given, restricts hits to those page ids (e.g. one namespace's pages)."""
         pass
 
     @abstractmethod
@@ -23,4 +79,141 @@ class AbsRetriever(ABC):
 
     @abstractmethod
     def update(self, page_store: InMemoryPageStore):
-        pass
\ No newline at end of file
+        pass
+
+    def seed(self, page_store, embeddings: Optional[Dict[int, Any]] = None) -> None:
+        """
+        Index pages written by MemoryAgent.bulk_import(). `embeddings` maps
+        page id -> precomputed vector; retrievers that don't use vectors
+        ignore it and just update().
+        """
+        self.update(page_store)
+
+    def bundle_files(self) -> Dict[str, str]:
+        """
+        On-disk index files (path relative to index_dir -> absolute path) that
+        export_bundle() packs next to the page snapshot. Empty when the page
+        snapshot is the retriever's whole state.
+        """
+        return {}
+
+    def warm_start(self, page_store) -> bool:
+        """
+        load() the on-disk index (e.g. one unpacked by import_bundle()) and
+        adopt it as in sync with `page_store` if its page snapshot holds the
+        same pages (equal content digests, not just the same count), so no
+        build() is needed. Returns False when the caller should build() instead.
+        """
+        with self._update_lock:
+            sync_point = self._sync_point(page_store)
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Warning: cannot load {type(self).__name__} index: {e}")
+                return False
+            if self.pages is None or len(self.pages) != len(page_store):
+                return False
+            if _content_digest(self._snapshot) != _content_digest(page_store):
+                print(f"Warning: {type(self).__name__} index on disk belongs to different pages, rebuilding")
+                return False
+            self._synced_at = sync_point
+            return True
+
+    # ---- incremental sync helpers ----
+    @staticmethod
+    def _sync_point(page_store) -> Optional[Tuple[int, Optional[int], Optional[int]]]:
+        """
+        (store identity, generation, change feed seq) of `page_store` right now.
+        Take it BEFORE reading the store, so concurrent adds are picked up next time.
+        """
+        generation = getattr(page_store, "generation", None)
+        feed = getattr(page_store, "change_feed", None)
+        if generation is None and feed is None:
+            return None
+        return (id(page_store), generation, feed.last_seq if feed is not None else None)
+
+    def _is_synced(self, page_store) -> bool:
+        sync_point = self._sync_point(page_store)
+        return sync_point is not None and sync_point == self._synced_at
+
+    def _changes_since_sync(self, page_store, sync_point) -> Optional[List[PageChange]]:
+        """
+        Page changes after the last build()/update() up to `sync_point`, from
+        the store's change feed. None means the delta is unknown (no feed,
+        other store, or fell behind the feed's retention): rebuild instead.
+        """
+        feed = getattr(page_store, "change_feed", None)
+        if feed is None or self._synced_at is None or sync_point is None:
+            return None
+        store_id, _, cursor = self._synced_at
+        if store_id != id(page_store) or cursor is None:
+            return None
+        changes = feed.since(cursor)
+        if changes is None:
+            return None
+        return [c for c in changes if c.seq <= sync_point[2]]
+
+    @staticmethod
+    def _apply_changes(
+        num_pages: int, changes: List[PageChange]
+    ) -> Optional[Tuple[int, Dict[int, Page]]]:
+        """
+        Fold `changes` over a snapshot holding `num_pages` pages.
+        Returns (new page count, {id: new page} for every page whose content
+        changed), or None if the changes don't line up with the snapshot
+        (caller should rebuild).
+        """
+        latest: Dict[int, Page] = {}
+        new_len = num_pages
+        for change in changes:
+            if change.op == "delete":
+                latest.pop(change.page_id, None)
+                new_len = min(new_len, change.page_id)
+            else:
+                latest[change.page_id] = change.page
+                new_len = max(new_len, change.page_id + 1)
+        changed = {i: latest[i] for i in sorted(latest) if i < new_len}
+        # 快照之后的每个位置都必须有新页面，否则中间有空洞
+        if any(i not in changed for i in range(num_pages, new_len)):
+            return None
+        return new_len, changed
+
+    # ---- page snapshot + cache ----
+    def _page_cache(self) -> PageCache:
+        cache = self.config.get("page_cache")
+        return cache if cache is not None else get_shared_page_cache()
+
+    def _attach_snapshot(self, pages_dir: str) -> MmapPageStore:
+        """(Re)open the snapshot under `pages_dir` and point self.pages at it through the cache."""
+        if self.pages is not None:
+            self.pages.invalidate()
+        if self._snapshot is not None:
+            self._snapshot.close()
+        self._snapshot = _open_snapshot(pages_dir)
+        self.pages = self._page_cache().view(self._snapshot)
+        return self._snapshot
+
+    def _write_snapshot(self, pages: List[Page]) -> None:
+        """Replace the whole snapshot (after a full build)."""
+        self._snapshot.save(pages)
+        self.pages.invalidate()
+
+    def _write_snapshot_delta(self, new_len: int, changed: Dict[int, Page]) -> None:
+        """Persist the output of _apply_changes() to the snapshot: replace changed ids in place, append new ones."""
+        old_len = len(self._snapshot)
+        if new_len >= old_len:
+            replaced = [i for i in changed if i < old_len]
+            for i in replaced:
+                self._snapshot.replace(i, changed[i])
+            for i in range(old_len, new_len):
+                self._snapshot.add(changed[i])
+            if replaced:
+                self.pages.invalidate(replaced)
+            return
+        # 截断：需要重写快照（少见，只在这一步临时读出全部页面）
+        pages = list(self._snapshot.iter_range(0, min(old_len, new_len)))
+        pages.extend(changed[i] for i in range(len(pages), new_len))
+        for i, page in changed.items():
+            pages[i] = page
+        self._snapshot.save(pages)
+        self.pages.invalidate(list(changed) + list(range(new_len, old_len)))
@@ -1,13 +1,30 @@
 import os, json, subprocess, shutil, time
-from typing import Dict, Any, List
+from pathlib import Path
+from typing import Collection, Dict, Any, List, Optional
 
 try:
     from pyserini.search.lucene import LuceneSearcher
 except ImportError:
     LuceneSearcher = None  # type: ignore
 
+try:
+    # 较新版本的 pyserini 提供进程内的增量写接口
+    from pyserini.index.lucene import LuceneIndexer
+except ImportError:
+    LuceneIndexer = None  # type: ignore
+
+try:
+    # 按文档打分（id_filter 很小时直接给过滤集合里的文档打分）
+    from pyserini.index.lucene import LuceneIndexReader
+except ImportError:
+    try:
+        from pyserini.index.lucene import IndexReader as LuceneIndexReader
+    except ImportError:
+        LuceneIndexReader = None  # type: ignore
+
 from gam.retriever.base import AbsRetriever
 from gam.schemas import InMemoryPageStore, Hit, Page
+from gam.schemas.persistence import atomic_write_json
 
 
 def _safe_rmtree(path: str, max_retries: int = 3, delay: float = 0.5) -> None:
@@ -50,8 +67,18 @@ class BM25Retriever(AbsRetriever):
         config 需要:
         {
             "index_dir": "xxx",   # 用来放 index/ 和 pages/
-            "threads": 4
+            "threads": 4,
+            "max_dead_ratio": 0.2  # 失效文档超过页面数的这个比例时全量重建（可选）
         }
+
+        页面被替换/删除时不重建：新内容以带版本号的 docid（"12.1"）追加进 Lucene，
+        documents/versions.json 记录每个页面当前有效的版本，检索时过滤掉旧版本
+        和 tombstone 页面。pyserini 的增量写接口不支持删除文档，失效文档留在索引里，
+        积累过多时整体重建一次。
+
+        带 id_filter 检索时，先按命中率估算要多取的结果数 top_k * 页面数 / |id_filter|；
+        这个数比 |id_filter| 还大时（小命名空间），改为直接给过滤集合里的文档逐个打分，
+        两种做法的代价都不超过 sqrt(top_k * 页面数)。
     """
 
     def __init__(self, config: Dict[str, Any]):
@@ -60,7 +87,11 @@ class BM25Retriever(AbsRetriever):
             raise ImportError("BM25Retriever requires pyserini to be installed")
         self.index_dir = self.config["index_dir"]
         self.searcher: LuceneSearcher | None = None
-        self.pages: List[Page] = []
+        self._reader = None  # 按文档打分用的 index reader，跟着 searcher 换新
+        # page id -> 当前有效的文档版本（不在表里即版本 0，docid 就是 page id）
+        self._versions: Dict[int, int] = {}
+        # 索引里已失效（被替换/删除）但还没清掉的文档数
+        self._dead_docs = 0
 
     def _pages_dir(self):
         return os.path.join(self.index_dir, "pages")
@@ -71,14 +102,42 @@ class BM25Retriever(AbsRetriever):
     def _docs_dir(self):
         return os.path.join(self.index_dir, "documents")
 
+    def _versions_path(self):
+        return os.path.join(self._docs_dir(), "versions.json")
+
+    def _write_versions(self, versions: Dict[int, int], dead_docs: int) -> None:
+        atomic_write_json(
+            Path(self._versions_path()),
+            {"versions": {str(i): v for i, v in versions.items()}, "dead_docs": dead_docs},
+        )
+
+    @staticmethod
+    def _docid(page_id: int, version: int) -> str:
+        return str(page_id) if version == 0 else f"{page_id}.{version}"
+
     def load(self) -> None:
         # 尝试从磁盘恢复
         if not os.path.exists(self._lucene_dir()):
             raise RuntimeError("BM25 index not found, need build() first.")
-        self.pages = InMemoryPageStore.load(self._pages_dir()).load()
-        self.searcher = LuceneSearcher(self._lucene_dir())  # type: ignore
+        searcher = LuceneSearcher(self._lucene_dir())  # type: ignore
+        versions: Dict[int, int] = {}
+        dead_docs = 0
+        if os.path.exists(self._versions_path()):
+            with open(self._versions_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            versions = {int(i): v for i, v in data.get("versions", {}).items()}
+            dead_docs = data.get("dead_docs", 0)
+        with self._state_lock.write():
+            self._attach_snapshot(self._pages_dir())
+            self.searcher, self._reader = searcher, None
+            self._versions, self._dead_docs = versions, dead_docs
 
     def build(self, page_store: InMemoryPageStore) -> None:
+        with self._update_lock:
+            self._build_locked(page_store)
+
+    def _build_locked(self, page_store: InMemoryPageStore) -> None:
+        # 已打开的 searcher 持有旧索引文件的句柄，重建期间仍可继续检索
         # 0. 首先清理所有旧的目录和文件，确保干净的状态
         # 使用安全删除函数，带重试机制
         _safe_rmtree(self._lucene_dir())
@@ -89,10 +148,14 @@ class BM25Retriever(AbsRetriever):
         os.makedirs(self._docs_dir(), exist_ok=True)
 
         # 2. dump pages -> documents.jsonl (pyserini需要 id + contents)
+        sync_point = self._sync_point(page_store)
         pages = page_store.load()
         docs_path = os.path.join(self._docs_dir(), "documents.jsonl")
         with open(docs_path, "w", encoding="utf-8") as f:
             for i, p in enumerate(pages):
+                if p.is_tombstone:
+                    # 已删除的页面不进索引
+                    continue
                 text = (p.header + " " + p.content).strip()
                 text = '\n'.join(p.content.split('\n')[1:])
                 text = p.content
@@ -131,25 +194,71 @@ class BM25Retriever(AbsRetriever):
                 os.makedirs(self._lucene_dir(), exist_ok=True)
                 time.sleep(1)
 
-        # 5. 把 pages 也固化到磁盘，供 load() / search() 反查
-        # 创建临时 PageStore 实例来保存
-        temp_page_store = InMemoryPageStore(dir_path=self._pages_dir())
-        temp_page_store.save(pages)
-        
-        # 6. 更新内存镜像
-        self.pages = pages
-        self.searcher = LuceneSearcher(self._lucene_dir())  # type: ignore
+        # 5. 打开新索引，并把 pages 固化到磁盘（供 load() / search() 经 PageCache 反查），
+        #    在写锁内一起换上
+        searcher = LuceneSearcher(self._lucene_dir())  # type: ignore
+        self._write_versions({}, 0)
+        with self._state_lock.write():
+            self._attach_snapshot(self._pages_dir())
+            self._write_snapshot(pages)
+            self.searcher, self._reader = searcher, None
+            self._versions, self._dead_docs = {}, 0
+        self._synced_at = sync_point
 
     def update(self, page_store: InMemoryPageStore) -> None:
+        with self._update_lock:
+            self._update_locked(page_store)
+
+    def _update_locked(self, page_store: InMemoryPageStore) -> None:
+        # store 没变就不必重建
+        if self.searcher is not None and self._is_synced(page_store):
+            return
+        # 新增/替换/删除页面时，按 change feed 把新版本文档追加进已有的 Lucene 索引
+        if self.searcher is not None and LuceneIndexer is not None:
+            sync_point = self._sync_point(page_store)
+            changes = self._changes_since_sync(page_store, sync_point)
+            applied = self._apply_changes(len(self.pages), changes) if changes is not None else None
+            if applied is not None:
+                new_len, changed = applied
+                if new_len >= len(self.pages) and self._append_documents(new_len, changed):
+                    self._synced_at = sync_point
+                    return
         # Lucene 没有好用的“增量追加+可删改文档”的轻量接口（有但复杂）；
         # 对现在这个原型我们可以直接全量重建，保持简单可靠。
         self.build(page_store)
 
-    def search(self, query_list: List[str], top_k: int = 10) -> List[List[Hit]]:
+    def bundle_files(self) -> Dict[str, str]:
+        """Lucene postings (index/) and the documents/ dump used for incremental appends."""
+        files: Dict[str, str] = {}
+        with self._state_lock.read():
+            for sub_dir in (self._lucene_dir(), self._docs_dir()):
+                for root, _, names in os.walk(sub_dir):
+                    for file_name in names:
+                        path = os.path.join(root, file_name)
+                        files[os.path.relpath(path, self.index_dir).replace(os.sep, "/")] = path
+        return files
+
+    def search(
+        self, query_list: List[str], top_k: int = 10, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
         if self.searcher is None:
             # 容错：如果忘了 load/build
             self.load()
 
+        with self._state_lock.read():
+            return self._search_locked(query_list, top_k, id_filter)
+
+    def _search_locked(
+        self, query_list: List[str], top_k: int, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
+        # 失效文档可能排在前面，多取一些再过滤
+        fetch_k = top_k + min(self._dead_docs, 10 * top_k)
+        if id_filter is not None:
+            # 按 id 过滤时命中率约为 |id_filter| / 页面数，按比例放大
+            fetch_k = max(fetch_k, top_k * len(self.pages) // max(len(id_filter), 1))
+            if len(id_filter) < fetch_k and LuceneIndexReader is not None:
+                # 过滤集合比要多取的结果还少：直接给这些文档打分
+                return [self._score_filtered(q.strip(), top_k, id_filter) for q in query_list]
         results_all: List[List[Hit]] = []
         for q in query_list:
             q = q.strip()
@@ -158,21 +267,93 @@ class BM25Retriever(AbsRetriever):
                 continue
 
             hits_for_q = []
-            py_hits = self.searcher.search(q, k=top_k)
-            for rank, h in enumerate(py_hits):
-                # h.docid 是字符串 id
-                idx = int(h.docid)
+            py_hits = self.searcher.search(q, k=min(fetch_k, max(len(self.pages), 1) + self._dead_docs))
+            for h in py_hits:
+                # h.docid 是 "page_id" 或 "page_id.version"
+                page_part, _, version = h.docid.partition(".")
+                idx = int(page_part)
                 if idx < 0 or idx >= len(self.pages):
                     continue
+                if id_filter is not None and idx not in id_filter:
+                    continue
+                if int(version or 0) != self._versions.get(idx, 0):
+                    # 页面已被替换，这是旧版本
+                    continue
                 page = self.pages[idx]
+                if page.is_tombstone:
+                    continue
                 snippet = page.content
                 hits_for_q.append(
                     Hit(
                         page_id=str(idx),
                         snippet=snippet,
                         source="keyword",
-                        meta={"rank": rank, "score": float(h.score)}
+                        meta={"rank": len(hits_for_q), "score": float(h.score)}
                     )
                 )
+                if len(hits_for_q) >= top_k:
+                    break
             results_all.append(hits_for_q)
         return results_all
+
+    def _score_filtered(self, q: str, top_k: int, id_filter: Collection[int]) -> List[Hit]:
+        """BM25 score of the current version of every live page in id_filter, best top_k."""
+        if not q:
+            return []
+        if self._reader is None:
+            self._reader = LuceneIndexReader(self._lucene_dir())  # type: ignore
+        scored = []
+        for idx in id_filter:
+            if idx < 0 or idx >= len(self.pages) or self.pages[idx].is_tombstone:
+                continue
+            score = self._reader.compute_query_document_score(self._docid(idx, self._versions.get(idx, 0)), q)
+            if score > 0:
+                scored.append((score, idx))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [
+            Hit(page_id=str(idx), snippet=self.pages[idx].content, source="keyword", meta={"rank": rank, "score": float(score)})
+            for rank, (score, idx) in enumerate(scored[:top_k])
+        ]
+
+    def _append_documents(self, new_len: int, changed: Dict[int, Page]) -> bool:
+        """
+        Append a new Lucene document version for every changed page (new pages
+        get version 0, replaced ones the next version; tombstones get none).
+        Returns False without touching anything if the dead documents would
+        exceed max_dead_ratio, in which case the caller rebuilds.
+        """
+        old_len = len(self.pages)
+        versions = dict(self._versions)
+        dead_docs = self._dead_docs
+        docs = []
+        for i, page in changed.items():
+            if i < old_len:
+                # 旧版本文档失效（旧页面本身是 tombstone 时索引里没有它）
+                if not self.pages[i].is_tombstone:
+                    dead_docs += 1
+                versions[i] = versions.get(i, 0) + 1
+            if not page.is_tombstone:
+                docs.append({"id": self._docid(i, versions.get(i, 0)), "contents": page.content})
+        if dead_docs > self.config.get("max_dead_ratio", 0.2) * max(new_len, 1):
+            return False
+
+        if docs:
+            indexer = LuceneIndexer(self._lucene_dir(), append=True, threads=self.config.get("threads", 1))
+            try:
+                indexer.add_batch_dict(docs)
+            finally:
+                indexer.close()
+            with open(os.path.join(self._docs_dir(), "documents.jsonl"), "a", encoding="utf-8") as f:
+                for doc in docs:
+                    json.dump(doc, f, ensure_ascii=False)
+                    f.write("\n")
+        if versions != self._versions:
+            self._write_versions(versions, dead_docs)
+        # 重新打开 searcher 才能看到新提交的段；旧 searcher 停在旧的提交点
+        searcher = LuceneSearcher(self._lucene_dir()) if docs else self.searcher  # type: ignore
+        with self._state_lock.write():
+            self._write_snapshot_delta(new_len, changed)
+            if searcher is not self.searcher:
+                self.searcher, self._reader = searcher, None
+            self._versions, self._dead_docs = versions, dead_docs
+        return True
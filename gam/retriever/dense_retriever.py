@@ -1,8 +1,9 @@
+import io
 import os
 import json
 import numpy as np
 import requests
-from typing import Dict, Any, List, Optional
+from typing import Collection, Dict, Any, List, Optional, Tuple
 from FlagEmbedding import FlagAutoModel
 import faiss
 
@@ -10,27 +11,43 @@ from gam.retriever.base import AbsRetriever
 from gam.schemas import InMemoryPageStore, Hit, Page
 
 
+def _live_vectors(embeddings: np.ndarray, ids) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    挑出要进索引的向量并做 L2 归一化（复制数组以避免修改原始数据）
+    全零行是已删除页面（tombstone）的占位，不进索引
+    返回: (vectors, ids)
+    """
+    live = np.any(embeddings != 0, axis=1)
+    vectors = np.array(embeddings[live], dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors, np.asarray(ids, dtype=np.int64)[live]
+
+
 def _build_faiss_index(embeddings: np.ndarray) -> faiss.Index:
     """
     构建 FAISS 索引
-    embeddings: (n, dim) 的 numpy 数组
+    embeddings: (n, dim) 的 numpy 数组，第 i 行对应 page i
+    用 IndexIDMap2 包一层，id 即 page id：删除/替换页面时可以 remove_ids 后再加回，
+    不必重建整个索引
     """
     dimension = embeddings.shape[1]
     # 使用内积索引（cosine similarity）
-    index = faiss.IndexFlatIP(dimension)
-    # L2 归一化以支持 cosine similarity（复制数组以避免修改原始数据）
-    embeddings_normalized = embeddings.copy()
-    faiss.normalize_L2(embeddings_normalized)
-    index.add(embeddings_normalized)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    vectors, ids = _live_vectors(embeddings, np.arange(len(embeddings)))
+    if len(ids):
+        index.add_with_ids(vectors, ids)
     return index
 
 
-def _search_faiss_index(index: faiss.Index, query_embeddings: np.ndarray, top_k: int):
+def _search_faiss_index(
+    index: faiss.Index, query_embeddings: np.ndarray, top_k: int, id_filter: Optional[Collection[int]] = None
+):
     """
     在 FAISS 索引中搜索
     index: FAISS 索引
     query_embeddings: (n_queries, dim) 的查询向量
     top_k: 返回的 top-k 结果数
+    id_filter: 只在这些 page id 中搜索（IDSelector 在索引内部过滤，不是先搜再筛）
     返回: (scores_list, indices_list) 其中每个元素都是 (top_k,) 的数组
     """
     # L2 归一化查询向量（复制以避免修改原始数据）
@@ -38,7 +55,12 @@ def _search_faiss_index(index: faiss.Index, query_embeddings: np.ndarray, top_k:
     faiss.normalize_L2(query_embeddings_normalized)
     
     # 搜索
-    scores, indices = index.search(query_embeddings_normalized, top_k)
+    if id_filter is None:
+        scores, indices = index.search(query_embeddings_normalized, top_k)
+    else:
+        selector = faiss.IDSelectorBatch(np.fromiter(id_filter, dtype=np.int64, count=len(id_filter)))
+        params = faiss.SearchParameters(sel=selector)
+        scores, indices = index.search(query_embeddings_normalized, top_k, params=params)
     
     scores_list = [scores[i] for i in range(len(query_embeddings))]
     indices_list = [indices[i] for i in range(len(query_embeddings))]
@@ -49,9 +71,9 @@ def _search_faiss_index(index: faiss.Index, query_embeddings: np.ndarray, top_k:
 class DenseRetriever(AbsRetriever):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
-        self.pages = None
         self.index = None
         self.doc_emb = None
+        self._emb_buf: Optional[np.ndarray] = None  # doc_emb 所在的扩容缓冲（见 _resize_embeddings）
         
         # 检查是否使用 API 模式
         self.api_url = config.get("api_url")  # 如 "http://localhost:8001"
@@ -114,6 +136,75 @@ class DenseRetriever(AbsRetriever):
     def _emb_path(self) -> str:
         return os.path.join(self._index_dir(), "doc_emb.npy")
 
+    def _faiss_path(self) -> str:
+        return os.path.join(self._index_dir(), "faiss.index")
+
+    def _save_embeddings(self, doc_emb: np.ndarray, rows: Optional[Collection[int]] = None) -> None:
+        """
+        持久化 doc_emb。
+        rows=None：整体重写（先写临时文件再替换：load() 是 mmap 打开 doc_emb.npy 的，不能原地截断重写）。
+        给出 rows（被替换的行）时只写增量：新增的行追加到文件末尾，rows 原地覆盖，
+        最后才改头部里的行数，中途失败时文件仍是旧的行数。
+        文件对不上（不存在、维度/类型不同、行数变少）时退回整体重写。
+        """
+        if rows is None or not self._append_embeddings(doc_emb, rows):
+            tmp_path = self._emb_path() + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, doc_emb)
+            os.replace(tmp_path, self._emb_path())
+        # faiss.index 只在导出 bundle 时写，向量变了它就过期了
+        if os.path.exists(self._faiss_path()):
+            os.remove(self._faiss_path())
+
+    def _append_embeddings(self, doc_emb: np.ndarray, rows: Collection[int]) -> bool:
+        try:
+            f = open(self._emb_path(), "r+b")
+        except FileNotFoundError:
+            return False
+        with f:
+            version = np.lib.format.read_magic(f)
+            if version != (1, 0):
+                return False
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            offset = f.tell()
+            file_len = shape[0]
+            if fortran_order or dtype != doc_emb.dtype or shape[1:] != doc_emb.shape[1:] or file_len > len(doc_emb):
+                return False
+            header = io.BytesIO()
+            np.lib.format.write_array_header_1_0(header, {
+                "descr": np.lib.format.dtype_to_descr(doc_emb.dtype),
+                "fortran_order": False,
+                "shape": doc_emb.shape,
+            })
+            # np.save 给头部留了行数增长的空间；万一放不下就整体重写
+            if len(header.getvalue()) != offset:
+                return False
+            row_bytes = doc_emb.dtype.itemsize * doc_emb.shape[1]
+            f.seek(offset + file_len * row_bytes)
+            f.write(np.ascontiguousarray(doc_emb[file_len:]).tobytes())
+            for i in sorted(rows):
+                if i < file_len:
+                    f.seek(offset + i * row_bytes)
+                    f.write(np.ascontiguousarray(doc_emb[i]).tobytes())
+            f.flush()
+            f.seek(0)
+            f.write(header.getvalue())
+        return True
+
+    def _resize_embeddings(self, new_len: int) -> np.ndarray:
+        """
+        doc_emb 的前 new_len 行，可写。底层缓冲按倍数扩容，追加页面时不复制已有行；
+        load() 得到的只读 mmap 第一次修改时才拷进缓冲。新增的行由调用方填写。
+        """
+        buf = self._emb_buf
+        if buf is None or new_len > len(buf):
+            kept = min(len(self.doc_emb), new_len)
+            capacity = max(new_len, 2 * len(self.doc_emb), 64)
+            buf = np.empty((capacity, self.doc_emb.shape[1]), dtype=self.doc_emb.dtype)
+            buf[:kept] = self.doc_emb[:kept]
+            self._emb_buf = buf
+        return buf[:new_len]
+
     def _encode_via_api(self, texts: List[str], encode_type: str = "corpus") -> np.ndarray:
         """
         通过 API 编码文本
@@ -203,6 +294,18 @@ class DenseRetriever(AbsRetriever):
 
     def _encode_pages(self, pages: List[Page]) -> np.ndarray:
         # 和 build() / update() 保持一致的编码方式
+        # 已删除的页面（tombstone）不编码，对应行填零，_build_faiss_index 会跳过全零行
+        live = [i for i, p in enumerate(pages) if not p.is_tombstone]
+        if len(live) != len(pages) and (live or self.doc_emb is not None):
+            dim = self.doc_emb.shape[1] if self.doc_emb is not None else None
+            live_emb = self._encode_pages([pages[i] for i in live]) if live else None
+            if live_emb is not None:
+                dim = live_emb.shape[1]
+            out = np.zeros((len(pages), dim), dtype=np.float32)
+            if live_emb is not None:
+                out[live] = live_emb
+            return out
+
         # 处理可能的 None 值
         texts = []
         for p in pages:
@@ -230,17 +333,27 @@ class DenseRetriever(AbsRetriever):
         """
         从磁盘恢复：
         - pages 快照
-        - doc_emb.npy
-        - faiss 索引
+        - doc_emb.npy（mmap 打开，不整体读入内存）
+        - faiss 索引（有和向量条数一致的 faiss.index 就直接读，否则由向量重建）
         """
         # 如果load失败，不抛死，只打印，这样ResearchAgent可以再走build()
         try:
             # 读向量
-            self.doc_emb = np.load(self._emb_path())
-            # 重建 index
-            self.index = _build_faiss_index(self.doc_emb)
-            # 读 pages
-            self.pages = InMemoryPageStore.load(self._pages_dir()).load()
+            doc_emb = np.load(self._emb_path(), mmap_mode="r")
+            index = None
+            if os.path.exists(self._faiss_path()):
+                index = faiss.read_index(self._faiss_path())
+                # 旧版本写的是不带 id 映射的索引，按向量重建
+                if not isinstance(index, faiss.IndexIDMap2) or index.ntotal > len(doc_emb):
+                    index = None
+            if index is None:
+                # 重建 index
+                index = _build_faiss_index(np.asarray(doc_emb))
+            with self._state_lock.write():
+                self.doc_emb, self.index = doc_emb, index
+                self._emb_buf = None
+                # 打开 pages 快照（只映射文件，页面经 PageCache 按需读取）
+                self._attach_snapshot(self._pages_dir())
         except Exception as e:
             print("DenseRetriever.load() failed, will need build():", e)
 
@@ -248,33 +361,57 @@ class DenseRetriever(AbsRetriever):
         """
         全量重建向量索引。
         """
-        os.makedirs(self._pages_dir(), exist_ok=True)
+        with self._update_lock:
+            os.makedirs(self._pages_dir(), exist_ok=True)
+            sync_point = self._sync_point(page_store)
 
-        # 1. 把当前 page_store 取出来
-        self.pages = page_store.load()
+            # 1. 把当前 page_store 取出来
+            pages = page_store.load()
 
-        # 2. 全量编码
-        self.doc_emb = self._encode_pages(self.pages)
+            # 2. 全量编码（锁外进行，不阻塞正在进行的 search）
+            doc_emb = self._encode_pages(pages)
 
-        # 3. 建 faiss 索引
-        self.index = _build_faiss_index(self.doc_emb)
+            # 3. 建 faiss 索引
+            index = _build_faiss_index(doc_emb)
 
-        # 4. 持久化
-        # 创建临时 PageStore 实例来保存
-        temp_page_store = InMemoryPageStore(dir_path=self._pages_dir())
-        temp_page_store.save(self.pages)
-        np.save(self._emb_path(), self.doc_emb)
+            # 4. 原子换上新状态 + 持久化
+            with self._state_lock.write():
+                self.doc_emb, self.index = doc_emb, index
+                self._emb_buf = None
+                self._attach_snapshot(self._pages_dir())
+                self._write_snapshot(pages)
+            self._save_embeddings(doc_emb)
+            self._synced_at = sync_point
 
     def update(self, page_store: InMemoryPageStore) -> None:
         """
         增量更新：如果只是新增了一些 Page，或者后半段变了，
         我们就只重新编码“变化起点”之后的部分，而不是全量重算。
         """
+        with self._update_lock:
+            self._update_locked(page_store)
+
+    def _update_locked(self, page_store: InMemoryPageStore) -> None:
         # 如果我们还没有 build 过，就直接走 build
         if not self.pages or self.doc_emb is None or self.index is None:
             self.build(page_store)
             return
 
+        # store 自上次同步以来没有变化
+        if self._is_synced(page_store):
+            return
+        sync_point = self._sync_point(page_store)
+
+        # 有 change feed 时只处理上次同步以来的增量（新增/修改/删除的页面）
+        changes = self._changes_since_sync(page_store, sync_point)
+        applied = self._apply_changes(len(self.pages), changes) if changes is not None else None
+        if applied is not None:
+            new_len, changed = applied
+            if changed or new_len != len(self.pages):
+                self._apply_delta(new_len, changed)
+            self._synced_at = sync_point
+            return
+
         new_pages = page_store.load()
         old_pages = self.pages
 
@@ -291,35 +428,127 @@ class DenseRetriever(AbsRetriever):
         changed = (diff_idx < max_shared) or (len(new_pages) != len(old_pages))
         if not changed:
             # 完全没变，直接返回
+            self._synced_at = sync_point
             return
 
-        # 3. 我们保留前 diff_idx 段的老向量，后半段重新编码
-        keep_emb = self.doc_emb[:diff_idx]
-
-        tail_pages = new_pages[diff_idx:]
-        tail_emb = self._encode_pages(tail_pages)
-
-        new_doc_emb = np.concatenate([keep_emb, tail_emb], axis=0)
-
-        # 4. 重新建 faiss 索引
-        self.index = _build_faiss_index(new_doc_emb)
+        # 3. 我们保留前 diff_idx 段的老向量，后半段重新编码（按 id 就地更新索引）
+        self._apply_delta(len(new_pages), {i: new_pages[i] for i in range(diff_idx, len(new_pages))})
+        self._synced_at = sync_point
 
-        # 5. 持久化 + 刷内存
-        # 更新内存
-        self.pages = new_pages
-        self.doc_emb = new_doc_emb
-        
-        # 创建临时 PageStore 实例来保存
-        temp_page_store = InMemoryPageStore(dir_path=self._pages_dir())
-        temp_page_store.save(self.pages)
-        np.save(self._emb_path(), self.doc_emb)
+    def seed(self, page_store: InMemoryPageStore, embeddings: Optional[Dict[int, np.ndarray]] = None) -> None:
+        """
+        和 update() 一样同步到 page_store，但 embeddings（page id -> 向量）里给出的
+        页面直接使用预计算向量，只编码没有向量的页面。
+        上次同步之后只有新增页面时保留已有向量，否则整体重建。
+        """
+        if not embeddings:
+            self.update(page_store)
+            return
+        with self._update_lock:
+            os.makedirs(self._pages_dir(), exist_ok=True)
+            sync_point = self._sync_point(page_store)
+            num_pages = len(page_store)
+
+            # 1. 能保留的前缀：已建好索引，且之后只有追加
+            kept = 0
+            if self.pages is not None and self.doc_emb is not None and self.index is not None:
+                changes = self._changes_since_sync(page_store, sync_point)
+                applied = self._apply_changes(len(self.pages), changes) if changes is not None else None
+                if applied is not None and all(i >= len(self.pages) for i in applied[1]):
+                    kept = len(self.pages)
+            pages = list(page_store.iter_range(kept, num_pages))
+
+            # 2. 预计算向量直接用，其余的才编码
+            dim = next(iter(embeddings.values())).shape[-1]
+            if kept and self.doc_emb.shape[1] != dim:
+                raise ValueError(
+                    f"[DenseRetriever] 预计算向量维度 {dim} 与已有索引维度 {self.doc_emb.shape[1]} 不一致"
+                )
+            tail_emb = np.empty((len(pages), dim), dtype=np.float32)
+            missing = []
+            for offset in range(len(pages)):
+                vector = embeddings.get(kept + offset)
+                if vector is None:
+                    missing.append(offset)
+                elif vector.shape[-1] != dim:
+                    raise ValueError(f"[DenseRetriever] 页面 {kept + offset} 的向量维度为 {vector.shape[-1]}，应为 {dim}")
+                else:
+                    tail_emb[offset] = vector
+            if missing:
+                encoded = np.asarray(self._encode_pages([pages[j] for j in missing]), dtype=np.float32)
+                if encoded.shape[1] != dim:
+                    raise ValueError(f"[DenseRetriever] 模型向量维度 {encoded.shape[1]} 与预计算向量维度 {dim} 不一致")
+                tail_emb[missing] = encoded
+
+            # 3. 追加进已有索引，或者全量建索引
+            if kept:
+                new_doc_emb = self._resize_embeddings(num_pages)
+                new_doc_emb[kept:] = tail_emb
+                tail_vectors, tail_ids = _live_vectors(tail_emb, np.arange(kept, num_pages))
+            else:
+                new_doc_emb = tail_emb
+                new_index = _build_faiss_index(new_doc_emb)
+
+            # 4. 原子换上新状态 + 持久化
+            with self._state_lock.write():
+                if kept:
+                    if len(tail_ids):
+                        self.index.add_with_ids(tail_vectors, tail_ids)
+                    self._write_snapshot_delta(num_pages, {kept + j: p for j, p in enumerate(pages)})
+                else:
+                    self.index = new_index
+                    self._emb_buf = None
+                    self._attach_snapshot(self._pages_dir())
+                    self._write_snapshot(pages)
+                self.doc_emb = new_doc_emb
+            self._save_embeddings(new_doc_emb, rows=() if kept else None)
+            self._synced_at = sync_point
+
+    def _apply_delta(self, new_len: int, changed: Dict[int, Page]) -> None:
+        """
+        只重新编码 changed 中的页面，按 page id 就地改 faiss：
+        被替换/删除（tombstone）/截掉的 id 先 remove_ids，新向量再 add_with_ids，
+        其余页面的向量和索引都不动；doc_emb.npy 也只写变化的行。
+        """
+        old_len = len(self.pages)
+        touched = list(changed)
+
+        # 已有的行不复制：在扩容缓冲里原地改写被替换的行、追加新行
+        new_doc_emb = self._resize_embeddings(new_len)
+        if touched:
+            new_doc_emb[touched] = self._encode_pages([changed[i] for i in touched])
+        removed = np.asarray([i for i in touched if i < old_len] + list(range(new_len, old_len)), dtype=np.int64)
+        vectors, ids = _live_vectors(new_doc_emb[touched], touched)
+
+        with self._state_lock.write():
+            # 索引是就地修改的，必须和读者互斥
+            if len(removed):
+                self.index.remove_ids(removed)
+            if len(ids):
+                self.index.add_with_ids(vectors, ids)
+            self.doc_emb = new_doc_emb
+            self._write_snapshot_delta(new_len, changed)
+        self._save_embeddings(new_doc_emb, rows=[i for i in touched if i < old_len])
+
+    def bundle_files(self) -> Dict[str, str]:
+        """doc_emb.npy plus a freshly written faiss.index, so the importer needs neither encoding nor indexing."""
+        with self._state_lock.read():
+            if self.index is None:
+                return {}
+            faiss.write_index(self.index, self._faiss_path())
+        return {"doc_emb.npy": self._emb_path(), "faiss.index": self._faiss_path()}
 
-    def search(self, query_list: List[str], top_k: int = 10) -> List[List[Hit]]:
+    def search(
+        self, query_list: List[str], top_k: int = 10, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
         """
         输入: 多个query
         输出: 对应多个query的检索结果 (Hit 列表)
         对于多个query，会对每个query进行独立搜索，然后按page_id聚合得分（累加），最后返回top_k结果
+        id_filter: 只返回这些 page id（如某个命名空间的页面）
         """
+        if id_filter is not None and not id_filter:
+            return [[]]
         if self.index is None:
             # 如果还没 index（比如没调用 build/load），尝试load一下
             self.load()
@@ -339,35 +568,39 @@ class DenseRetriever(AbsRetriever):
                 max_length=self.config.get("max_length", 512),
             )
 
-        # 使用自定义的 search 函数
-        scores_list, indices_list = _search_faiss_index(self.index, queries_emb, top_k)
-
-        # 按 page_id 聚合得分：如果同一个 page 被多个 query 搜索到，累加得分
-        page_scores: Dict[str, float] = {}  # page_id -> 累计得分
-        page_hits: Dict[str, Hit] = {}      # page_id -> Hit对象（保存第一个遇到的Hit作为代表）
-
-        for scores, indices in zip(scores_list, indices_list):
-            for rank, (idx, sc) in enumerate(zip(indices, scores)):
-                idx_int = int(idx)
-                if idx_int < 0 or idx_int >= len(self.pages):
-                    continue
-                page = self.pages[idx_int]
-                snippet = page.content
-                page_id = str(idx_int)
-                score = float(sc)
-
-                if page_id in page_scores:
-                    # 累加得分
-                    page_scores[page_id] += score
-                else:
-                    # 第一次遇到这个page，保存得分和Hit对象
-                    page_scores[page_id] = score
-                    page_hits[page_id] = Hit(
-                        page_id=page_id,
-                        snippet=snippet,
-                        source="vector",
-                        meta={"rank": rank, "score": score},
-                    )
+        with self._state_lock.read():
+            # 使用自定义的 search 函数
+            scores_list, indices_list = _search_faiss_index(self.index, queries_emb, top_k, id_filter)
+
+            # 按 page_id 聚合得分：如果同一个 page 被多个 query 搜索到，累加得分
+            page_scores: Dict[str, float] = {}  # page_id -> 累计得分
+            page_hits: Dict[str, Hit] = {}      # page_id -> Hit对象（保存第一个遇到的Hit作为代表）
+
+            for scores, indices in zip(scores_list, indices_list):
+                for rank, (idx, sc) in enumerate(zip(indices, scores)):
+                    idx_int = int(idx)
+                    if idx_int < 0 or idx_int >= len(self.pages):
+                        continue
+                    page = self.pages[idx_int]
+                    if page.is_tombstone:
+                        # 已删除的页面（索引里本不该有，兜底过滤）
+                        continue
+                    snippet = page.content
+                    page_id = str(idx_int)
+                    score = float(sc)
+
+                    if page_id in page_scores:
+                        # 累加得分
+                        page_scores[page_id] += score
+                    else:
+                        # 第一次遇到这个page，保存得分和Hit对象
+                        page_scores[page_id] = score
+                        page_hits[page_id] = Hit(
+                            page_id=page_id,
+                            snippet=snippet,
+                            source="vector",
+                            meta={"rank": rank, "score": score},
+                        )
 
         # 按总分排序，取 top k
         sorted_pages = sorted(page_scores.items(), key=lambda x: x[1], reverse=True)
@@ -1,37 +1,63 @@
 import os
 import json
-from typing import Dict, Any, List
+from typing import Collection, Dict, Any, List, Optional
 
 from gam.retriever.base import AbsRetriever
 from gam.schemas import InMemoryPageStore, Hit, Page
 
 
 class IndexRetriever(AbsRetriever):
-    def __init__(self, config: Dict[str, Any]):
-        super().__init__(config)
-        self.pages: List[Page] = []
+    def _pages_dir(self) -> str:
+        return os.path.join(self.config.get("index_dir"), "pages")
 
     def load(self):
-        index_dir = self.config.get("index_dir")
         try:
-            # 正确创建 InMemoryPageStore 实例，会自动加载页面
-            self.page_store = InMemoryPageStore(dir_path=os.path.join(index_dir, "pages"))
+            # 只打开磁盘快照，页面经 PageCache 按需读取
+            with self._state_lock.write():
+                self._attach_snapshot(self._pages_dir())
         except Exception as e:
             print('cannot load index, error: ', e)
 
     def build(self, page_store: InMemoryPageStore):
-        # 创建一个新的 InMemoryPageStore 实例用于保存
-        target_path = os.path.join(self.config.get("index_dir"), "pages")
-        new_store = InMemoryPageStore(dir_path=target_path)
-        # 获取 page_store 中的所有页面并保存到新实例
-        pages = page_store._pages if hasattr(page_store, '_pages') else page_store.load()
-        new_store.save(pages)
-        self.page_store = new_store
+        with self._update_lock:
+            sync_point = self._sync_point(page_store)
+            # 获取 page_store 中的所有页面并写入快照
+            pages = list(page_store._pages) if hasattr(page_store, '_pages') else page_store.load()
+            with self._state_lock.write():
+                self._attach_snapshot(self._pages_dir())
+                self._write_snapshot(pages)
+            self._synced_at = sync_point
 
     def update(self, page_store: InMemoryPageStore):
-        self.build(page_store)
+        with self._update_lock:
+            if self.pages is None:
+                self.build(page_store)
+                return
+            if self._is_synced(page_store):
+                return
+            # 按 change feed 只应用上次同步以来的变化
+            sync_point = self._sync_point(page_store)
+            changes = self._changes_since_sync(page_store, sync_point)
+            applied = self._apply_changes(len(self.pages), changes) if changes is not None else None
+            if applied is None:
+                self.build(page_store)
+                return
+            new_len, changed = applied
+            if changed or new_len != len(self.pages):
+                with self._state_lock.write():
+                    self._write_snapshot_delta(new_len, changed)
+            self._synced_at = sync_point
 
-    def search(self, query_list: List[str], top_k: int = 10) -> List[List[Hit]]:
+    # 查询本身就是 page id 列表（NamespacedRetriever 据此把命名空间内的 id 换成全局 id）
+    queries_are_page_ids = True
+
+    def search(
+        self, query_list: List[str], top_k: int = 10, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
+        with self._state_lock.read():
+            return self._search_locked(query_list, id_filter)
+
+    def _search_locked(self, query_list: List[str], id_filter: Optional[Collection[int]] = None) -> List[List[Hit]]:
         hits: List[Hit] = []
         for query in query_list:
             # 尝试将查询解析为页面索引
@@ -42,8 +68,10 @@ class IndexRetriever(AbsRetriever):
                 continue
                 
             for pid in page_index:
-                p = self.page_store.get(pid)
-                if not p:
+                if id_filter is not None and pid not in id_filter:
+                    continue
+                p = self.pages.get(pid) if self.pages is not None else None
+                if not p or p.is_tombstone:
                     continue
                 hits.append(Hit(
                     page_id=str(pid),  # 使用页面索引作为page_id
@@ -0,0 +1,150 @@
+from typing import Any, Dict, Optional
+import threading
+import time
+
+
+def page_store_version(page_store: Any) -> int:
+    """The store's generation, or its page count for stores without one."""
+    generation = getattr(page_store, "generation", None)
+    if generation is not None:
+        return generation
+    if hasattr(page_store, "__len__"):
+        return len(page_store)
+    return len(page_store.load())
+
+
+def refresh_store(page_store: Any) -> None:
+    """Let stores shared across processes (e.g. SQLitePageStore) pick up other writers' commits."""
+    refresh = getattr(page_store, "refresh", None)
+    if refresh is not None:
+        refresh()
+
+
+class BackgroundIndexer:
+    """
+    Keeps retrievers in sync with a page store from a background thread,
+    off the query path.
+
+    MemoryAgent(indexer=...) calls notify() after every commit; the thread
+    waits `batch_delay` seconds so a burst of pages becomes one incremental
+    update() per retriever, then records the store version it indexed.
+    wait_for(version) is the read-your-writes barrier: it returns once every
+    retriever has indexed at least that version (default: the current one).
+    Stores changed by other writers are picked up every `poll_interval`
+    seconds.
+    """
+    def __init__(
+        self,
+        page_store: Any,
+        retrievers: Dict[str, Any],
+        batch_delay: float = 0.05,
+        poll_interval: float = 1.0,
+        start: bool = True,
+    ) -> None:
+        self.page_store = page_store
+        self.retrievers = retrievers
+        self.batch_delay = batch_delay
+        self.poll_interval = poll_interval
+        self.last_error: Optional[BaseException] = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._cond = threading.Condition()
+        self._index_lock = threading.Lock()  # 后台线程与 index_now() 不能同时改检索器
+        self._indexed_version: Optional[int] = None
+        self._failures = 0
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="gam-indexer", daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop the thread after finishing the update in progress."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self) -> "BackgroundIndexer":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ---- producer / consumer API ----
+    def notify(self) -> None:
+        """New pages were committed; cheap, never blocks."""
+        self._wakeup.set()
+
+    @property
+    def indexed_version(self) -> Optional[int]:
+        """Store version every retriever has caught up to (None before the first pass)."""
+        return self._indexed_version
+
+    def wait_for(self, version: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the retrievers have indexed store version `version`
+        (default: the store's current version). Returns False on timeout.
+        Raises RuntimeError if an update fails while waiting.
+        """
+        if version is None:
+            refresh_store(self.page_store)
+            version = page_store_version(self.page_store)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        failures = self._failures
+        self.notify()
+        with self._cond:
+            while self._indexed_version is None or self._indexed_version < version:
+                if self._failures != failures:
+                    raise RuntimeError(f"Background indexing failed: {self.last_error}") from self.last_error
+                if self._stopped.is_set():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def index_now(self) -> None:
+        """Run one update pass on the calling thread, serialized with the background thread."""
+        self._index_once()
+
+    # ---- worker ----
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.poll_interval)
+            if self._stopped.is_set():
+                break
+            if self._wakeup.is_set() and self.batch_delay > 0:
+                # 攒一小批：突发写入合并成一次增量更新
+                time.sleep(self.batch_delay)
+            self._wakeup.clear()
+            self._index_once()
+
+    def _index_once(self) -> None:
+        with self._index_lock:
+            refresh_store(self.page_store)
+            version = page_store_version(self.page_store)
+            if version == self._indexed_version:
+                return
+            try:
+                for retriever in self.retrievers.values():
+                    retriever.update(self.page_store)
+            except Exception as e:
+                print(f"❌ Background index update failed: {e}")
+                with self._cond:
+                    self.last_error = e
+                    self._failures += 1
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._indexed_version = version
+                self._cond.notify_all()
@@ -0,0 +1,80 @@
+from typing import Any, Collection, FrozenSet, Hashable, List, Optional, Sequence, Tuple
+
+from gam.schemas import Hit, NamespacedPageStore
+
+
+class NamespacedRetriever:
+    """
+    One tenant's view of a retriever shared by every namespace of a
+    NamespacedPageStore.
+
+    The wrapped retriever indexes the shared store once (one Lucene index,
+    one FAISS index, one model for all tenants). search() passes the
+    namespace's global page ids down as id_filter and maps hits back to the
+    namespace's local page ids, so ResearchAgent sees a private retriever.
+    build()/update() ignore the page store they are given and sync the
+    shared retriever with the shared store; that is a no-op when another
+    tenant already did it.
+    A hashable id_filter (range, frozenset, tuple) is translated to global
+    ids once and reused until the namespace grows.
+    """
+    def __init__(self, retriever: Any, store: NamespacedPageStore, namespace: str) -> None:
+        self.retriever = retriever
+        self.store = store
+        self.namespace = namespace
+        self._allowed_cache: Optional[Tuple[Hashable, FrozenSet[int]]] = None
+
+    def build(self, page_store: Any = None) -> None:
+        self.retriever.update(self.store.store)
+
+    def update(self, page_store: Any = None) -> None:
+        self.retriever.update(self.store.store)
+
+    def load(self) -> None:
+        if getattr(self.retriever, "pages", None) is None:
+            self.retriever.load()
+
+    def search(
+        self, query_list: List[str], top_k: int = 10, id_filter: Optional[Collection[int]] = None
+    ) -> List[List[Hit]]:
+        # 快照：并发 memorize 追加页面时，检索器拿到的 id 集合不会在迭代中途变化
+        global_ids = self.store.global_ids(self.namespace)
+        if id_filter is not None:
+            allowed = self._allowed(id_filter, global_ids)
+        else:
+            allowed = self.store.id_filter(self.namespace)
+        if getattr(self.retriever, "queries_are_page_ids", False):
+            # 查询里是本命名空间的页号，换成全局 id 再查
+            query_list = [
+                ",".join(
+                    str(global_ids[int(i)]) for i in q.split(",")
+                    if i.strip().isdigit() and int(i) < len(global_ids)
+                )
+                for q in query_list
+            ]
+        results = self.retriever.search(query_list, top_k=top_k, id_filter=allowed)
+        return [self._to_local(hits) for hits in results]
+
+    def _allowed(self, id_filter: Collection[int], global_ids: Sequence[int]) -> FrozenSet[int]:
+        # 命名空间只追加不收缩，已有本地 id 的映射不会变：同一个过滤集合 + 同样的页数即可复用
+        try:
+            key: Optional[Hashable] = (id_filter, len(global_ids))
+            hash(key)
+        except TypeError:
+            key = None
+        cached = self._allowed_cache
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[1]
+        allowed = frozenset(global_ids[i] for i in id_filter if 0 <= i < len(global_ids))
+        if key is not None:
+            self._allowed_cache = (key, allowed)
+        return allowed
+
+    def _to_local(self, hits: List[Hit]) -> List[Hit]:
+        out = []
+        for hit in hits:
+            local_id = self.store.to_local(int(hit.page_id)) if hit.page_id is not None else None
+            if local_id is None:
+                continue
+            out.append(hit.model_copy(update={"page_id": str(local_id)}))
+        return out
@@ -4,8 +4,24 @@ Schemas Module
 This module exposes all core data models and protocol definitions for the GAM (General-Agentic-Memory) framework.
 It organizes memory, page, search, tool, and result schemas for unified import and type safety across the system.
 """
-from .memory import MemoryState, MemoryUpdate, MemoryStore, InMemoryMemoryStore
+from .memory import MemoryState, MemoryUpdate, MemoryStore, InMemoryMemoryStore, BufferedMemoryStore, IngestCheckpoint
 from .page import Page, PageStore, InMemoryPageStore
+from .changefeed import ChangeFeed, PageChange, Subscription
+from .mmap_page import MmapPageStore
+from .compressed_page import CompressedPageStore
+from .sharded_page import ShardedPageStore
+from .namespace import NamespacedPageStore, PageNamespace, NamespacedMemoryStore, MemoryNamespace
+from .migrations import strip_decorated
+from .bulk_import import ImportRecord, iter_import_batches
+from .bundle import BundleFile, BundleManifest, export_bundle, import_bundle, read_bundle_manifest
+from .locks import ReadWriteLock, lock_for
+from .rollup import Rollup, MemoryRollups
+from .memory_context import (
+    MemoryContextRenderer, render_memory_context, renderer_for, AbstractIndex, select_memory_context
+)
+from .page_cache import PageCache, CachedPages, get_shared_page_cache, configure_shared_page_cache
+from .sqlite_store import SQLitePageStore, SQLiteMemoryStore
+from .abstract_cache import AbstractCache, generator_fingerprint
 from .search import SearchPlan, Retriever, Hit
 from .tools import ToolResult, Tool, ToolRegistry
 from .result import Result, EnoughDecision, ReflectionDecision, ResearchOutput, GenerateRequests
@@ -25,8 +41,15 @@ INFO_CHECK_SCHEMA = EnoughDecision.model_json_schema()
 GENERATE_REQUESTS_SCHEMA = GenerateRequests.model_json_schema()
 
 __all__ = [
-    "MemoryState", "MemoryUpdate", "MemoryStore", "InMemoryMemoryStore",
-    "Page", "PageStore", "InMemoryPageStore",
+    "MemoryState", "MemoryUpdate", "MemoryStore", "InMemoryMemoryStore", "BufferedMemoryStore", "IngestCheckpoint",
+    "Page", "PageStore", "InMemoryPageStore", "MmapPageStore", "CompressedPageStore", "ShardedPageStore",
+    "NamespacedPageStore", "PageNamespace", "NamespacedMemoryStore", "MemoryNamespace",
+    "SQLitePageStore", "SQLiteMemoryStore", "AbstractCache", "generator_fingerprint", "ChangeFeed", "PageChange", "Subscription",
+    "PageCache", "CachedPages", "get_shared_page_cache", "configure_shared_page_cache",
+    "strip_decorated", "ImportRecord", "iter_import_batches",
+    "BundleFile", "BundleManifest", "export_bundle", "import_bundle", "read_bundle_manifest", "ReadWriteLock", "lock_for",
+    "MemoryContextRenderer", "render_memory_context", "renderer_for", "AbstractIndex", "select_memory_context",
+    "Rollup", "MemoryRollups",
     "SearchPlan", "Retriever", "Hit",
     "ToolResult", "Tool", "ToolRegistry",
     "Result", "EnoughDecision", "ReflectionDecision", "ResearchOutput", "GenerateRequests",
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        # 带长度前缀，避免不同切分方式拼出相同的字节流
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+# 只有这些设置会改变生成结果；并发数、超时、服务地址等不参与缓存 key
+FINGERPRINT_KEYS = ("model_name", "temperature", "top_p", "max_tokens", "n", "system_prompt")
+
+
+def generator_fingerprint(generator: Any) -> str:
+    """
+    Identity of a generator's output-affecting settings for cache keys:
+    model name, sampling parameters and system prompt (FINGERPRINT_KEYS).
+    Concurrency, timeouts, endpoint and API key are left out, so a replica
+    or a different thread_count shares the cache.
+    """
+    config = getattr(generator, "config", None) or {}
+    settings = {}
+    for key in FINGERPRINT_KEYS:
+        value = getattr(generator, key, config.get(key) if hasattr(config, "get") else None)
+        if value is not None:
+            settings[key] = value
+    return json.dumps(settings, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class AbstractCache:
+    """
+    Persistent cache of generated abstracts (abstract_cache.db in dir_path),
+    so re-ingesting the same documents makes no LLM calls.
+
+    Every entry is stored under two keys, both including the model settings
+    and the prompt template (with its system prompt):
+      - exact key:   + the rendered memory context + the message
+      - message key: + the message only
+    policy decides what counts as a hit:
+      - "exact":   the whole prompt must match; any change in the memory
+                   context (earlier chunks, context mode) is a miss
+      - "message": fall back to the latest abstract generated for the same
+                   message under any memory context; use it when the
+                   context differs only slightly, e.g. a re-run after
+                   changing chunks elsewhere in the corpus
+    Only real generator output is cached, never the truncation fallback.
+    Each put() is committed immediately (WAL, one connection per thread),
+    so entries survive a crash of the ingest job.
+    """
+    POLICIES = ("exact", "message")
+    DB_FILE = "abstract_cache.db"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS abstract_cache (
+            key TEXT PRIMARY KEY,
+            message_key TEXT NOT NULL,
+            abstract TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS abstract_cache_message ON abstract_cache (message_key, created_at);
+    """
+
+    def __init__(self, dir_path: str, policy: str = "exact", synchronous: str = "NORMAL") -> None:
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy must be one of {self.POLICIES}, got {policy!r}")
+        self._dir_path = Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._db_file = self._dir_path / self.DB_FILE
+        self._synchronous = synchronous
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.policy = policy
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # isolation_level=None：每条写入自动提交
+            conn = sqlite3.connect(self._db_file, isolation_level=None, check_same_thread=False, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def keys(model: str, template: str, memory_context: str, message: str) -> Dict[str, str]:
+        message_key = _digest(model, template, message)
+        return {"key": _digest(message_key, memory_context), "message_key": message_key}
+
+    def get(self, model: str, template: str, memory_context: str, message: str) -> Optional[str]:
+        keys = self.keys(model, template, memory_context, message)
+        conn = self._conn()
+        row = conn.execute("SELECT abstract FROM abstract_cache WHERE key = ?", (keys["key"],)).fetchone()
+        if row is not None:
+            self._count("hits")
+            return row[0]
+        if self.policy == "message":
+            row = conn.execute(
+                "SELECT abstract FROM abstract_cache WHERE message_key = ? ORDER BY created_at DESC LIMIT 1",
+                (keys["message_key"],),
+            ).fetchone()
+            if row is not None:
+                self._count("partial_hits")
+                return row[0]
+        self._count("misses")
+        return None
+
+    def put(self, model: str, template: str, memory_context: str, message: str, abstract: str) -> None:
+        keys = self.keys(model, template, memory_context, message)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO abstract_cache (key, message_key, abstract, created_at) VALUES (?, ?, ?, ?)",
+            (keys["key"], keys["message_key"], abstract, time.time()),
+        )
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM abstract_cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "partial_hits": self.partial_hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def __enter__(self) -> "AbstractCache":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
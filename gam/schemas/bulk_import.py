@@ -0,0 +1,66 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from pydantic import BaseModel, Field
+import json
+from pathlib import Path
+
+
+class ImportRecord(BaseModel):
+    """One pre-processed page for MemoryAgent.bulk_import(): no LLM call is made for it."""
+    content: str = Field(..., description="Page content")
+    abstract: str = Field(..., description="Abstract added to memory and used as the page header")
+    embedding: Optional[List[float]] = Field(None, description="Precomputed dense vector for the page content")
+
+
+def _iter_jsonl_records(path: Path) -> Iterator[Dict[str, Any]]:
+    # 导入文件是外部产出的，最后一行可能没有换行符；坏行直接报错而不是像日志回放那样截断
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON record: {e}") from e
+
+
+def _iter_parquet_records(path: Path, batch_size: int) -> Iterator[Dict[str, Any]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Importing Parquet files requires pyarrow to be installed") from e
+    parquet_file = pq.ParquetFile(path)
+    columns = [c for c in ("content", "abstract", "embedding") if c in parquet_file.schema_arrow.names]
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield from record_batch.to_pylist()
+
+
+def iter_import_batches(
+    source: Union[str, Path, Iterable[Union[Dict[str, Any], ImportRecord]]],
+    batch_size: int = 1000,
+) -> Iterator[List[ImportRecord]]:
+    """
+    Stream ImportRecords from `source` in lists of up to `batch_size`.
+
+    `source` is a .jsonl / .parquet path, or any iterable of dicts / ImportRecords.
+    Records need `content` and `abstract`; `embedding` is optional.
+    Parquet is read batch by batch (requires pyarrow).
+    """
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        if path.suffix.lower() in (".parquet", ".pq"):
+            records: Iterable[Any] = _iter_parquet_records(path, batch_size)
+        else:
+            records = _iter_jsonl_records(path)
+    else:
+        records = source
+
+    batch: List[ImportRecord] = []
+    for record in records:
+        batch.append(record if isinstance(record, ImportRecord) else ImportRecord(**record))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,201 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from .locks import lock_for
+from .mmap_page import HIGH_WATER_FILE as _PAGES_HIGH_WATER, MANIFEST_FILE as _PAGES_MANIFEST, MmapPageStore
+from .persistence import atomic_write_json
+
+BUNDLE_FORMAT = "gam-bundle"
+BUNDLE_VERSION = 1
+_MANIFEST_NAME = "manifest.json"
+_PAGES_FILES = ("pages.bin", "pages.idx")
+# zip local file header: 签名 + 固定字段共 30 字节，文件名长度和 extra 长度在第 26/28 字节
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_COPY_CHUNK = 16 * 1024 * 1024
+
+
+class BundleFile(BaseModel):
+    sha256: str = Field(..., description="sha256 of the file content")
+    size: int = Field(..., description="File size in bytes")
+
+
+class BundleManifest(BaseModel):
+    """Table of contents of a memory bundle, stored in the bundle as manifest.json."""
+    format: str = Field(BUNDLE_FORMAT, description="Always 'gam-bundle'")
+    version: int = Field(BUNDLE_VERSION, description="Bundle format version")
+    created_at: float = Field(default_factory=time.time, description="Unix time of the export")
+    num_pages: int = Field(0, description="Number of pages")
+    num_abstracts: int = Field(0, description="Number of memory abstracts")
+    retrievers: Dict[str, str] = Field(default_factory=dict, description="Retriever name -> class name")
+    files: Dict[str, BundleFile] = Field(default_factory=dict, description="Archive path -> content hash")
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_COPY_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def export_bundle(
+    bundle_path: str,
+    memory_store: Any,
+    page_store: Any,
+    retrievers: Optional[Dict[str, Any]] = None,
+) -> BundleManifest:
+    """
+    Write memory, pages and retriever indexes to one versioned archive.
+
+    The archive is an uncompressed zip so every member can be sliced straight
+    out of a memory map on import. It holds:
+      - memory_state.json: the abstracts
+      - pages/pages.bin, pages/pages.idx: the pages in MmapPageStore format,
+        stored once (retrievers' page snapshots are rebuilt from it)
+      - retrievers/<name>/...: each retriever's bundle_files() (embeddings,
+        FAISS index, Lucene postings, ...)
+      - manifest.json: format version, counts and the sha256 of every file
+    Retrievers must be in sync with page_store (call update() first).
+    Runs under the page store's read lock, so concurrent memorize() calls
+    wait instead of tearing the export.
+    """
+    retrievers = retrievers or {}
+    bundle_path = Path(bundle_path)
+    bundle_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_bundle = bundle_path.with_name(bundle_path.name + ".tmp")
+
+    with lock_for(page_store).read(), tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        num_pages = len(page_store)
+        members: Dict[str, Path] = {}
+
+        # 1. abstracts
+        state = memory_store.load()
+        atomic_write_json(tmp_dir / "memory_state.json", state.model_dump())
+        members["memory_state.json"] = tmp_dir / "memory_state.json"
+
+        # 2. pages（已经是 mmap 格式就直接打包文件，否则转存一份）
+        if isinstance(page_store, MmapPageStore):
+            page_files = page_store.files()
+        else:
+            with MmapPageStore(str(tmp_dir / "pages")) as pages_tmp:
+                pages_tmp.save(list(page_store.iter_range(0, num_pages)))
+                page_files = pages_tmp.files()
+        for name in _PAGES_FILES:
+            members[f"pages/{name}"] = page_files[name]
+
+        # 3. retriever indexes
+        for name, retriever in retrievers.items():
+            pages = getattr(retriever, "pages", None)
+            if pages is None or len(pages) != num_pages:
+                raise ValueError(
+                    f"Retriever {name!r} is not in sync with the page store "
+                    f"({0 if pages is None else len(pages)} vs {num_pages} pages); call update() first"
+                )
+            for rel_path, path in retriever.bundle_files().items():
+                members[f"retrievers/{name}/{rel_path}"] = Path(path)
+
+        manifest = BundleManifest(
+            num_pages=num_pages,
+            num_abstracts=len(state.abstracts),
+            retrievers={name: type(r).__name__ for name, r in retrievers.items()},
+        )
+        with zipfile.ZipFile(tmp_bundle, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for arcname, path in members.items():
+                manifest.files[arcname] = BundleFile(sha256=_sha256_file(path), size=path.stat().st_size)
+                zf.write(path, arcname)
+            zf.writestr(_MANIFEST_NAME, json.dumps(manifest.model_dump(), ensure_ascii=False, indent=2))
+    os.replace(tmp_bundle, bundle_path)
+    return manifest
+
+
+def read_bundle_manifest(bundle_path: str) -> BundleManifest:
+    """Read the manifest of a bundle without extracting anything."""
+    with zipfile.ZipFile(bundle_path) as zf:
+        manifest = BundleManifest(**json.loads(zf.read(_MANIFEST_NAME)))
+    if manifest.format != BUNDLE_FORMAT or manifest.version > BUNDLE_VERSION:
+        raise ValueError(
+            f"{bundle_path} is a {manifest.format!r} v{manifest.version} bundle; "
+            f"this version reads {BUNDLE_FORMAT!r} up to v{BUNDLE_VERSION}"
+        )
+    return manifest
+
+
+def import_bundle(bundle_path: str, target_dir: str, verify: bool = True) -> BundleManifest:
+    """
+    Unpack a bundle written by export_bundle() into `target_dir`:
+      - memory_state.json   -> InMemoryMemoryStore(dir_path=target_dir)
+      - pages/              -> MmapPageStore(target_dir/pages)
+      - retrievers/<name>/  -> index_dir of retriever <name>, page snapshot included
+    Members are sliced out of a memory map of the archive and, with verify,
+    checked against the manifest hashes (ValueError on mismatch). Nothing is
+    re-encoded or re-indexed: open the stores, point each retriever's
+    index_dir at its folder and pass warm_start=True to ResearchAgent.
+    """
+    manifest = read_bundle_manifest(bundle_path)
+    target_dir = Path(target_dir).resolve()
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(bundle_path, 'rb') as f, zipfile.ZipFile(f) as zf:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for arcname, entry in manifest.files.items():
+                    dest = (target_dir / arcname).resolve()
+                    if target_dir not in dest.parents:
+                        raise ValueError(f"Bundle member {arcname!r} escapes the target directory")
+                    info = zf.getinfo(arcname)
+                    if info.compress_type != zipfile.ZIP_STORED or info.file_size != entry.size:
+                        raise ValueError(f"Bundle member {arcname!r} does not match the manifest")
+                    signature, name_len, extra_len = _LOCAL_HEADER.unpack_from(mapped, info.header_offset)
+                    if signature != b"PK\x03\x04":
+                        raise ValueError(f"Corrupt bundle: bad local header for {arcname!r}")
+                    start = info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+                    _extract_member(view, start, entry, arcname, dest, verify)
+            finally:
+                view.release()
+
+    # 包里的 pages 是第 0 代文件；目标目录里旧的 manifest 会让 MmapPageStore 继续用旧的一代，
+    # 旧的 pages.hwm 与新的 pages.bin 对不上，删掉后打开时重新扫一遍索引
+    (target_dir / "pages" / _PAGES_MANIFEST).unlink(missing_ok=True)
+    (target_dir / "pages" / _PAGES_HIGH_WATER).unlink(missing_ok=True)
+    # 每个检索器的 pages/ 快照就是同一份 pages，包里只存一份，这里各复制一份
+    # （快照之后会被各自追加，不能共用文件）
+    for name in manifest.retrievers:
+        snapshot_dir = target_dir / "retrievers" / name / "pages"
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        for file_name in _PAGES_FILES:
+            shutil.copyfile(target_dir / "pages" / file_name, snapshot_dir / file_name)
+        (snapshot_dir / _PAGES_MANIFEST).unlink(missing_ok=True)
+        (snapshot_dir / _PAGES_HIGH_WATER).unlink(missing_ok=True)
+    return manifest
+
+
+def _extract_member(view: memoryview, start: int, entry: BundleFile, arcname: str, dest: Path, verify: bool) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(dest.name + ".tmp")
+    h = hashlib.sha256()
+    with open(tmp_path, 'wb') as out:
+        for offset in range(start, start + entry.size, _COPY_CHUNK):
+            chunk = view[offset:min(offset + _COPY_CHUNK, start + entry.size)]
+            try:
+                if verify:
+                    h.update(chunk)
+                out.write(chunk)
+            finally:
+                chunk.release()
+    if verify and h.hexdigest() != entry.sha256:
+        tmp_path.unlink()
+        raise ValueError(f"Bundle member {arcname!r} failed its sha256 check")
+    os.replace(tmp_path, dest)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Deque, List, Optional, Sequence
+import threading
+
+if TYPE_CHECKING:
+    from .page import Page
+
+
+@dataclass(frozen=True)
+class PageChange:
+    """One entry of a page store's change feed."""
+    seq: int                      # 1-based, strictly increasing per feed
+    op: str                       # "add" | "update" | "delete"
+    page_id: int
+    page: Optional[Page] = None   # new page for add/update, None for delete
+
+
+class Subscription:
+    """
+    A consumer position in a ChangeFeed.
+    poll() returns the events after `cursor` and advances it, or None when
+    the feed no longer retains them (the consumer must resync from the store).
+    """
+    def __init__(self, feed: "ChangeFeed", cursor: int, callback: Optional[Callable[[PageChange], None]] = None) -> None:
+        self._feed = feed
+        self.cursor = cursor
+        self.callback = callback
+
+    def poll(self) -> Optional[List[PageChange]]:
+        changes = self._feed.since(self.cursor)
+        if changes:
+            self.cursor = changes[-1].seq
+        return changes
+
+    def close(self) -> None:
+        self._feed._unsubscribe(self)
+
+
+class ChangeFeed:
+    """
+    Ordered, in-process feed of page add/update/delete events.
+
+    Only the last `retention` events are kept; a cursor older than that gets
+    None from since(), meaning "too far behind, rebuild from the store".
+    Callbacks registered via subscribe() run synchronously inside publish().
+    """
+    def __init__(self, retention: int = 100_000) -> None:
+        self._events: Deque[PageChange] = deque(maxlen=max(1, retention))
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def publish(self, op: str, page_id: int, page: Optional[Page] = None) -> PageChange:
+        with self._lock:
+            self._last_seq += 1
+            change = PageChange(seq=self._last_seq, op=op, page_id=page_id, page=page)
+            self._events.append(change)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if sub.callback is not None:
+                sub.callback(change)
+                sub.cursor = change.seq
+        return change
+
+    def publish_diff(self, old_pages: Sequence[Page], new_pages: Sequence[Page]) -> None:
+        """Emit the events that turn `old_pages` into `new_pages` (used by save())."""
+        shared = min(len(old_pages), len(new_pages))
+        for i in range(shared):
+            if old_pages[i] != new_pages[i]:
+                self.publish("update", i, new_pages[i])
+        for i in range(shared, len(new_pages)):
+            self.publish("add", i, new_pages[i])
+        for i in range(len(old_pages) - 1, shared - 1, -1):
+            self.publish("delete", i)
+
+    def since(self, cursor: int) -> Optional[List[PageChange]]:
+        with self._lock:
+            if cursor >= self._last_seq:
+                return []
+            first_seq = self._events[0].seq if self._events else self._last_seq + 1
+            if cursor < first_seq - 1:
+                return None
+            return [e for e in self._events if e.seq > cursor]
+
+    def subscribe(
+        self,
+        cursor: Optional[int] = None,
+        callback: Optional[Callable[[PageChange], None]] = None,
+    ) -> Subscription:
+        """
+        Start consuming after `cursor` (default: from now on).
+        With a callback, retained events after the cursor are replayed first.
+        """
+        with self._lock:
+            sub = Subscription(self, self._last_seq if cursor is None else cursor, callback)
+            self._subscribers.append(sub)
+        if callback is not None:
+            for change in sub.poll() or []:
+                callback(change)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
@@ -0,0 +1,273 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+from .changefeed import ChangeFeed
+from .page import Page
+from .persistence import (
+    atomic_write_json, append_jsonl, generation_path, read_jsonl, remove_other_generations, repair_jsonl,
+)
+
+# 每个压缩块的索引项: (offset, length)
+_BLOCK_ENTRY = struct.Struct("<QQ")
+
+
+class CompressedPageStore:
+    """
+    Page store that packs every `block_size` consecutive pages into one
+    compressed block (zstd when `zstandard` is installed, zlib otherwise).
+
+    Layout under dir_path:
+      - manifest.json: codec and block size (fixed when the store is created)
+        and the current file generation
+      - blocks.bin / blocks.idx: sealed blocks and their (offset, length)
+      - tail.jsonl: pages of the block still being filled, uncompressed
+      (generation g > 0 uses blocks-g<g>.bin, blocks-g<g>.idx, tail-g<g>.jsonl)
+
+    Neighbouring chunks of one document share most of their vocabulary, so
+    block compression shrinks large memories several-fold. get(i) decompresses at most one
+    block; the last `cache_blocks` decoded blocks are kept in an LRU.
+    replace(i)/delete(i) re-compress only the block holding page i, append
+    it to blocks.bin and repoint that block's index entry.
+    save() writes all three files of the next generation and then rewrites
+    manifest.json, the single commit point; files of other generations are
+    removed afterwards and on open.
+    """
+    def __init__(
+        self,
+        dir_path: str,
+        block_size: int = 64,
+        codec: Optional[str] = None,
+        level: int = 3,
+        cache_blocks: int = 32,
+    ) -> None:
+        self._dir_path = Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._manifest_file = self._dir_path / "manifest.json"
+        self._level = level
+        self._cache_blocks = max(1, cache_blocks)
+        self._cache: "OrderedDict[int, List[Page]]" = OrderedDict()
+        self._generation = 0
+        self._rewrite_generation = 0
+        self.change_feed = ChangeFeed()
+
+        if self._manifest_file.exists():
+            with open(self._manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._codec = manifest["codec"]
+            self._block_size = manifest["block_size"]
+            self._set_files(manifest.get("generation", 0))
+        else:
+            self._codec = codec or ("zstd" if zstandard is not None else "zlib")
+            self._block_size = max(1, block_size)
+            self._set_files(0)
+            self._write_manifest()
+        if self._codec not in ("zstd", "zlib"):
+            raise ValueError(f"Unknown codec {self._codec!r}, expected 'zstd' or 'zlib'")
+        if self._codec == "zstd" and zstandard is None:
+            raise ImportError("CompressedPageStore with codec 'zstd' requires zstandard to be installed")
+        self._remove_other_generations()
+        self._open()
+
+    # ---- Public ----
+    def __len__(self) -> int:
+        return self._num_blocks * self._block_size + len(self._tail)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def add(self, page: Page) -> None:
+        if not self._tail:
+            # tail 文件首行记录它属于哪个块，用于崩溃后判断是否已封块
+            self._write_tail_header(self._tail_file, self._num_blocks)
+        append_jsonl(self._tail_file, [page.model_dump()])
+        self._tail.append(page)
+        self._generation += 1
+        self.change_feed.publish("add", len(self) - 1, page)
+        if len(self._tail) >= self._block_size:
+            self._seal_tail()
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place; its id stays the same."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"page index {index} out of range")
+        block_no, offset = divmod(index, self._block_size)
+        if block_no < self._num_blocks:
+            pages = list(self._block(block_no))
+            pages[offset] = page
+            data = self._compress(pages)
+            with open(self._blocks_file, "ab") as f:
+                block_offset = f.tell()
+                f.write(data)
+            # 就地改写该块的索引项（提交点），旧块留在 blocks.bin 里直到下次 save()
+            with open(self._index_file, "r+b") as f:
+                f.seek(block_no * _BLOCK_ENTRY.size)
+                f.write(_BLOCK_ENTRY.pack(block_offset, len(data)))
+            self._index[block_no] = (block_offset, len(data))
+            self._cache_put(block_no, pages)
+        else:
+            tail = list(self._tail)
+            tail[offset] = page
+            tail_tmp = self._tail_file.with_name(self._tail_file.name + ".tmp")
+            self._write_tail_header(tail_tmp, self._num_blocks)
+            append_jsonl(tail_tmp, [p.model_dump() for p in tail])
+            os.replace(tail_tmp, self._tail_file)
+            self._tail = tail
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
+
+    def get(self, index: int) -> Optional[Page]:
+        if not 0 <= index < len(self):
+            return None
+        block_no, offset = divmod(index, self._block_size)
+        if block_no < self._num_blocks:
+            return self._block(block_no)[offset]
+        return self._tail[offset]
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        return [self.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        stop = len(self) if stop is None else min(stop, len(self))
+        for i in range(max(start, 0), stop):
+            yield self.get(i)
+
+    def load(self) -> List[Page]:
+        return list(self.iter_range())
+
+    def save(self, pages: List[Page]) -> None:
+        """Re-pack all pages into the next file generation and switch to it atomically (see class docstring)."""
+        self.change_feed.publish_diff(self.load(), pages)
+        new_generation = self._file_generation + 1
+        blocks_new = generation_path(self._dir_path / "blocks.bin", new_generation)
+        index_new = generation_path(self._dir_path / "blocks.idx", new_generation)
+        tail_new = generation_path(self._dir_path / "tail.jsonl", new_generation)
+        sealed = len(pages) - len(pages) % self._block_size
+        offset = 0
+        with open(blocks_new, "wb") as blocks_fh, open(index_new, "wb") as index_fh:
+            for start in range(0, sealed, self._block_size):
+                data = self._compress(pages[start:start + self._block_size])
+                blocks_fh.write(data)
+                index_fh.write(_BLOCK_ENTRY.pack(offset, len(data)))
+                offset += len(data)
+        tail = pages[sealed:]
+        self._write_tail_header(tail_new, sealed // self._block_size)
+        append_jsonl(tail_new, [p.model_dump() for p in tail])
+        # manifest 是唯一的提交点：换上之前崩溃，旧的一代仍然完整有效
+        self._set_files(new_generation)
+        self._write_manifest()
+        self._remove_other_generations()
+        self._open()
+        self._generation += 1
+        self._rewrite_generation = self._generation
+
+    def close(self) -> None:
+        self._cache.clear()
+
+    # ---- Internal ----
+    def _set_files(self, generation: int) -> None:
+        self._file_generation = generation
+        self._blocks_file = generation_path(self._dir_path / "blocks.bin", generation)
+        self._index_file = generation_path(self._dir_path / "blocks.idx", generation)
+        self._tail_file = generation_path(self._dir_path / "tail.jsonl", generation)
+
+    def _write_manifest(self) -> None:
+        atomic_write_json(self._manifest_file, {
+            "codec": self._codec, "block_size": self._block_size, "generation": self._file_generation,
+        })
+
+    def _remove_other_generations(self) -> None:
+        for name in ("blocks.bin", "blocks.idx", "tail.jsonl"):
+            remove_other_generations(self._dir_path / name, self._file_generation)
+
+    def _open(self) -> None:
+        self._cache.clear()
+        self._blocks_file.touch(exist_ok=True)
+        self._index_file.touch(exist_ok=True)
+        with open(self._index_file, "rb") as f:
+            raw = f.read()
+        self._num_blocks = len(raw) // _BLOCK_ENTRY.size
+        if len(raw) != self._num_blocks * _BLOCK_ENTRY.size:
+            # 丢弃写了一半的索引项
+            os.truncate(self._index_file, self._num_blocks * _BLOCK_ENTRY.size)
+        self._index = [
+            _BLOCK_ENTRY.unpack_from(raw, i * _BLOCK_ENTRY.size) for i in range(self._num_blocks)
+        ]
+
+        self._tail: List[Page] = []
+        if self._tail_file.exists():
+            repair_jsonl(self._tail_file)
+            records = read_jsonl(self._tail_file)
+            header = next(records, None)
+            if header is not None and header.get("block") == self._num_blocks:
+                self._tail = [Page(**r) for r in records]
+            # 否则 tail 已经被封进最后一个块（封块后、清空 tail 前崩溃），直接丢弃
+
+    @staticmethod
+    def _write_tail_header(path: Path, block_no: int) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"block": block_no}) + "\n")
+
+    def _seal_tail(self) -> None:
+        data = self._compress(self._tail)
+        with open(self._blocks_file, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        # 索引项是提交点：写入之后 tail.jsonl 里的 block 编号就过期了
+        with open(self._index_file, "ab") as f:
+            f.write(_BLOCK_ENTRY.pack(offset, len(data)))
+        self._index.append((offset, len(data)))
+        self._cache_put(self._num_blocks, self._tail)
+        self._num_blocks += 1
+        self._tail = []
+        self._tail_file.unlink(missing_ok=True)
+
+    def _block(self, block_no: int) -> List[Page]:
+        pages = self._cache.get(block_no)
+        if pages is not None:
+            self._cache.move_to_end(block_no)
+            return pages
+        offset, length = self._index[block_no]
+        with open(self._blocks_file, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        pages = [Page(**r) for r in json.loads(self._decompress(data))]
+        self._cache_put(block_no, pages)
+        return pages
+
+    def _cache_put(self, block_no: int, pages: List[Page]) -> None:
+        self._cache[block_no] = pages
+        self._cache.move_to_end(block_no)
+        while len(self._cache) > self._cache_blocks:
+            self._cache.popitem(last=False)
+
+    def _compress(self, pages: List[Page]) -> bytes:
+        raw = json.dumps([p.model_dump() for p in pages], ensure_ascii=False).encode("utf-8")
+        if self._codec == "zstd":
+            return zstandard.ZstdCompressor(level=self._level).compress(raw)
+        return zlib.compress(raw, self._level)
+
+    def _decompress(self, data: bytes) -> bytes:
+        if self._codec == "zstd":
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
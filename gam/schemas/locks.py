@@ -0,0 +1,71 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any
+import threading
+import weakref
+
+
+class ReadWriteLock:
+    """
+    Many readers or one writer. Writer-preferring: once a writer is waiting,
+    new readers queue behind it, so a steady stream of research() calls
+    cannot starve memorize(). Not reentrant.
+    """
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+_store_locks: "weakref.WeakKeyDictionary[Any, ReadWriteLock]" = weakref.WeakKeyDictionary()
+_store_locks_guard = threading.Lock()
+
+
+def lock_for(store: Any) -> ReadWriteLock:
+    """
+    The ReadWriteLock guarding `store` and everything written together with it.
+    MemoryAgent writes and ResearchAgent snapshots that share a page store
+    get the same lock without any wiring. The lock lives as long as the
+    store; `store` must support weak references (every GAM store does).
+    """
+    with _store_locks_guard:
+        try:
+            lock = _store_locks.get(store)
+            if lock is None:
+                lock = _store_locks[store] = ReadWriteLock()
+        except TypeError:
+            # 不按 id() 兜底：id 会被新对象复用，拿到已销毁 store 的锁
+            raise TypeError(
+                f"lock_for() needs a weak-referenceable store, got {type(store).__name__}"
+            ) from None
+        return lock
@@ -1,56 +1,308 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional, Protocol
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol
+from pydantic import BaseModel, Field, PrivateAttr
 import json
+import threading
 from pathlib import Path
 
+from .persistence import atomic_write_json, append_jsonl, read_jsonl, repair_jsonl
+
 class MemoryState(BaseModel):
     """Long-term memory: only abstracts list."""
     abstracts: List[str] = Field(default_factory=list, description="List of memory abstracts")
 
 class MemoryUpdate(BaseModel):
-    """Memory update result"""
-    new_state: MemoryState = Field(..., description="Updated memory state")
+    """
+    Memory update result.
+    new_state is built on first access from the memory store's first
+    `abstract_count` abstracts, so memorize() does not copy the whole
+    memory on every call.
+    """
     new_page: 'Page' = Field(..., description="New page added")
+    abstract_count: int = Field(0, description="Number of abstracts after the update")
     debug: Dict[str, Any] = Field(default_factory=dict, description="Debug information")
+    _new_state: Optional[MemoryState] = PrivateAttr(default=None)
+    _memory_store: Any = PrivateAttr(default=None)
+
+    def __init__(self, new_state: Optional[MemoryState] = None, memory_store: Any = None, **data: Any) -> None:
+        if new_state is not None:
+            data.setdefault("abstract_count", len(new_state.abstracts))
+        super().__init__(**data)
+        self._new_state = new_state
+        self._memory_store = memory_store
+
+    @property
+    def new_state(self) -> MemoryState:
+        """Updated memory state"""
+        if self._new_state is None:
+            store = self._memory_store
+            abstracts = list(store.iter_range(0, self.abstract_count)) if store is not None else []
+            self._new_state = MemoryState(abstracts=abstracts)
+        return self._new_state
+
+class IngestCheckpoint(BaseModel):
+    """Persisted progress of a MemoryAgent.ingest() job."""
+    fingerprint: str = Field(..., description="sha256 of the job's input messages")
+    total: int = Field(..., description="Number of messages in the job")
+    pages_before: int = Field(..., description="Page count of the store when the job started")
+    cursor: int = Field(0, description="Messages committed so far")
 
 class MemoryStore(Protocol):
+    """
+    Abstract ids are positions in MemoryState.abstracts.
+    generation / rewrite_generation follow the same contract as PageStore.
+    """
+    @property
+    def generation(self) -> int: ...
+    @property
+    def rewrite_generation(self) -> int: ...
+    def __len__(self) -> int: ...
     def load(self) -> MemoryState: ...
     def save(self, state: MemoryState) -> None: ...
     def add(self, abstract: str) -> None: ...
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]: ...
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]: ...
 
 class InMemoryMemoryStore:
     def __init__(self, dir_path: Optional[str] = None, init_state: Optional[MemoryState] = None) -> None:
         self._dir_path = Path(dir_path) if dir_path else None
         self._state = init_state or MemoryState()
+        self._generation = 0
+        self._rewrite_generation = 0
         if self._dir_path:
             self._memory_file = self._dir_path / "memory_state.json"
             if self._memory_file.exists():
-                self._state = self.load()
+                self._state = self._read_json()
 
     def load(self) -> MemoryState:
-        if self._dir_path and self._memory_file.exists():
-            try:
-                with open(self._memory_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return MemoryState(**data)
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
-                print(f"Warning: Failed to load memory state from {self._memory_file}: {e}")
-                return MemoryState()
+        # 文件只在构造时读一次，之后内存里的状态就是最新的（每次 add 都会写回文件）
         return self._state
 
+    def _read_json(self) -> MemoryState:
+        try:
+            with open(self._memory_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                return MemoryState(**data)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"Warning: Failed to load memory state from {self._memory_file}: {e}")
+            return MemoryState()
+
     def save(self, state: MemoryState) -> None:
         self._state = state
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self._write_json()
+
+    def _write_json(self) -> None:
         if self._dir_path:
             self._dir_path.mkdir(parents=True, exist_ok=True)
             try:
                 with open(self._memory_file, 'w', encoding='utf-8') as f:
-                    json.dump(state.model_dump(), f, ensure_ascii=False, indent=2)
+                    json.dump(self._state.model_dump(), f, ensure_ascii=False, indent=2)
             except Exception as e:
                 print(f"Warning: Failed to save memory state to {self._memory_file}: {e}")
 
     def add(self, abstract: str) -> None:
         if abstract and abstract not in self._state.abstracts:
             self._state.abstracts.append(abstract)
+            self._generation += 1
             if self._dir_path:
-                self.save(self._state)
+                self._write_json()
+
+    def add_many(self, abstracts: Iterable[str]) -> None:
+        """add() for a batch: set-based dedup and a single file write."""
+        seen = set(self._state.abstracts)
+        added = False
+        for abstract in abstracts:
+            if abstract and abstract not in seen:
+                seen.add(abstract)
+                self._state.abstracts.append(abstract)
+                added = True
+        if added:
+            self._generation += 1
+            if self._dir_path:
+                self._write_json()
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]:
+        abstracts = self._state.abstracts
+        return [abstracts[i] if 0 <= i < len(abstracts) else None for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        return iter(self._state.abstracts[max(start, 0):stop])
+
+    def __len__(self) -> int:
+        return len(self._state.abstracts)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+
+class BufferedMemoryStore:
+    """
+    Group-commit MemoryStore.
+
+    - Dedup uses a hash set, so add() is O(1) instead of a list scan.
+    - load() returns the live in-memory state (no file read, no copy);
+      callers must treat it as read-only.
+    - New abstracts are buffered and appended to memory_state.log.jsonl in
+      batches; close() (or save()) folds the log into memory_state.json via
+      an atomic rename. memory_state.json stays readable by InMemoryMemoryStore.
+
+    durability:
+      - "always": append + fsync on every add()
+      - "batch":  flush once `flush_every` abstracts are pending, or from a
+                  background timer `flush_interval` seconds after the first
+                  pending one, even if no further add() comes
+      - "close":  only flush on flush()/close()
+    flush(), save() and close() always fsync, whatever the mode.
+    """
+    DURABILITY_MODES = ("always", "batch", "close")
+
+    def __init__(
+        self,
+        dir_path: Optional[str] = None,
+        init_state: Optional[MemoryState] = None,
+        durability: str = "batch",
+        flush_every: int = 64,
+        flush_interval: float = 1.0,
+    ) -> None:
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {self.DURABILITY_MODES}, got {durability!r}")
+        self._dir_path = Path(dir_path) if dir_path else None
+        self._durability = durability
+        self._flush_every = max(1, flush_every)
+        self._flush_interval = flush_interval
+        self._pending: List[str] = []
+        self._lock = threading.RLock()  # 定时 flush 在另一个线程里跑
+        self._timer: Optional[threading.Timer] = None
+        self._generation = 0
+        self._rewrite_generation = 0
+        self._state = init_state or MemoryState()
+        if self._dir_path:
+            self._memory_file = self._dir_path / "memory_state.json"
+            self._log_file = self._dir_path / "memory_state.log.jsonl"
+            self._state = self._replay() or self._state
+            repair_jsonl(self._log_file)
+        self._index = set(self._state.abstracts)
+
+    def load(self) -> MemoryState:
+        return self._state
+
+    def save(self, state: MemoryState) -> None:
+        with self._lock:
+            self._state = state
+            self._index = set(state.abstracts)
+            self._generation += 1
+            self._rewrite_generation = self._generation
+            self._checkpoint()
+
+    def add(self, abstract: str) -> None:
+        if not abstract or abstract in self._index:
+            return
+        self._index.add(abstract)
+        self._state.abstracts.append(abstract)
+        self._generation += 1
+        if not self._dir_path:
+            return
+        with self._lock:
+            self._pending.append(abstract)
+            if self._durability == "always":
+                self.flush()
+            elif self._durability == "batch":
+                if len(self._pending) >= self._flush_every:
+                    self.flush()
+                elif self._timer is None:
+                    self._timer = threading.Timer(self._flush_interval, self._timed_flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]:
+        abstracts = self._state.abstracts
+        return [abstracts[i] if 0 <= i < len(abstracts) else None for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        return iter(self._state.abstracts[max(start, 0):stop])
+
+    def __len__(self) -> int:
+        return len(self._state.abstracts)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def flush(self) -> None:
+        """Append all pending abstracts to the log in one write and fsync it."""
+        with self._lock:
+            self._cancel_timer()
+            if not self._dir_path or not self._pending:
+                return
+            try:
+                self._dir_path.mkdir(parents=True, exist_ok=True)
+                append_jsonl(self._log_file, [{"abstract": a} for a in self._pending], fsync=True)
+                self._pending = []
+            except Exception as e:
+                print(f"Warning: Failed to flush memory log to {self._log_file}: {e}")
+
+    def close(self) -> None:
+        """Flush pending abstracts and compact the log into memory_state.json (fsynced)."""
+        with self._lock:
+            self._checkpoint()
+
+    def __enter__(self) -> "BufferedMemoryStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- Internal ----
+    def _timed_flush(self) -> None:
+        with self._lock:
+            self._timer = None
+            self.flush()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _replay(self) -> Optional[MemoryState]:
+        if not self._memory_file.exists() and not self._log_file.exists():
+            return None
+        abstracts: List[str] = []
+        if self._memory_file.exists():
+            try:
+                with open(self._memory_file, 'r', encoding='utf-8') as f:
+                    abstracts = MemoryState(**json.load(f)).abstracts
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                print(f"Warning: Failed to load memory state from {self._memory_file}: {e}")
+        if self._log_file.exists():
+            seen = set(abstracts)
+            for record in read_jsonl(self._log_file):
+                abstract = record.get("abstract")
+                if abstract and abstract not in seen:
+                    seen.add(abstract)
+                    abstracts.append(abstract)
+        return MemoryState(abstracts=abstracts)
+
+    def _checkpoint(self) -> None:
+        self._cancel_timer()
+        if not self._dir_path:
+            self._pending = []
+            return
+        try:
+            self._dir_path.mkdir(parents=True, exist_ok=True)
+            atomic_write_json(self._memory_file, self._state.model_dump(), fsync=True)
+            # checkpoint 已包含全部摘要；即使删除前崩溃，重放时也会按内容去重
+            self._log_file.unlink(missing_ok=True)
+            self._pending = []
+        except Exception as e:
+            print(f"Warning: Failed to save memory state to {self._memory_file}: {e}")
@@ -0,0 +1,200 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+import math
+import re
+import threading
+import weakref
+
+NO_MEMORY = "No memory currently."
+
+
+class MemoryContextRenderer:
+    """
+    Renders abstracts as the "Page {i}: {abstract}" block used in prompts,
+    caching the text and appending only abstracts added since the last call.
+
+    Memory stores only grow between rewrites, so the cached text stays a
+    valid prefix until the store's rewrite_generation changes (or the first
+    or last rendered abstract no longer matches); then the text is rebuilt
+    once. An older snapshot of the same rewrite gets a prefix slice of the
+    cached text. Thread-safe.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._text = ""
+        self._ends: List[int] = []  # 第 i 行结束位置，用于截取更旧快照的前缀
+        self._first: Optional[str] = None
+        self._last: Optional[str] = None
+        self._rewrite_generation: Optional[int] = None
+
+    def render(self, abstracts: Sequence[str], rewrite_generation: Optional[int] = None) -> str:
+        """
+        Text for `abstracts`. Pass the store's rewrite_generation when known;
+        without it, rewrites are only caught by the first/last abstract check.
+        """
+        n = len(abstracts)
+        if n == 0:
+            return NO_MEMORY
+        with self._lock:
+            count = len(self._ends)
+            if rewrite_generation is not None and rewrite_generation != self._rewrite_generation:
+                self._reset(rewrite_generation)
+            elif count and abstracts[0] != self._first:
+                self._reset(rewrite_generation)
+            elif n < count:
+                # 同一重写版本下更旧的快照（并发 research()）：截取前缀，不丢缓存
+                if rewrite_generation is not None and abstracts[n - 1] == self._line(n - 1):
+                    return self._text[:self._ends[n - 1]]
+                return render_memory_context(abstracts)
+            elif count and abstracts[count - 1] != self._last:
+                self._reset(rewrite_generation)
+
+            count = len(self._ends)
+            if n > count:
+                parts = [self._text] if self._text else []
+                offset = len(self._text)
+                for i in range(count, n):
+                    line = f"Page {i}: {abstracts[i]}"
+                    offset += len(line) + (1 if parts else 0)
+                    parts.append(line)
+                    self._ends.append(offset)
+                self._text = "\n".join(parts)
+                self._first = abstracts[0]
+                self._last = abstracts[n - 1]
+            return self._text
+
+    def _reset(self, rewrite_generation: Optional[int]) -> None:
+        self._text = ""
+        self._ends = []
+        self._first = self._last = None
+        self._rewrite_generation = rewrite_generation
+
+    def _line(self, i: int) -> str:
+        start = self._ends[i - 1] + 1 if i else 0
+        return self._text[start:self._ends[i]].split(": ", 1)[1]
+
+
+def render_memory_context(abstracts: Sequence[str]) -> str:
+    """Uncached rendering of `abstracts`."""
+    if not abstracts:
+        return NO_MEMORY
+    return "\n".join(f"Page {i}: {abstract}" for i, abstract in enumerate(abstracts))
+
+
+# 英文/数字按词切分，其它文字（中文等）逐字切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[^\W\da-z_]")
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class AbstractIndex:
+    """
+    In-process BM25 index over memory abstracts, maintained incrementally.
+
+    sync() indexes only the abstracts added since the last call and rebuilds
+    when the store is rewritten (same staleness checks as
+    MemoryContextRenderer). Used by MemoryAgent to pick the abstracts most
+    relevant to a new message instead of sending the whole memory.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_lens: List[int] = []
+        self._total_len = 0
+        self._first: Optional[str] = None
+        self._last: Optional[str] = None
+        self._rewrite_generation: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._doc_lens)
+
+    def sync(self, abstracts: Sequence[str], rewrite_generation: Optional[int] = None) -> None:
+        n = len(abstracts)
+        with self._lock:
+            count = len(self._doc_lens)
+            if (
+                n < count
+                or (rewrite_generation is not None and rewrite_generation != self._rewrite_generation)
+                or (count and (abstracts[0] != self._first or abstracts[count - 1] != self._last))
+            ):
+                self._postings, self._doc_lens, self._total_len = {}, [], 0
+                count = 0
+            self._rewrite_generation = rewrite_generation
+            for doc_id in range(count, n):
+                tokens = _tokenize(abstracts[doc_id])
+                for token in tokens:
+                    postings = self._postings.setdefault(token, {})
+                    postings[doc_id] = postings.get(doc_id, 0) + 1
+                self._doc_lens.append(len(tokens))
+                self._total_len += len(tokens)
+            if n:
+                self._first, self._last = abstracts[0], abstracts[n - 1]
+
+    def search(self, query: str, top_k: int, exclude: Sequence[int] = ()) -> List[int]:
+        """Ids of the `top_k` best-scoring abstracts for `query`, best first."""
+        if top_k <= 0:
+            return []
+        with self._lock:
+            num_docs = len(self._doc_lens)
+            if not num_docs:
+                return []
+            avg_len = self._total_len / num_docs or 1.0
+            scores: Dict[int, float] = {}
+            for token in set(_tokenize(query)):
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_lens[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        for doc_id in exclude:
+            scores.pop(doc_id, None)
+        return sorted(scores, key=lambda d: (-scores[d], d))[:top_k]
+
+
+def select_memory_context(
+    abstracts: Sequence[str],
+    index: AbstractIndex,
+    query: str,
+    top_k: int,
+    recent: int = 0,
+    rewrite_generation: Optional[int] = None,
+) -> str:
+    """
+    Render only the `recent` newest abstracts plus the `top_k` abstracts most
+    relevant to `query`, in page order and with their original page ids, so
+    the prompt stays the same size however large the memory grows.
+    """
+    if not abstracts:
+        return NO_MEMORY
+    index.sync(abstracts, rewrite_generation)
+    n = len(abstracts)
+    recent_ids = list(range(max(0, n - recent), n))
+    selected = sorted(set(recent_ids).union(index.search(query, top_k, exclude=recent_ids)))
+    return "\n".join(f"Page {i}: {abstracts[i]}" for i in selected)
+
+
+_renderers: "weakref.WeakKeyDictionary[Any, MemoryContextRenderer]" = weakref.WeakKeyDictionary()
+_renderers_guard = threading.Lock()
+
+
+def renderer_for(store: Any) -> MemoryContextRenderer:
+    """
+    The MemoryContextRenderer of `store`. MemoryAgent and ResearchAgent
+    sharing a memory store share its rendered context. A store that cannot
+    be weakly referenced gets a fresh, uncached renderer on every call.
+    """
+    with _renderers_guard:
+        try:
+            renderer = _renderers.get(store)
+            if renderer is None:
+                renderer = _renderers[store] = MemoryContextRenderer()
+        except TypeError:
+            # 不按 id() 缓存：id 会被新对象复用，拿到已销毁 store 的渲染缓存
+            renderer = MemoryContextRenderer()
+        return renderer
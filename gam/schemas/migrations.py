@@ -0,0 +1,59 @@
+from __future__ import annotations
+from typing import Any, Dict, List
+import json
+import sys
+from pathlib import Path
+
+from .persistence import atomic_write_json, read_jsonl
+
+
+def _strip_records(records: List[Dict[str, Any]]) -> int:
+    stripped = 0
+    for record in records:
+        # log 模式里 replace() 的记录是 {"replace": i, "page": {...}}，page 在里面一层
+        page = record.get("page") if "replace" in record else record
+        meta = page.get("meta") if isinstance(page, dict) else None
+        if isinstance(meta, dict) and "decorated" in meta:
+            del meta["decorated"]
+            stripped += 1
+    return stripped
+
+
+def strip_decorated(dir_path: str) -> int:
+    """
+    Remove the legacy meta["decorated"] field from an InMemoryPageStore
+    directory (pages.json and any pages.log.*.jsonl segments), in place.
+    Page.decorated is now derived from header and content on demand.
+    Returns the number of pages rewritten; safe to run more than once.
+    """
+    dir_path = Path(dir_path)
+    stripped = 0
+
+    pages_file = dir_path / "pages.json"
+    if pages_file.exists():
+        with open(pages_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = data if isinstance(data, list) else data.get("pages", [])
+        count = _strip_records(records)
+        if count:
+            # 保持原有格式：普通模式带缩进，log 模式的 checkpoint 不带
+            atomic_write_json(pages_file, data, indent=2 if isinstance(data, list) else None)
+            stripped += count
+
+    for segment in sorted(dir_path.glob("pages.log.*.jsonl")):
+        records = list(read_jsonl(segment))
+        count = _strip_records(records)
+        if count:
+            tmp_path = segment.with_name(segment.name + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            tmp_path.replace(segment)
+            stripped += count
+    return stripped
+
+
+if __name__ == "__main__":
+    # python -m gam.schemas.migrations <page_dir> [<page_dir> ...]
+    for path in sys.argv[1:]:
+        print(f"{path}: stripped 'decorated' from {strip_decorated(path)} pages")
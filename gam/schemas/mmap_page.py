@@ -0,0 +1,282 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Optional
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+
+from .changefeed import ChangeFeed
+from .page import Page
+from .persistence import atomic_write_json, generation_path, remove_other_generations
+
+# 每条索引项: (offset, length)，均为 little-endian uint64
+_INDEX_ENTRY = struct.Struct("<QQ")
+# pages.hwm: replace() 写过的最大记录结尾，little-endian uint64
+_HIGH_WATER = struct.Struct("<Q")
+# 记录当前文件代数；没有这个文件时就是第 0 代（pages.bin / pages.idx）
+MANIFEST_FILE = "pages.manifest.json"
+HIGH_WATER_FILE = "pages.hwm"
+
+
+class MmapPageStore:
+    """
+    Page store backed by one memory-mapped blob and a fixed-width offset index.
+
+    Layout under dir_path:
+      - pages.bin: page records (UTF-8 JSON) written back to back
+      - pages.idx: one 16-byte (offset, length) entry per page
+      - pages.hwm: end of the furthest record written by replace(), so
+        opening finds the end of the live blob without scanning the index
+      - pages.manifest.json: {"generation": g} once save() has run; the
+        files of generation g > 0 are pages-g<g>.bin / pages-g<g>.idx
+
+    Opening the store only maps the two files, so len(), get(i) and range
+    reads are O(1) and nothing is parsed until a Page is actually needed.
+    get_raw(i) returns a zero-copy memoryview of the encoded record.
+    The index entry is written after the record, so it acts as the commit
+    point: a crash mid-add leaves at most unreferenced bytes in pages.bin.
+    replace(i) appends the new record, raises pages.hwm past it and then
+    rewrites entry i in place; the old record stays in pages.bin as garbage
+    until the next save(). Without replace() the last entry ends the blob.
+    save() writes both files of the next generation and then replaces the
+    manifest, the single commit point: a crash before it leaves the old
+    generation in effect, and the unreferenced files are removed on open.
+    """
+    def __init__(self, dir_path: str, fsync: bool = False) -> None:
+        self._dir_path = Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._manifest_file = self._dir_path / MANIFEST_FILE
+        self._file_generation = 0
+        if self._manifest_file.exists():
+            with open(self._manifest_file, 'r', encoding='utf-8') as f:
+                self._file_generation = json.load(f)["generation"]
+        self._set_files(self._file_generation)
+        for name in ("pages.bin", "pages.idx", HIGH_WATER_FILE):
+            remove_other_generations(self._dir_path / name, self._file_generation)
+        self._fsync = fsync
+        self._blob_map: Optional[mmap.mmap] = None
+        self._index_map: Optional[mmap.mmap] = None
+        self._generation = 0
+        self._rewrite_generation = 0
+        self.change_feed = ChangeFeed()
+        self._open()
+
+    # ---- Public ----
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def add(self, page: Page) -> None:
+        data = json.dumps(page.model_dump(), ensure_ascii=False).encode("utf-8")
+        offset = self._blob_size
+        self._blob_fh.write(data)
+        self._blob_fh.flush()
+        if self._fsync:
+            os.fsync(self._blob_fh.fileno())
+        self._index_fh.write(_INDEX_ENTRY.pack(offset, len(data)))
+        self._index_fh.flush()
+        if self._fsync:
+            os.fsync(self._index_fh.fileno())
+        self._blob_size += len(data)
+        self._count += 1
+        self._generation += 1
+        self.change_feed.publish("add", self._count - 1, page)
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place; its id stays the same."""
+        if not 0 <= index < self._count:
+            raise IndexError(f"page index {index} out of range")
+        data = json.dumps(page.model_dump(), ensure_ascii=False).encode("utf-8")
+        offset = self._blob_size
+        self._blob_fh.write(data)
+        self._blob_fh.flush()
+        if self._fsync:
+            os.fsync(self._blob_fh.fileno())
+        # 先抬高水位再提交索引项：崩溃时水位只会偏高（多留一点垃圾），不会截掉被引用的记录
+        self._write_high_water(offset + len(data))
+        # 就地改写索引项（提交点）；共享映射直接可见
+        with open(self._index_file, "r+b") as f:
+            f.seek(index * _INDEX_ENTRY.size)
+            f.write(_INDEX_ENTRY.pack(offset, len(data)))
+            if self._fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._blob_size += len(data)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
+
+    def get(self, index: int) -> Optional[Page]:
+        raw = self.get_raw(index)
+        if raw is None:
+            return None
+        return Page(**json.loads(bytes(raw)))
+
+    def get_raw(self, index: int) -> Optional[memoryview]:
+        """Encoded record of page `index` as a view into the mapped blob."""
+        if not 0 <= index < self._count:
+            return None
+        offset, length = self._entry(index)
+        return memoryview(self._mapped_blob())[offset:offset + length]
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        return [self.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        stop = self._count if stop is None else min(stop, self._count)
+        for i in range(max(start, 0), stop):
+            yield self.get(i)
+
+    def load(self) -> List[Page]:
+        return list(self.iter_range())
+
+    def files(self) -> Dict[str, Path]:
+        """Current data files by their generation-0 names ("pages.bin", "pages.idx").
+
+        pages.hwm is left out: a directory without it is scanned once on open.
+        """
+        return {"pages.bin": self._blob_file, "pages.idx": self._index_file}
+
+    def save(self, pages: List[Page]) -> None:
+        """Write `pages` as the next file generation and switch to it atomically (see class docstring)."""
+        self.change_feed.publish_diff(self.load(), pages)
+        self.close()
+        old_files = (self._blob_file, self._index_file, self._high_water_file)
+        new_generation = self._file_generation + 1
+        blob_new = generation_path(self._dir_path / "pages.bin", new_generation)
+        index_new = generation_path(self._dir_path / "pages.idx", new_generation)
+        high_water_new = generation_path(self._dir_path / HIGH_WATER_FILE, new_generation)
+        offset = 0
+        with open(blob_new, "wb") as blob_fh, open(index_new, "wb") as index_fh:
+            for page in pages:
+                data = json.dumps(page.model_dump(), ensure_ascii=False).encode("utf-8")
+                blob_fh.write(data)
+                index_fh.write(_INDEX_ENTRY.pack(offset, len(data)))
+                offset += len(data)
+            if self._fsync:
+                blob_fh.flush()
+                os.fsync(blob_fh.fileno())
+                index_fh.flush()
+                os.fsync(index_fh.fileno())
+        self._write_high_water(offset, high_water_new)
+        # manifest 是唯一的提交点：换上之前崩溃，旧的一代仍然完整有效
+        atomic_write_json(self._manifest_file, {"generation": new_generation}, fsync=self._fsync)
+        self._set_files(new_generation)
+        for path in old_files:
+            path.unlink(missing_ok=True)
+        self._open()
+        self._generation += 1
+        self._rewrite_generation = self._generation
+
+    def close(self) -> None:
+        for m in (self._blob_map, self._index_map):
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    # 仍有 get_raw() 返回的 view 引用该映射，交给 GC 回收
+                    pass
+        self._blob_map = None
+        self._index_map = None
+        for fh in (getattr(self, "_blob_fh", None), getattr(self, "_index_fh", None)):
+            if fh is not None and not fh.closed:
+                fh.close()
+
+    def __enter__(self) -> "MmapPageStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- Internal ----
+    def _set_files(self, generation: int) -> None:
+        self._file_generation = generation
+        self._blob_file = generation_path(self._dir_path / "pages.bin", generation)
+        self._index_file = generation_path(self._dir_path / "pages.idx", generation)
+        self._high_water_file = generation_path(self._dir_path / HIGH_WATER_FILE, generation)
+
+    def _open(self) -> None:
+        self._blob_file.touch(exist_ok=True)
+        self._index_file.touch(exist_ok=True)
+
+        # 丢弃不完整的尾部索引项，并截掉未被索引引用的 blob 尾巴
+        index_size = self._index_file.stat().st_size
+        self._count = index_size // _INDEX_ENTRY.size
+        if index_size != self._count * _INDEX_ENTRY.size:
+            os.truncate(self._index_file, self._count * _INDEX_ENTRY.size)
+        self._index_map = None
+        self._blob_map = None
+        blob_file_size = self._blob_file.stat().st_size
+        high_water = self._read_high_water()
+        if self._count:
+            offset, length = self._entry(self._count - 1)
+            self._blob_size = offset + length
+            if high_water is None:
+                # 旧目录没有 pages.hwm：扫一遍索引取最大结尾（replace 过的记录可能在最后），之后就不用再扫
+                high_water = max(
+                    offset + length for offset, length in _INDEX_ENTRY.iter_unpack(self._mapped_index())
+                )
+                self._write_high_water(high_water)
+            # 水位只会偏高；超出文件长度的部分没有意义
+            self._blob_size = max(self._blob_size, min(high_water, blob_file_size))
+        else:
+            self._blob_size = 0
+            if high_water is None:
+                self._write_high_water(0)
+        if blob_file_size != self._blob_size:
+            os.truncate(self._blob_file, self._blob_size)
+
+        self._blob_fh = open(self._blob_file, "ab")
+        self._index_fh = open(self._index_file, "ab")
+
+    def _read_high_water(self) -> Optional[int]:
+        try:
+            with open(self._high_water_file, "rb") as f:
+                data = f.read(_HIGH_WATER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) != _HIGH_WATER.size:
+            return None
+        return _HIGH_WATER.unpack(data)[0]
+
+    def _write_high_water(self, value: int, path: Optional[Path] = None) -> None:
+        # 8 字节原地覆盖，不走临时文件 + rename
+        path = self._high_water_file if path is None else path
+        with open(path, "r+b" if path.exists() else "wb") as f:
+            f.write(_HIGH_WATER.pack(value))
+            if self._fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _entry(self, index: int):
+        return _INDEX_ENTRY.unpack_from(self._mapped_index(), index * _INDEX_ENTRY.size)
+
+    def _mapped_index(self) -> mmap.mmap:
+        needed = self._count * _INDEX_ENTRY.size
+        if self._index_map is None or len(self._index_map) < needed:
+            self._index_map = self._remap(self._index_file)
+        return self._index_map
+
+    def _mapped_blob(self) -> mmap.mmap:
+        if self._blob_map is None or len(self._blob_map) < self._blob_size:
+            self._blob_map = self._remap(self._blob_file)
+        return self._blob_map
+
+    @staticmethod
+    def _remap(path: Path) -> mmap.mmap:
+        # 追加写之后文件变长，需要重新映射才能看到新内容；
+        # 旧映射可能仍被 get_raw() 的 view 引用，不主动关闭，交给 GC
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,362 @@
+from __future__ import annotations
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+import json
+import threading
+from pathlib import Path
+
+from .changefeed import ChangeFeed
+from .locks import lock_for
+from .memory import MemoryState
+from .page import Page
+from .persistence import atomic_write_json, append_jsonl, read_jsonl, repair_jsonl
+
+# 页面所属命名空间记在 meta 里，重新打开共享 store 时据此恢复各命名空间的页面列表
+NAMESPACE_KEY = "namespace"
+
+
+class NamespacedPageStore:
+    """
+    Many tenants' pages in one physical page store.
+
+    Every page written through namespace(name) is tagged with
+    meta["namespace"] = name and appended to the shared `store` (any
+    PageStore), so one set of files and one retriever index serve every
+    tenant. namespace(name) returns a PageNamespace: a PageStore view with
+    its own 0-based page ids, generation and change feed, which MemoryAgent
+    and ResearchAgent use exactly like a private store. Build retrievers
+    over the shared store and give each tenant a NamespacedRetriever.
+
+    The id mapping is rebuilt from the page meta when the store is opened.
+    Writes from different namespaces are serialized on the shared store's
+    lock (see lock_for).
+    """
+    def __init__(self, store: Any) -> None:
+        self.store = store
+        self._lock = threading.RLock()
+        self._members: Dict[str, List[int]] = {}     # namespace -> global ids, in local id order
+        self._views: Dict[str, "PageNamespace"] = {}
+        self._local: Dict[int, int] = {}             # global id -> local id
+        # 对外返回的不可变快照，命名空间只追加，页数不变就一直有效
+        self._snapshots: Dict[str, Tuple[Tuple[int, ...], FrozenSet[int]]] = {}
+        for global_id, page in enumerate(store.iter_range(0, len(store))):
+            name = page.meta.get(NAMESPACE_KEY) if page is not None else None
+            if name is not None:
+                self._track(name, global_id)
+
+    # ---- Public ----
+    def namespace(self, name: str) -> "PageNamespace":
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = PageNamespace(self, name)
+            return view
+
+    def namespaces(self) -> List[str]:
+        return sorted(self._members)
+
+    def global_ids(self, name: str) -> Tuple[int, ...]:
+        """Global ids of `name`'s pages (immutable snapshot); position k holds local id k."""
+        return self._snapshot(name)[0]
+
+    def id_filter(self, name: str) -> FrozenSet[int]:
+        """Global ids belonging to `name` (immutable snapshot, safe to iterate while pages are added)."""
+        return self._snapshot(name)[1]
+
+    def to_local(self, global_id: int) -> Optional[int]:
+        return self._local.get(global_id)
+
+    def _snapshot(self, name: str) -> Tuple[Tuple[int, ...], FrozenSet[int]]:
+        with self._lock:
+            members = self._members.get(name, [])
+            snapshot = self._snapshots.get(name)
+            if snapshot is None or len(snapshot[0]) != len(members):
+                snapshot = self._snapshots[name] = (tuple(members), frozenset(members))
+            return snapshot
+
+    # ---- used by PageNamespace ----
+    def _live_ids(self, name: str) -> List[int]:
+        # 只追加的 list：按下标读、取长度都不需要拷贝
+        return self._members.get(name, [])
+
+    def _track(self, name: str, global_id: int) -> int:
+        members = self._members.setdefault(name, [])
+        self._local[global_id] = len(members)
+        members.append(global_id)
+        return len(members) - 1
+
+    def _add(self, name: str, pages: List[Page]) -> List[int]:
+        pages = [_tagged(page, name) for page in pages]
+        with self._lock, lock_for(self.store).write():
+            start = len(self.store)
+            add_many = getattr(self.store, "add_many", None)
+            if add_many is not None:
+                add_many(pages)
+            else:
+                for page in pages:
+                    self.store.add(page)
+            return [self._track(name, start + offset) for offset in range(len(pages))]
+
+    def _replace(self, name: str, global_id: int, page: Page) -> Page:
+        page = _tagged(page, name)
+        with self._lock, lock_for(self.store).write():
+            self.store.replace(global_id, page)
+        return page
+
+
+def _tagged(page: Page, name: str) -> Page:
+    if page.meta.get(NAMESPACE_KEY) == name:
+        return page
+    return page.model_copy(update={"meta": {**page.meta, NAMESPACE_KEY: name}})
+
+
+class PageNamespace:
+    """One tenant's PageStore view of a NamespacedPageStore (local ids 0..len-1)."""
+    def __init__(self, parent: NamespacedPageStore, name: str) -> None:
+        self.parent = parent
+        self.name = name
+        self._generation = 0
+        self._rewrite_generation = 0
+        self.change_feed = ChangeFeed()
+
+    def __len__(self) -> int:
+        return len(self.parent._live_ids(self.name))
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def add(self, page: Page) -> None:
+        self.add_many([page])
+
+    def add_many(self, pages: Iterable[Page]) -> None:
+        pages = list(pages)
+        if not pages:
+            return
+        local_ids = self.parent._add(self.name, pages)
+        self._generation += 1
+        for local_id in local_ids:
+            self.change_feed.publish("add", local_id, self.get(local_id))
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place; its id stays the same."""
+        global_id = self._global_id(index)
+        page = self.parent._replace(self.name, global_id, page)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
+
+    def get(self, index: int) -> Optional[Page]:
+        ids = self.parent._live_ids(self.name)
+        if not 0 <= index < len(ids):
+            return None
+        return self.parent.store.get(ids[index])
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        members = self.parent._live_ids(self.name)
+        ids = list(ids)
+        wanted = [members[i] for i in ids if 0 <= i < len(members)]
+        found = iter(self.parent.store.get_many(wanted))
+        return [next(found) if 0 <= i < len(members) else None for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        members = self.parent._live_ids(self.name)
+        stop = len(members) if stop is None else min(stop, len(members))
+        for offset in range(max(start, 0), stop, 256):
+            yield from self.parent.store.get_many(members[offset:min(offset + 256, stop)])
+
+    def load(self) -> List[Page]:
+        return list(self.iter_range())
+
+    def save(self, pages: List[Page]) -> None:
+        """Replace changed pages and append new ones. A namespace cannot shrink: delete() pages instead."""
+        old_pages = self.load()
+        if len(pages) < len(old_pages):
+            raise ValueError(
+                f"Namespace {self.name!r} has {len(old_pages)} pages and cannot shrink to {len(pages)}; "
+                f"delete() pages instead"
+            )
+        for i, (old, new) in enumerate(zip(old_pages, pages)):
+            if old != _tagged(new, self.name):
+                self.replace(i, new)
+        self.add_many(pages[len(old_pages):])
+
+    def _global_id(self, index: int) -> int:
+        ids = self.parent._live_ids(self.name)
+        if not 0 <= index < len(ids):
+            raise IndexError(f"page index {index} out of range for namespace {self.name!r}")
+        return ids[index]
+
+
+class NamespacedMemoryStore:
+    """
+    Many tenants' abstracts in one store.
+
+    Layout under dir_path (optional; in-memory only without it):
+      - memory_namespaces.json: checkpoint {namespace: [abstracts]}
+      - memory_namespaces.log.jsonl: {"ns": name, "add": [...]} or
+        {"ns": name, "save": [...]} per write since the checkpoint
+
+    Writes append one log line instead of rewriting every tenant's
+    abstracts; the log is folded into the checkpoint once it outgrows it.
+    namespace(name) returns a MemoryNamespace, a MemoryStore view.
+    """
+    def __init__(self, dir_path: Optional[str] = None, compact_every: int = 1000) -> None:
+        self._dir_path = Path(dir_path) if dir_path else None
+        self._compact_every = max(1, compact_every)
+        self._lock = threading.RLock()
+        self._states: Dict[str, MemoryState] = {}
+        self._indexes: Dict[str, Set[str]] = {}
+        self._views: Dict[str, "MemoryNamespace"] = {}
+        self._log_lines = 0
+        self._checkpoint_size = 0
+        if self._dir_path:
+            self._checkpoint_file = self._dir_path / "memory_namespaces.json"
+            self._log_file = self._dir_path / "memory_namespaces.log.jsonl"
+            self._replay()
+
+    def namespace(self, name: str) -> "MemoryNamespace":
+        with self._lock:
+            view = self._views.get(name)
+            if view is None:
+                view = self._views[name] = MemoryNamespace(self, name)
+            return view
+
+    def namespaces(self) -> List[str]:
+        return sorted(self._states)
+
+    def compact(self) -> None:
+        """Fold the log into the checkpoint."""
+        with self._lock:
+            if self._dir_path and self._log_lines:
+                self._checkpoint()
+
+    # ---- used by MemoryNamespace ----
+    def _state(self, name: str) -> MemoryState:
+        state = self._states.get(name)
+        if state is None:
+            state = self._states[name] = MemoryState()
+            self._indexes[name] = set()
+        return state
+
+    def _add(self, name: str, abstracts: Iterable[str]) -> bool:
+        with self._lock:
+            state = self._state(name)
+            index = self._indexes[name]
+            added = []
+            for abstract in abstracts:
+                if abstract and abstract not in index:
+                    index.add(abstract)
+                    state.abstracts.append(abstract)
+                    added.append(abstract)
+            if added:
+                self._log({"ns": name, "add": added})
+            return bool(added)
+
+    def _save(self, name: str, state: MemoryState) -> None:
+        with self._lock:
+            self._states[name] = MemoryState(abstracts=list(state.abstracts))
+            self._indexes[name] = set(state.abstracts)
+            self._log({"ns": name, "save": list(state.abstracts)})
+
+    # ---- persistence ----
+    def _log(self, record: Dict[str, Any]) -> None:
+        if not self._dir_path:
+            return
+        try:
+            self._dir_path.mkdir(parents=True, exist_ok=True)
+            append_jsonl(self._log_file, [record])
+            self._log_lines += 1
+        except Exception as e:
+            print(f"Warning: Failed to append to {self._log_file}: {e}")
+            return
+        if self._log_lines >= max(self._compact_every, self._checkpoint_size):
+            self._checkpoint()
+
+    def _replay(self) -> None:
+        if self._checkpoint_file.exists():
+            try:
+                with open(self._checkpoint_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for name, abstracts in data.items():
+                    self._states[name] = MemoryState(abstracts=abstracts)
+            except (json.JSONDecodeError, TypeError, AttributeError) as e:
+                print(f"Warning: Failed to load memory namespaces from {self._checkpoint_file}: {e}")
+        self._checkpoint_size = sum(len(s.abstracts) for s in self._states.values())
+        self._indexes = {name: set(state.abstracts) for name, state in self._states.items()}
+        if self._log_file.exists():
+            repair_jsonl(self._log_file)
+            for record in read_jsonl(self._log_file):
+                name = record.get("ns")
+                if "save" in record:
+                    self._states[name] = MemoryState(abstracts=record["save"])
+                    self._indexes[name] = set(record["save"])
+                else:
+                    # 去重回放：checkpoint 之后、删日志之前崩溃时，日志内容已在 checkpoint 里
+                    state = self._state(name)
+                    index = self._indexes[name]
+                    for abstract in record.get("add", []):
+                        if abstract not in index:
+                            index.add(abstract)
+                            state.abstracts.append(abstract)
+                self._log_lines += 1
+
+    def _checkpoint(self) -> None:
+        try:
+            atomic_write_json(self._checkpoint_file, {name: s.abstracts for name, s in self._states.items()})
+        except Exception as e:
+            print(f"Warning: Failed to checkpoint memory namespaces to {self._checkpoint_file}: {e}")
+            return
+        # checkpoint 已包含日志里的全部内容；删日志前崩溃时回放是幂等的（见 _replay）
+        self._log_file.unlink(missing_ok=True)
+        self._log_lines = 0
+        self._checkpoint_size = sum(len(s.abstracts) for s in self._states.values())
+
+
+class MemoryNamespace:
+    """One tenant's MemoryStore view of a NamespacedMemoryStore."""
+    def __init__(self, parent: NamespacedMemoryStore, name: str) -> None:
+        self.parent = parent
+        self.name = name
+        self._generation = 0
+        self._rewrite_generation = 0
+
+    def load(self) -> MemoryState:
+        return self.parent._state(self.name)
+
+    def save(self, state: MemoryState) -> None:
+        self.parent._save(self.name, state)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+
+    def add(self, abstract: str) -> None:
+        self.add_many([abstract])
+
+    def add_many(self, abstracts: Iterable[str]) -> None:
+        if self.parent._add(self.name, abstracts):
+            self._generation += 1
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]:
+        abstracts = self.load().abstracts
+        return [abstracts[i] if 0 <= i < len(abstracts) else None for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        return iter(self.load().abstracts[max(start, 0):stop])
+
+    def __len__(self) -> int:
+        return len(self.load().abstracts)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
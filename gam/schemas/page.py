@@ -1,68 +1,387 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional, Protocol
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Tuple, Union
 from pydantic import BaseModel, Field
 import json
 from pathlib import Path
 
+from .changefeed import ChangeFeed
+from .persistence import atomic_write_json, append_jsonl, read_jsonl, repair_jsonl
+
 class Page(BaseModel):
     """Page data structure"""
     header: str = Field(..., description="Page header")
     content: str = Field(..., description="Page content")
     meta: Dict[str, Any] = Field(default_factory=dict, description="Metadata")
 
+    @property
+    def decorated(self) -> str:
+        """Header and content joined by "; ", derived on demand (not persisted)."""
+        return f"{self.header}; {self.content}"
+
+    @classmethod
+    def tombstone(cls) -> 'Page':
+        """Placeholder left by PageStore.delete(): keeps the page id, carries no content."""
+        return cls(header="", content="", meta={"tombstone": True})
+
+    @property
+    def is_tombstone(self) -> bool:
+        return bool(self.meta.get("tombstone"))
+
     @staticmethod
     def equal(page1: 'Page', page2: 'Page') -> bool:
         return page1 == page2
 
+class LazyPageList(Sequence):
+    """
+    Read-only-ish sequence of Pages backed by raw records.
+
+    Each record is turned into a Page (and validated) only on first access,
+    so loading a large trusted page file costs one JSON parse and nothing
+    per page until the page is actually used. Supports append() so it can
+    serve as a store's live page list.
+    """
+    __slots__ = ("_records", "_pages")
+
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self._records: List[Optional[Dict[str, Any]]] = records
+        self._pages: List[Optional[Page]] = [None] * len(records)
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        page = self._pages[index]
+        if page is None:
+            page = Page(**self._records[index])
+            self._pages[index] = page
+            self._records[index] = None  # 已物化，释放原始记录
+        return page
+
+    def __iter__(self) -> Iterator[Page]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __setitem__(self, index: int, page: Page) -> None:
+        self._pages[index] = page
+        self._records[index] = None
+
+    def append(self, page: Page) -> None:
+        self._records.append(None)
+        self._pages.append(page)
+
+    def copy(self) -> "LazyPageList":
+        """Shallow copy: records not yet materialized stay lazy in both lists."""
+        other = LazyPageList.__new__(LazyPageList)
+        other._records = list(self._records)
+        other._pages = list(self._pages)
+        return other
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """model_dump() of every page, reusing raw records that were never materialized."""
+        for record, page in zip(self._records, self._pages):
+            yield page.model_dump() if page is not None else record
+
+
+def _page_records(pages: Sequence[Page]) -> Iterator[Dict[str, Any]]:
+    if isinstance(pages, LazyPageList):
+        return pages.records()
+    return (page.model_dump() for page in pages)
+
+
 class PageStore(Protocol):
+    """
+    Page ids are list positions (0-based) and never shift: delete(i)
+    leaves a tombstone page (Page.is_tombstone) at i, and replace(i, page)
+    overwrites page i in place. Both publish an "update" event.
+
+    generation increases by one on every mutation made through the store;
+    rewrite_generation is the generation of the last save(), i.e. the last
+    mutation that may have changed existing pages. A consumer synced at
+    generation g therefore only has to read iter_range(old_len) when
+    rewrite_generation <= g.
+
+    change_feed publishes every add/update/delete with a sequence number,
+    so incremental consumers can apply exactly the delta since their cursor.
+    """
+    change_feed: ChangeFeed
+
+    @property
+    def generation(self) -> int: ...
+    @property
+    def rewrite_generation(self) -> int: ...
+    def __len__(self) -> int: ...
     def add(self, page: Page) -> None: ...
+    def replace(self, index: int, page: Page) -> None: ...
+    def delete(self, index: int) -> None: ...
+    def get(self, index: int) -> Optional[Page]: ...
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]: ...
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]: ...
     def load(self) -> List[Page]: ...
     def save(self, pages: List[Page]) -> None: ...
 
 class InMemoryPageStore:
     """
-    Simple append-only list store for Page.
+    Simple list store for Page: append, plus in-place replace()/delete().
     Uses file system persistence.
+
+    trusted=True means the page files were written by GAM itself: load()
+    then returns a LazyPageList that builds Page objects only on access.
+    With the default trusted=False every record is validated at load time.
+
+    Persistence modes (only relevant when dir_path is given):
+      - log_mode=False (default): every add() rewrites the whole pages.json.
+      - log_mode=True: every add() appends one line to a JSONL log segment
+        (pages.log.<n>.jsonl); replace()/delete() append a
+        {"replace": id, "page": ...} line. Once the log grows past
+        max(compact_every, pages in checkpoint), it is compacted into
+        pages.json via write-to-temp + atomic rename, which keeps ingest
+        amortized O(1) per page. Checkpoint + segments are replayed once
+        when the store is opened; load() then returns a copy of the
+        in-memory list without touching the files.
     """
-    def __init__(self, dir_path: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        dir_path: Optional[str] = None,
+        log_mode: bool = False,
+        compact_every: int = 1000,
+        fsync: bool = False,
+        trusted: bool = False,
+    ) -> None:
         self._dir_path = Path(dir_path) if dir_path else None
         self._pages: List[Page] = []
+        self._trusted = trusted
+        self._log_mode = log_mode
+        self._compact_every = max(1, compact_every)
+        self._fsync = fsync
+        self._generation = 0
+        self._rewrite_generation = 0
+        self.change_feed = ChangeFeed()
+        # log mode bookkeeping
+        self._segment = 0             # number of the segment currently appended to
+        self._log_lines = 0           # pages in segments not yet folded into the checkpoint
+        self._checkpoint_size = 0     # pages in pages.json
         if self._dir_path:
             self._pages_file = self._dir_path / "pages.json"
-            if self._pages_file.exists():
+            if self._log_mode:
+                self._pages = self._replay()
+                repair_jsonl(self._segment_file(self._segment))
+            elif self._pages_file.exists():
                 self._pages = self.load()
 
     def load(self) -> List[Page]:
+        if self._dir_path and self._log_mode:
+            # 打开时已回放过日志，之后的写入都同步到了 self._pages
+            return self._pages.copy()
         if self._dir_path and self._pages_file.exists():
             try:
                 with open(self._pages_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
-                        return [Page(**page_data) for page_data in data]
+                        return self._to_pages(data)
                     else:
-                        return [Page(**page_data) for page_data in data.get('pages', [])]
-            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        return self._to_pages(data.get('pages', []))
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
                 print(f"Warning: Failed to load pages from {self._pages_file}: {e}")
                 return []
-        return self._pages
+        # 返回副本，避免调用方原地修改后 save() 时无法得出变更
+        return list(self._pages)
 
     def save(self, pages: List[Page]) -> None:
+        if pages is self._pages:
+            # 原地修改后再 save，无法做 diff，只能把每页都当作更新
+            for i, page in enumerate(pages):
+                self.change_feed.publish("update", i, page)
+        else:
+            self.change_feed.publish_diff(self._pages, pages)
         self._pages = pages
+        self._generation += 1
+        self._rewrite_generation = self._generation
         if self._dir_path:
             self._dir_path.mkdir(parents=True, exist_ok=True)
-            try:
-                pages_data = [page.model_dump() for page in pages]
-                with open(self._pages_file, 'w', encoding='utf-8') as f:
-                    json.dump(pages_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"Warning: Failed to save pages to {self._pages_file}: {e}")
+            if self._log_mode:
+                self._checkpoint()
+            else:
+                self._write_json()
 
     def add(self, page: Page) -> None:
         self._pages.append(page)
+        self._generation += 1
+        self.change_feed.publish("add", len(self._pages) - 1, page)
         if self._dir_path:
-            self.save(self._pages)
+            if self._log_mode:
+                self._append_log([page])
+            else:
+                self._write_json()
+
+    def add_many(self, pages: Iterable[Page]) -> None:
+        """add() for a batch, with a single file write (or log append) for all of it."""
+        pages = list(pages)
+        if not pages:
+            return
+        for page in pages:
+            self._pages.append(page)
+            self.change_feed.publish("add", len(self._pages) - 1, page)
+        self._generation += 1
+        if self._dir_path:
+            if self._log_mode:
+                self._append_log(pages)
+            else:
+                self._write_json()
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place; its id stays the same."""
+        if not 0 <= index < len(self._pages):
+            raise IndexError(f"page index {index} out of range")
+        self._pages[index] = page
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+        if self._dir_path:
+            if self._log_mode:
+                self._append_records([{"replace": index, "page": page.model_dump()}])
+            else:
+                self._write_json()
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
 
     def get(self, index: int) -> Optional[Page]:
         if 0 <= index < len(self._pages):
             return self._pages[index]
         return None
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        return [self.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        return iter(self._pages[max(start, 0):stop])
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def _write_json(self) -> None:
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        try:
+            pages_data = list(_page_records(self._pages))
+            with open(self._pages_file, 'w', encoding='utf-8') as f:
+                json.dump(pages_data, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"Warning: Failed to save pages to {self._pages_file}: {e}")
+
+    def compact(self) -> None:
+        """Fold all log segments into pages.json (log mode only)."""
+        if self._dir_path and self._log_mode and self._log_lines:
+            self._checkpoint()
+
+    # ---- log mode internals ----
+    def _segment_file(self, segment: int) -> Path:
+        return self._dir_path / f"pages.log.{segment:06d}.jsonl"
+
+    def _segment_files(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for path in self._dir_path.glob("pages.log.*.jsonl"):
+            try:
+                segments.append((int(path.name.split(".")[2]), path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _replay(self) -> List[Page]:
+        """Checkpoint first, then every segment not covered by it, in order."""
+        records: List[Dict[str, Any]] = []
+        first_segment = 0
+        if self._pages_file.exists():
+            try:
+                with open(self._pages_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    records = data
+                else:
+                    records = data.get('pages', [])
+                    first_segment = data.get('next_segment', 0)
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                print(f"Warning: Failed to load pages from {self._pages_file}: {e}")
+        checkpoint_size = len(records)
+
+        last_segment = first_segment
+        log_lines = 0
+        if self._dir_path.exists():
+            for segment, path in self._segment_files():
+                if segment < first_segment:
+                    continue
+                for record in read_jsonl(path):
+                    if "replace" in record:
+                        records[record["replace"]] = record["page"]
+                    else:
+                        records.append(record)
+                    log_lines += 1
+                last_segment = segment
+        try:
+            pages = self._to_pages(records)
+        except (TypeError, ValueError) as e:
+            print(f"Warning: Failed to load pages from {self._dir_path}: {e}")
+            pages, checkpoint_size, log_lines = [], 0, 0
+
+        self._checkpoint_size = checkpoint_size
+        self._log_lines = log_lines
+        self._segment = last_segment
+        return pages
+
+    def _to_pages(self, records: List[Dict[str, Any]]) -> List[Page]:
+        if self._trusted:
+            return LazyPageList(records)
+        return [Page(**page_data) for page_data in records]
+
+    def _append_log(self, pages: List[Page]) -> None:
+        self._append_records([page.model_dump() for page in pages])
+
+    def _append_records(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            self._dir_path.mkdir(parents=True, exist_ok=True)
+            append_jsonl(self._segment_file(self._segment), records, fsync=self._fsync)
+            self._log_lines += len(records)
+        except Exception as e:
+            print(f"Warning: Failed to append page to {self._segment_file(self._segment)}: {e}")
+            return
+        # 日志长度超过 checkpoint 大小时再压缩，保证摊还 O(1)
+        if self._log_lines >= max(self._compact_every, self._checkpoint_size):
+            self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """
+        Write pages.json atomically, then drop the segments it covers.
+        The checkpoint records the first segment it does NOT cover, so a crash
+        between the rename and the cleanup never replays a page twice.
+        """
+        next_segment = self._segment + 1
+        try:
+            atomic_write_json(
+                self._pages_file,
+                {"pages": list(_page_records(self._pages)), "next_segment": next_segment},
+                fsync=self._fsync,
+            )
+        except Exception as e:
+            print(f"Warning: Failed to checkpoint pages to {self._pages_file}: {e}")
+            return
+        for segment, path in self._segment_files():
+            if segment < next_segment:
+                path.unlink(missing_ok=True)
+        self._segment = next_segment
+        self._checkpoint_size = len(self._pages)
+        self._log_lines = 0
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import itertools
+import json
+import sys
+import threading
+
+from .page import Page
+
+# 每个缓存项的固定开销（Page 对象、dict 槽位、key 元组），粗略估计即可
+_ENTRY_OVERHEAD = 256
+
+
+def page_nbytes(page: Page) -> int:
+    """Approximate resident size of a Page, used for the cache byte budget."""
+    meta = json.dumps(page.meta, ensure_ascii=False) if page.meta else ""
+    return sys.getsizeof(page.header) + sys.getsizeof(page.content) + sys.getsizeof(meta) + _ENTRY_OVERHEAD
+
+
+class PageCache:
+    """
+    Byte-bounded cache of decoded Pages shared by everything in the process.
+
+    The hot tier is this cache; the cold tier is whatever store a view reads
+    from (usually an on-disk store such as MmapPageStore). Entries are keyed
+    by (view namespace, page id), so one budget covers every retriever.
+
+    policy="lru" evicts the least recently used page, policy="lfu" the least
+    frequently used one (ties broken by recency). Pages bigger than the whole
+    budget are returned uncached.
+    Cold reads run outside the lock; every invalidate() bumps its view's
+    invalidation count, and pages read while it moved are returned but not
+    cached, so they cannot overwrite a newer version.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, policy: str = "lru") -> None:
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy {policy!r}, expected 'lru' or 'lfu'")
+        self.max_bytes = max(0, max_bytes)
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._namespaces = itertools.count()
+        self._entries: Dict[Hashable, Tuple[Page, int]] = {}
+        # lru: 一个桶；lfu: 访问次数 -> 按最近访问排序的 key
+        self._buckets: Dict[int, "OrderedDict[Hashable, None]"] = {}
+        self._freq: Dict[Hashable, int] = {}
+        self._invalidations: Dict[int, int] = {}  # view namespace -> invalidate() 次数
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---- Public ----
+    def view(self, store) -> "CachedPages":
+        """Read-through view of `store` (anything with get/get_many/__len__)."""
+        return CachedPages(self, store, next(self._namespaces))
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._freq.clear()
+            self._bytes = 0
+
+    # ---- used by CachedPages ----
+    def _get_many(self, namespace: int, store, ids: List[int]) -> List[Optional[Page]]:
+        out: List[Optional[Page]] = [None] * len(ids)
+        missing: List[int] = []
+        with self._lock:
+            for pos, page_id in enumerate(ids):
+                entry = self._entries.get((namespace, page_id))
+                if entry is None:
+                    missing.append(pos)
+                else:
+                    self._touch((namespace, page_id))
+                    out[pos] = entry[0]
+            self.hits += len(ids) - len(missing)
+            self.misses += len(missing)
+            invalidations = self._invalidations.get(namespace, 0)
+        if missing:
+            # 冷层读取不持锁，慢存储不会阻塞其他线程的命中
+            loaded = store.get_many([ids[pos] for pos in missing])
+            with self._lock:
+                # 读取期间有 invalidate()：读到的可能是旧版本，只返回不缓存
+                cacheable = self._invalidations.get(namespace, 0) == invalidations
+                for pos, page in zip(missing, loaded):
+                    out[pos] = page
+                    if page is not None and cacheable:
+                        self._put((namespace, ids[pos]), page)
+        return out
+
+    def _invalidate(self, namespace: int, ids: Optional[Iterable[int]] = None) -> None:
+        with self._lock:
+            self._invalidations[namespace] = self._invalidations.get(namespace, 0) + 1
+            if ids is None:
+                keys = [k for k in self._entries if k[0] == namespace]
+            else:
+                keys = [(namespace, i) for i in ids]
+            for key in keys:
+                self._remove(key)
+
+    # ---- Internal (caller holds the lock) ----
+    def _put(self, key: Hashable, page: Page) -> None:
+        size = page_nbytes(page)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        while self._bytes + size > self.max_bytes and self._entries:
+            self._evict_one()
+        self._entries[key] = (page, size)
+        self._bytes += size
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+
+    def _touch(self, key: Hashable) -> None:
+        freq = self._freq[key]
+        if self.policy == "lru":
+            self._buckets[freq].move_to_end(key)
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def _evict_one(self) -> None:
+        bucket = self._buckets[min(self._buckets)]
+        key = next(iter(bucket))
+        self._remove(key)
+        self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+
+class CachedPages(Sequence):
+    """
+    Sequence view of a page store whose reads go through a PageCache.
+    Holders keep only this view (ids 0..len-1), never the pages themselves.
+    Call invalidate() for ids the underlying store has rewritten.
+    """
+    def __init__(self, cache: PageCache, store, namespace: int) -> None:
+        self.cache = cache
+        self.store = store
+        self._namespace = namespace
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.get_many(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("page index out of range")
+        return self.cache._get_many(self._namespace, self.store, [index])[0]
+
+    def __iter__(self) -> Iterator[Page]:
+        # 分批读，避免逐页往返冷层
+        for start in range(0, len(self), 256):
+            yield from self.get_many(range(start, min(start + 256, len(self))))
+
+    def get(self, index: int) -> Optional[Page]:
+        if not 0 <= index < len(self):
+            return None
+        return self.cache._get_many(self._namespace, self.store, [index])[0]
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        return self.cache._get_many(self._namespace, self.store, list(ids))
+
+    def invalidate(self, ids: Optional[Iterable[int]] = None) -> None:
+        """Drop cached pages of this view (all of them when ids is None)."""
+        self.cache._invalidate(self._namespace, ids)
+
+
+_shared_cache: Optional[PageCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_page_cache() -> PageCache:
+    """The process-wide PageCache used by retrievers unless one is passed in their config."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = PageCache()
+        return _shared_cache
+
+
+def configure_shared_page_cache(max_bytes: int, policy: str = "lru") -> PageCache:
+    """Replace the process-wide PageCache (call before building retrievers)."""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = PageCache(max_bytes=max_bytes, policy=policy)
+        return _shared_cache
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+
+def atomic_write_json(path: Path, data: Any, indent: int | None = None, fsync: bool = False) -> None:
+    """Write JSON to a temp file next to `path` and rename it into place."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def append_jsonl(path: Path, records: List[Dict[str, Any]], fsync: bool = False) -> None:
+    """Append one JSON object per line to `path`."""
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Replay a JSONL file line by line.
+    A torn last line (crash in the middle of an append) is skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
+
+
+def repair_jsonl(path: Path) -> None:
+    """Cut a torn trailing line so later appends start on a fresh line."""
+    if not path.exists():
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def generation_path(path: Path, generation: int) -> Path:
+    """
+    Name of `path` in file generation `generation`: `path` itself for 0,
+    else <stem>-g<generation><suffix>. Stores write a full save() into the
+    next generation and switch to it by rewriting their manifest last.
+    """
+    if generation == 0:
+        return path
+    return path.with_name(f"{path.stem}-g{generation}{path.suffix}")
+
+
+def remove_other_generations(path: Path, generation: int) -> None:
+    """Delete every generation of `path` (file or directory) except `generation`, plus leftover .tmp files."""
+    if not path.parent.exists():
+        return
+    pattern = re.compile(rf"{re.escape(path.stem)}(-g\d+)?{re.escape(path.suffix)}(\.tmp)?")
+    keep = generation_path(path, generation).name
+    for candidate in path.parent.iterdir():
+        if candidate.name == keep or not pattern.fullmatch(candidate.name):
+            continue
+        if candidate.is_dir():
+            shutil.rmtree(candidate, ignore_errors=True)
+        else:
+            candidate.unlink(missing_ok=True)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple, Union
+from pydantic import BaseModel, Field
+import json
+import threading
+from pathlib import Path
+
+from .memory_context import NO_MEMORY, AbstractIndex
+from .persistence import append_jsonl, atomic_write_json, read_jsonl, repair_jsonl
+
+
+class Rollup(BaseModel):
+    """Summary of the consecutive abstracts [start, end) at `level` (1 = summary of abstracts)."""
+    level: int = Field(..., description="1 summarizes abstracts, 2 summarizes level-1 rollups, ...")
+    start: int = Field(..., description="First abstract / page id covered")
+    end: int = Field(..., description="One past the last abstract / page id covered")
+    summary: str = Field(..., description="Rollup text")
+
+
+ViewItem = Union[int, Rollup]
+
+
+class MemoryRollups:
+    """
+    Optional hierarchical index on top of the flat abstract list.
+
+    Every `fanout` consecutive abstracts are summarized into a level-1
+    Rollup, every `fanout` level-1 rollups into a level-2 one, and so on.
+    The view of n abstracts is the highest-level rollups covering the oldest
+    pages, then the not-yet-rolled entries of each lower level, then the
+    newest raw abstracts: at most fanout - 1 items per level, so its size
+    grows with log(n) instead of n. Rollup lines carry their page range, so
+    the planner can drill down with page_index; view(query=...) also
+    expands the `expand` rollups that best match the query into their children.
+
+    MemoryRollups only stores and renders; MemoryAgent asks next_group()
+    for the entries to summarize and commits the summary with add().
+    Persisted under dir_path: add() appends the rollup to
+    memory_rollups.log.jsonl, and every `checkpoint_every` rollups the
+    levels are written to memory_rollups.json (atomic rename) and the log
+    is dropped. Opening replays the checkpoint, then the log.
+    """
+    def __init__(
+        self,
+        dir_path: Optional[str] = None,
+        fanout: int = 16,
+        expand: int = 1,
+        checkpoint_every: int = 64,
+    ) -> None:
+        if fanout < 2:
+            raise ValueError(f"fanout must be at least 2, got {fanout}")
+        self.fanout = fanout
+        self.expand = max(0, expand)
+        self._checkpoint_every = max(1, checkpoint_every)
+        self._lock = threading.Lock()
+        self._levels: List[List[Rollup]] = []  # _levels[k] 是 level k+1 的 rollup，按 start 递增
+        self._starts: List[List[int]] = []
+        self._file = Path(dir_path) / "memory_rollups.json" if dir_path else None
+        self._log_file = Path(dir_path) / "memory_rollups.log.jsonl" if dir_path else None
+        self._logged = 0          # 上次 checkpoint 之后追加到 log 的条数
+        self._needs_checkpoint = True  # 还没有与内存一致的 checkpoint（不存在 / fanout 不同）
+        if self._file is not None:
+            if self._file.exists():
+                self._load()
+            repair_jsonl(self._log_file)
+
+    # ---- building ----
+    def next_group(self, abstracts: Sequence[str]) -> Optional[Tuple[int, int, int, List[str]]]:
+        """
+        (level, start, end, texts) of the next run that is full and not yet
+        rolled up, lowest level first; None when everything is rolled up.
+        Drops all rollups if `abstracts` no longer covers them (memory rewritten).
+        """
+        with self._lock:
+            if self._levels and self._levels[0] and self._levels[0][-1].end > len(abstracts):
+                self._levels, self._starts = [], []
+                self._checkpoint()
+            covered = self._levels[0][-1].end if self._levels and self._levels[0] else 0
+            if len(abstracts) - covered >= self.fanout:
+                end = covered + self.fanout
+                return 1, covered, end, list(abstracts[covered:end])
+            for k in range(1, len(self._levels)):
+                lower, upper = self._levels[k - 1], self._levels[k]
+                rolled = len(upper) * self.fanout
+                if len(lower) - rolled >= self.fanout:
+                    children = lower[rolled:rolled + self.fanout]
+                    return k + 1, children[0].start, children[-1].end, [c.summary for c in children]
+            top = self._levels[-1] if self._levels else []
+            if len(top) >= self.fanout:
+                children = top[:self.fanout]
+                return len(self._levels) + 1, children[0].start, children[-1].end, [c.summary for c in children]
+            return None
+
+    def add(self, rollup: Rollup) -> bool:
+        """Commit a rollup returned by next_group(); False if it is no longer the next one."""
+        with self._lock:
+            if not self._append(rollup):
+                return False
+            self._persist(rollup)
+            return True
+
+    def _append(self, rollup: Rollup) -> bool:
+        k = rollup.level - 1
+        if k > len(self._levels):
+            return False
+        if k == len(self._levels):
+            self._levels.append([])
+            self._starts.append([])
+        level = self._levels[k]
+        expected_start = level[-1].end if level else 0
+        if rollup.start != expected_start:
+            return False
+        level.append(rollup)
+        self._starts[k].append(rollup.start)
+        return True
+
+    # ---- reading ----
+    def __len__(self) -> int:
+        return sum(len(level) for level in self._levels)
+
+    @property
+    def levels(self) -> int:
+        return len(self._levels)
+
+    def view(self, n: int, query: Optional[str] = None) -> List[ViewItem]:
+        """
+        Items covering abstracts [0, n) in page order: Rollups and raw abstract ids.
+        Only rollups ending at or before n are used, so an older snapshot
+        of the memory gets a consistent view. With query, the `expand`
+        best-matching rollups are replaced by their children.
+        """
+        with self._lock:
+            items: List[ViewItem] = []
+            pos = 0
+            for k in range(len(self._levels) - 1, -1, -1):
+                level = self._levels[k]
+                for j in range(bisect_left(self._starts[k], pos), len(level)):
+                    if level[j].end > n:
+                        break
+                    items.append(level[j])
+                    pos = level[j].end
+            items.extend(range(pos, n))
+
+            if query and self.expand:
+                for _ in range(self.expand):
+                    best = self._best_rollup(items, query)
+                    if best is None:
+                        break
+                    i = items.index(best)
+                    items[i:i + 1] = self._children(best)
+        return items
+
+    def render(self, abstracts: Sequence[str], query: Optional[str] = None) -> str:
+        """The view of `abstracts` as prompt text (MEMORY_CONTEXT / planning memory)."""
+        if not abstracts:
+            return NO_MEMORY
+        lines = []
+        for item in self.view(len(abstracts), query=query):
+            if isinstance(item, Rollup):
+                lines.append(f"Pages {item.start}-{item.end - 1} (level-{item.level} summary): {item.summary}")
+            else:
+                lines.append(f"Page {item}: {abstracts[item]}")
+        return "\n".join(lines)
+
+    def _children(self, rollup: Rollup) -> List[ViewItem]:
+        if rollup.level == 1:
+            return list(range(rollup.start, rollup.end))
+        k = rollup.level - 2
+        j = bisect_left(self._starts[k], rollup.start)
+        return list(self._levels[k][j:j + self.fanout])
+
+    @staticmethod
+    def _best_rollup(items: List[ViewItem], query: str) -> Optional[Rollup]:
+        rollups = [item for item in items if isinstance(item, Rollup)]
+        if not rollups:
+            return None
+        # 视图只有 O(fanout * levels) 条，每次现建一个小 BM25 即可
+        index = AbstractIndex()
+        index.sync([r.summary for r in rollups])
+        best = index.search(query, 1)
+        return rollups[best[0]] if best else None
+
+    # ---- persistence ----
+    def _persist(self, rollup: Rollup) -> None:
+        """Append `rollup` to the log, or checkpoint every `checkpoint_every` rollups."""
+        if self._file is None:
+            return
+        if self._needs_checkpoint or self._logged >= self._checkpoint_every:
+            self._checkpoint()
+            return
+        append_jsonl(self._log_file, [rollup.model_dump()])
+        self._logged += 1
+
+    def _checkpoint(self) -> None:
+        if self._file is None:
+            return
+        self._file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self._file, {
+            "fanout": self.fanout,
+            "levels": [[r.model_dump() for r in level] for level in self._levels],
+        })
+        # checkpoint 已包含 log 里的全部 rollup；删除前崩溃也没关系，重放时 _append 会跳过重复的
+        self._log_file.unlink(missing_ok=True)
+        self._logged = 0
+        self._needs_checkpoint = False
+
+    def _load(self) -> None:
+        try:
+            with open(self._file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Failed to load memory rollups from {self._file}: {e}")
+            return
+        if data.get("fanout") != self.fanout:
+            print(f"Warning: {self._file} was built with fanout {data.get('fanout')}, rebuilding with {self.fanout}")
+            return
+        self._levels = [[Rollup(**r) for r in level] for level in data.get("levels", [])]
+        self._starts = [[r.start for r in level] for level in self._levels]
+        if self._log_file.exists():
+            for record in read_jsonl(self._log_file):
+                self._append(Rollup(**record))
+                self._logged += 1
+        self._needs_checkpoint = False
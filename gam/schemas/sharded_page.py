@@ -0,0 +1,225 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+import json
+import re
+import shutil
+import threading
+from pathlib import Path
+
+from .changefeed import ChangeFeed
+from .page import InMemoryPageStore, Page
+from .persistence import atomic_write_json, generation_path
+
+T = TypeVar("T")
+
+_SHARD_DIR = re.compile(r"shard-\d{5,}(?:-g(\d+))?")
+
+
+class ShardedPageStore:
+    """
+    Page store split by id range across shard directories.
+
+    Layout under dir_path:
+      - manifest.json: {"shard_size": S, "num_shards": K, "generation": g}
+      - shard-00000/, shard-00001/, ...: one InMemoryPageStore each
+        (shard-00000-g<g>/, ... once save() has run)
+
+    Page i lives in shard i // S at local position i % S, so global ids are
+    stable: appends only ever touch the last shard, and SearchPlan.page_index
+    / Hit.page_id keep resolving. Shards are opened lazily on first access.
+    save() and compact() write shards on a thread pool, which overlaps
+    their file writes and fsyncs. load() and warm() open shards one after
+    another: replaying a shard is JSON decoding that holds the GIL, so
+    threads would not speed it up.
+    shard_size is fixed when the store is created.
+    save() writes every shard of the next generation while the old shards
+    stay intact, then rewrites the manifest (the commit point) and only
+    then removes the old generation.
+    """
+    def __init__(
+        self,
+        dir_path: str,
+        shard_size: int = 100_000,
+        log_mode: bool = True,
+        compact_every: int = 1000,
+        trusted: bool = True,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self._dir_path = Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._manifest_file = self._dir_path / "manifest.json"
+        self._log_mode = log_mode
+        self._compact_every = compact_every
+        self._trusted = trusted
+        self._max_workers = max_workers
+        self._shards: Dict[int, InMemoryPageStore] = {}
+        self._shards_lock = threading.Lock()  # compact() 的多个线程、并发读者会同时打开分片
+        self._generation = 0
+        self._rewrite_generation = 0
+        self.change_feed = ChangeFeed()
+
+        if self._manifest_file.exists():
+            with open(self._manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self._shard_size = manifest["shard_size"]
+            self._num_shards = manifest["num_shards"]
+            self._file_generation = manifest.get("generation", 0)
+            self._remove_other_generations()
+        else:
+            self._shard_size = max(1, shard_size)
+            self._num_shards = 1
+            self._file_generation = 0
+            self._write_manifest()
+
+    # ---- Public ----
+    @property
+    def shard_size(self) -> int:
+        return self._shard_size
+
+    @property
+    def num_shards(self) -> int:
+        return self._num_shards
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def __len__(self) -> int:
+        # 除最后一个分片外都是满的，只需要打开最后一个
+        return (self._num_shards - 1) * self._shard_size + len(self._shard(self._num_shards - 1))
+
+    def add(self, page: Page) -> None:
+        shard_no = self._num_shards - 1
+        if len(self._shard(shard_no)) >= self._shard_size:
+            # 先写 manifest 再写新分片：崩溃后最多留下一个空分片
+            shard_no = self._num_shards
+            self._num_shards += 1
+            self._write_manifest()
+        self._shard(shard_no).add(page)
+        self._generation += 1
+        self.change_feed.publish("add", len(self) - 1, page)
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place (only its shard is touched)."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"page index {index} out of range")
+        shard_no, local = divmod(index, self._shard_size)
+        self._shard(shard_no).replace(local, page)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
+
+    def get(self, index: int) -> Optional[Page]:
+        if index < 0:
+            return None
+        shard_no, local = divmod(index, self._shard_size)
+        if shard_no >= self._num_shards:
+            return None
+        return self._shard(shard_no).get(local)
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        return [self.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, 0)
+        while start < stop:
+            shard_no, local = divmod(start, self._shard_size)
+            local_stop = min(self._shard_size, local + stop - start)
+            yield from self._shard(shard_no).iter_range(local, local_stop)
+            start += local_stop - local
+
+    def load(self) -> List[Page]:
+        pages: List[Page] = []
+        for shard_no in range(self._num_shards):
+            pages.extend(self._shard(shard_no).load())
+        return pages
+
+    def save(self, pages: List[Page]) -> None:
+        """Re-partition `pages` into the next generation of shards, written in parallel (see class docstring)."""
+        self.change_feed.publish_diff(self.load(), pages)
+        num_shards = max(1, -(-len(pages) // self._shard_size))
+        new_generation = self._file_generation + 1
+
+        def save_shard(shard_no: int) -> InMemoryPageStore:
+            start = shard_no * self._shard_size
+            shard = self._open_shard(shard_no, new_generation)
+            shard.save(list(pages[start:start + self._shard_size]))
+            return shard
+
+        new_shards = self._map_shards(save_shard, range(num_shards))
+        # manifest 是提交点：写之前崩溃，旧的分片都还在、manifest 仍指向它们
+        with self._shards_lock:
+            self._num_shards = num_shards
+            self._file_generation = new_generation
+            self._write_manifest()
+            self._shards = dict(enumerate(new_shards))
+        self._remove_other_generations()
+        self._generation += 1
+        self._rewrite_generation = self._generation
+
+    def compact(self) -> None:
+        """Fold every shard's log segments into its checkpoint, shards in parallel."""
+        self._map_shards(lambda n: self._shard(n).compact(), range(self._num_shards))
+
+    def warm(self) -> None:
+        """Open (load) every shard up front."""
+        for shard_no in range(self._num_shards):
+            self._shard(shard_no)
+
+    # ---- Internal ----
+    def _shard_dir(self, shard_no: int, generation: Optional[int] = None) -> Path:
+        generation = self._file_generation if generation is None else generation
+        return generation_path(self._dir_path / f"shard-{shard_no:05d}", generation)
+
+    def _shard(self, shard_no: int) -> InMemoryPageStore:
+        shard = self._shards.get(shard_no)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.get(shard_no)
+                if shard is None:
+                    shard = self._shards[shard_no] = self._open_shard(shard_no, self._file_generation)
+        return shard
+
+    def _open_shard(self, shard_no: int, generation: int) -> InMemoryPageStore:
+        shard = InMemoryPageStore(
+            dir_path=str(self._shard_dir(shard_no, generation)),
+            log_mode=self._log_mode,
+            compact_every=self._compact_every,
+            trusted=self._trusted,
+        )
+        # 外部只订阅本 store 的 feed（全局 id），分片自己的 feed 不保留事件
+        shard.change_feed = ChangeFeed(retention=1)
+        return shard
+
+    def _remove_other_generations(self) -> None:
+        """Delete shard directories of other generations (superseded or from an interrupted save())."""
+        for path in self._dir_path.iterdir():
+            match = _SHARD_DIR.fullmatch(path.name)
+            if match and path.is_dir() and int(match.group(1) or 0) != self._file_generation:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _map_shards(self, fn: Callable[[int], T], shard_nos: Iterable[int]) -> List[T]:
+        """
+        Run fn(shard_no) for every shard on a thread pool; each task only
+        touches its own shard. Only worth it for I/O-bound work (writes).
+        """
+        shard_nos = list(shard_nos)
+        if len(shard_nos) <= 1:
+            return [fn(n) for n in shard_nos]
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(fn, shard_nos))
+
+    def _write_manifest(self) -> None:
+        atomic_write_json(self._manifest_file, {
+            "shard_size": self._shard_size, "num_shards": self._num_shards, "generation": self._file_generation,
+        })
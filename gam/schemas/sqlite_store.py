@@ -0,0 +1,338 @@
+from __future__ import annotations
+from typing import Callable, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .changefeed import ChangeFeed
+from .memory import MemoryState
+from .page import Page
+
+
+class _SQLiteStore:
+    """
+    Shared connection handling for the SQLite stores.
+
+    - One connection per thread (and per process after fork), opened lazily.
+    - WAL journal: readers in other threads/processes never block the writer
+      and only see committed batches.
+    - add()/replace() outside batch() commit right away. Inside batch()
+      writes share one transaction, committed every `batch_size` rows and
+      when the block ends.
+    - len(), generation and the change feed only move forward after COMMIT,
+      so another thread never sees a count ahead of the rows it can read.
+      There is a single writer per store instance.
+    - Reader processes call refresh() to pick up rows other processes
+      committed; len()/load()/iter_range() otherwise stop at the count this
+      process last saw.
+    """
+    DB_FILE = ""
+    SCHEMA = ""
+    TABLE = ""
+
+    def __init__(self, dir_path: str, batch_size: int = 64, synchronous: str = "NORMAL") -> None:
+        self._dir_path = Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._db_file = self._dir_path / self.DB_FILE
+        self._batch_size = max(1, batch_size)
+        self._synchronous = synchronous
+        self._local = threading.local()
+        self._pending = 0
+        self._batch_depth = 0
+        self._on_commit: List[Callable[[], None]] = []  # 提交后才生效的计数 / 事件
+        self._generation = 0
+        self._rewrite_generation = 0
+        self._publish_lock = threading.RLock()  # 提交后的发布与 refresh() 互斥
+        self._conn().executescript(self.SCHEMA)
+        self._count = self._next_id = self._max_id()  # _next_id：写入方分配的下一个 id，可能领先于已提交的 _count
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # isolation_level=None：事务由我们显式 BEGIN/COMMIT 控制
+            conn = sqlite3.connect(
+                self._db_file, isolation_level=None, check_same_thread=False, timeout=30.0
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, sql: str, params=(), on_commit: Optional[Callable[[], None]] = None) -> sqlite3.Cursor:
+        """Run one write; on_commit runs once it is committed."""
+        cursor = self._execute(sql, params)
+        self._written(on_commit)
+        return cursor
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        conn = self._conn()
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        return conn.execute(sql, params)
+
+    def _written(self, on_commit: Optional[Callable[[], None]] = None) -> None:
+        self._pending += 1
+        if on_commit is not None:
+            self._on_commit.append(on_commit)
+        if self._batch_depth == 0 or self._pending >= self._batch_size:
+            self.flush()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def rewrite_generation(self) -> int:
+        return self._rewrite_generation
+
+    def flush(self) -> None:
+        """Commit the pending batch, then publish it (count, generation, change feed)."""
+        conn = self._conn()
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+        self._committed()
+
+    def _committed(self) -> None:
+        self._pending = 0
+        with self._publish_lock:
+            callbacks, self._on_commit = self._on_commit, []
+            for callback in callbacks:
+                callback()
+
+    def _max_id(self) -> int:
+        return self._conn().execute(f"SELECT COALESCE(MAX(id) + 1, 0) FROM {self.TABLE}").fetchone()[0]
+
+    def refresh(self) -> None:
+        """Pick up rows committed by other processes (for reader processes following a writer)."""
+        with self._publish_lock:
+            count = self._max_id()
+            if self._next_id != self._count:
+                # 本进程还有没发布的写入：这里就是写入方，行会由提交回调发布
+                return
+            self._refreshed(count)
+
+    def _refreshed(self, count: int) -> None:
+        if count > self._count:
+            self._generation += 1
+        elif count != self._count:
+            # 只知道别的进程改过，不知道改了什么，按重写处理
+            self._generation += 1
+            self._rewrite_generation = self._generation
+        self._count = self._next_id = count
+
+    @contextmanager
+    def batch(self):
+        """Group every write inside the block into a single transaction."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            conn.close()
+            self._committed()
+        self._local.conn = None
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SQLitePageStore(_SQLiteStore):
+    """
+    PageStore backed by a `pages` table (id = page index, 0-based).
+    len() and get(i) are single indexed lookups; no full-file rewrites.
+    """
+    DB_FILE = "pages.db"
+    TABLE = "pages"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY,
+            header TEXT NOT NULL,
+            content TEXT NOT NULL,
+            meta TEXT NOT NULL DEFAULT '{}'
+        );
+    """
+
+    def __init__(self, dir_path: str, batch_size: int = 64, synchronous: str = "NORMAL") -> None:
+        super().__init__(dir_path, batch_size=batch_size, synchronous=synchronous)
+        self.change_feed = ChangeFeed()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, page: Page) -> None:
+        page_id = self._next_id
+        self._next_id += 1
+        self._write(
+            "INSERT INTO pages (id, header, content, meta) VALUES (?, ?, ?, ?)",
+            (page_id, page.header, page.content, json.dumps(page.meta, ensure_ascii=False)),
+            on_commit=lambda: self._publish_add(page_id, page),
+        )
+
+    def _publish_add(self, page_id: int, page: Page) -> None:
+        self._count = page_id + 1
+        self._generation += 1
+        self.change_feed.publish("add", page_id, page)
+
+    def _publish_update(self, index: int, page: Page) -> None:
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish("update", index, page)
+
+    def replace(self, index: int, page: Page) -> None:
+        """Overwrite page `index` in place; its id stays the same."""
+        if not 0 <= index < self._next_id:
+            raise IndexError(f"page index {index} out of range")
+        self._write(
+            "UPDATE pages SET header = ?, content = ?, meta = ? WHERE id = ?",
+            (page.header, page.content, json.dumps(page.meta, ensure_ascii=False), index),
+            on_commit=lambda: self._publish_update(index, page),
+        )
+
+    def delete(self, index: int) -> None:
+        """Replace page `index` with a tombstone; later ids do not shift."""
+        self.replace(index, Page.tombstone())
+
+    def get(self, index: int) -> Optional[Page]:
+        row = self._conn().execute(
+            "SELECT header, content, meta FROM pages WHERE id = ?", (index,)
+        ).fetchone()
+        return self._to_page(row) if row else None
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[Page]]:
+        ids = list(ids)
+        found = {}
+        # 分块查询，避免超过 SQLite 的参数个数上限
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._conn().execute(
+                f"SELECT id, header, content, meta FROM pages WHERE id IN ({placeholders})", chunk
+            ):
+                found[row[0]] = self._to_page(row[1:])
+        return [found.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Page]:
+        stop = self._count if stop is None else stop
+        cursor = self._conn().execute(
+            "SELECT header, content, meta FROM pages WHERE id >= ? AND id < ? ORDER BY id",
+            (start, stop),
+        )
+        for row in cursor:
+            yield self._to_page(row)
+
+    def load(self) -> List[Page]:
+        return list(self.iter_range())
+
+    def save(self, pages: List[Page]) -> None:
+        old_pages = self.load()
+        with self.batch():
+            self._write("DELETE FROM pages")
+            self._conn().executemany(
+                "INSERT INTO pages (id, header, content, meta) VALUES (?, ?, ?, ?)",
+                [
+                    (i, p.header, p.content, json.dumps(p.meta, ensure_ascii=False))
+                    for i, p in enumerate(pages)
+                ],
+            )
+        self._count = self._next_id = len(pages)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+        self.change_feed.publish_diff(old_pages, pages)
+
+    def _refreshed(self, count: int) -> None:
+        # 别的进程追加的页面，补发到本进程的 change feed
+        for i, page in enumerate(self.iter_range(self._count, count), start=self._count):
+            self.change_feed.publish("add", i, page)
+        super()._refreshed(count)
+
+    @staticmethod
+    def _to_page(row) -> Page:
+        header, content, meta = row
+        return Page(header=header, content=content, meta=json.loads(meta) if meta else {})
+
+
+class SQLiteMemoryStore(_SQLiteStore):
+    """
+    MemoryStore backed by an `abstracts` table (id = position in
+    MemoryState.abstracts) with a UNIQUE index on the text, so dedup is an
+    indexed INSERT OR IGNORE instead of a list scan.
+    Uses its own database file, so it can share dir_path with SQLitePageStore
+    without the two writers contending for one lock.
+    """
+    DB_FILE = "memory.db"
+    TABLE = "abstracts"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS abstracts (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL UNIQUE
+        );
+    """
+
+    def __len__(self) -> int:
+        return self._count
+
+    def load(self) -> MemoryState:
+        return MemoryState(abstracts=list(self.iter_range()))
+
+    def save(self, state: MemoryState) -> None:
+        abstracts = list(dict.fromkeys(a for a in state.abstracts if a))
+        with self.batch():
+            self._write("DELETE FROM abstracts")
+            self._conn().executemany(
+                "INSERT INTO abstracts (id, text) VALUES (?, ?)", list(enumerate(abstracts))
+            )
+        self._count = self._next_id = len(abstracts)
+        self._generation += 1
+        self._rewrite_generation = self._generation
+
+    def add(self, abstract: str) -> None:
+        if not abstract:
+            return
+        abstract_id = self._next_id
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO abstracts (id, text) VALUES (?, ?)", (abstract_id, abstract)
+        )
+        if cursor.rowcount:
+            self._next_id += 1
+        # 重复的文本被忽略，也要走一遍提交，不能把事务留着
+        self._written((lambda: self._publish_add(abstract_id)) if cursor.rowcount else None)
+
+    def _publish_add(self, abstract_id: int) -> None:
+        self._count = abstract_id + 1
+        self._generation += 1
+
+    def get_many(self, ids: Iterable[int]) -> List[Optional[str]]:
+        ids = list(ids)
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._conn().execute(
+                f"SELECT id, text FROM abstracts WHERE id IN ({placeholders})", chunk
+            ):
+                found[row[0]] = row[1]
+        return [found.get(i) for i in ids]
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        stop = self._count if stop is None else stop
+        cursor = self._conn().execute(
+            "SELECT text FROM abstracts WHERE id >= ? AND id < ? ORDER BY id", (start, stop)
+        )
+        for row in cursor:
+            yield row[0]